@@ -1,105 +1,634 @@
-from typing import Any, Dict, List, Optional, Tuple
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from typing import Any, AsyncIterable, AsyncIterator, Callable, Dict, Iterable, List, Optional, Set, Tuple, Union
+import asyncio
+import contextvars
+import functools
+import re
+import threading
+import time
 import uuid
 
-from .tools import TOOL_REGISTRY
-from .config import MAX_STEPS
-from .planner import plan_with_ollama
-from .tool_validation import validate_tool_args
+from .registry import COMPILED, TOOL_REGISTRY
+from .config import MAX_STEPS, OLLAMA_MODEL, PLANNER_STREAMING, PLAN_CACHE_ENABLED, PARALLEL_TOOLS, TOOL_MAX_WORKERS, RULE_PLANNER_ENABLED
+from .planner import plan_with_rules, plan_with_ollama, aplan_with_ollama, stream_plan_with_ollama, astream_plan_with_ollama
+from .plan_cache import plan_cache, cache_key, templatize_plan
 from .clarify import extract_missing_fields, questions_for_missing
-from .arg_mapping import normalize_args
-from .context_fill import fill_from_context
+from .profiling import profile_thread
+from .metrics import PLANS, TOOL_ERRORS, TOOL_SECONDS, VALIDATION_FAILURES
 
 
-def _execute_plan(
-    plan: List[Dict[str, Any]],
-    user_goal: str,
-    context: Optional[Dict[str, Any]],
-    run_id: str,
-    include_planner_step: bool = False,
-    planner_debug: Optional[Dict[str, Any]] = None,
-) -> Tuple[Dict[str, Any], List[Dict[str, Any]], str]:
-    steps: List[Dict[str, Any]] = []
-
-    if include_planner_step:
-        steps.append({
-            "thought": "Planner (Ollama) produced tool calls.",
-            "tool_call": {"name": "planner", "args": {"user_goal": user_goal}},
-            "tool_result": {
-                "plan": plan,
-                "raw_output": (planner_debug or {}).get("raw_output"),
-            },
-        })
-
-    for call in plan[:MAX_STEPS]:
-        name = call.get("name")
-        raw_args = call.get("args", {}) or {}
-        raw_args = normalize_args(name, raw_args)
-        raw_args = fill_from_context(name, raw_args, context or {})
+# Receives (run_id, [(seq, step), ...]) for steps as they complete.
+StepSink = Callable[[str, List[Tuple[int, Dict[str, Any]]]], None]
+
+# Receives (event, data) for run progress; currently "plan_ready".
+EventSink = Callable[[str, Dict[str, Any]], None]
+
+# "{{result:N}}" in a tool arg refers to the result of plan call N (0-based),
+# "{{result:N.FIELD}}" to one field of it.
+_RESULT_REF = re.compile(r"\{\{result:(\d+)(?:\.(\w+))?\}\}")
+
+# "{{context:KEY}}" stands for a context value the planner prompt elided.
+_CONTEXT_REF = re.compile(r"\{\{context:([^{}]+)\}\}")
+
+# Planner outcomes whose plans may be reused from the plan cache.
+_CACHEABLE_PARSES = frozenset({"strict", "repaired"})
+
+SALVAGED_WARNING = "Planner output was cut off; only the complete tool calls before the cut were run."
+
+_pool: Optional[ThreadPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+def _tool_pool() -> ThreadPoolExecutor:
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ThreadPoolExecutor(max_workers=TOOL_MAX_WORKERS, thread_name_prefix="tool")
+    return _pool
+
+
+def _result_refs(value: Any) -> Set[int]:
+    if isinstance(value, str):
+        return {int(m.group(1)) for m in _RESULT_REF.finditer(value)}
+    if isinstance(value, list):
+        return set().union(*(_result_refs(v) for v in value)) if value else set()
+    if isinstance(value, dict):
+        return set().union(*(_result_refs(v) for v in value.values())) if value else set()
+    return set()
+
+_MISSING = object()
+
+def _result_value(m: "re.Match[str]", results: Dict[int, Any]) -> Any:
+    value = results.get(int(m.group(1)), _MISSING)
+    if m.group(2) is not None:
+        value = value.get(m.group(2), _MISSING) if isinstance(value, dict) else _MISSING
+    return value
+
+def _resolve_refs(value: Any, results: Dict[int, Any]) -> Any:
+    # Unknown calls or fields are left as written.
+    if isinstance(value, str):
+        m = _RESULT_REF.fullmatch(value.strip())
+        if m:
+            resolved = _result_value(m, results)
+            return value if resolved is _MISSING else resolved
+
+        def sub(m: "re.Match[str]") -> str:
+            resolved = _result_value(m, results)
+            return m.group(0) if resolved is _MISSING else str(resolved)
+
+        return _RESULT_REF.sub(sub, value)
+    if isinstance(value, list):
+        return [_resolve_refs(v, results) for v in value]
+    if isinstance(value, dict):
+        return {k: _resolve_refs(v, results) for k, v in value.items()}
+    return value
+
+
+def _elapsed_ms(since: float) -> float:
+    return round((time.perf_counter() - since) * 1000, 3)
+
+def _resolve_context_refs(value: Any, context: Dict[str, Any]) -> Any:
+    if isinstance(value, str):
+        m = _CONTEXT_REF.fullmatch(value.strip())
+        if m and m.group(1) in context:
+            return context[m.group(1)]
+        return _CONTEXT_REF.sub(lambda m: str(context.get(m.group(1), m.group(0))), value)
+    if isinstance(value, list):
+        return [_resolve_context_refs(v, context) for v in value]
+    if isinstance(value, dict):
+        return {k: _resolve_context_refs(v, context) for k, v in value.items()}
+    return value
 
 
-        if not isinstance(name, str) or name not in TOOL_REGISTRY:
+class _PlanExecutor:
+    """
+    Per-run execution state. The sync and async drivers below pull calls from
+    the plan and feed them here one at a time.
+
+    Validation always happens in plan order. With a pool, each tool then runs
+    as soon as the calls it depends on have finished: a call depends on an
+    earlier one if its args reference that call's result ({{result:N}} or
+    {{result:N.FIELD}}, see PLANNER_SYSTEM) or
+    use a context key the earlier call also uses. Step dicts are appended in
+    plan order up front, so the audit log order is deterministic.
+
+    With a step_sink, each step is handed over (with its final seq number)
+    once it is complete, so long runs are persisted incrementally.
+
+    When a call stops the run for missing input, the result carries a
+    checkpoint (index of the blocked call, results and args of the calls
+    that ran). Passing it back in resumes at the blocked call: earlier calls
+    are not run again and their results still resolve {{result:N}}.
+    """
+
+    def __init__(
+        self,
+        user_goal: str,
+        context: Optional[Dict[str, Any]],
+        include_planner_step: bool,
+        planner_debug: Optional[Dict[str, Any]],
+        pool: Optional[ThreadPoolExecutor] = None,
+        run_id: str = "",
+        step_sink: Optional[StepSink] = None,
+        step_offset: int = 0,
+        checkpoint: Optional[Dict[str, Any]] = None,
+        on_event: Optional[EventSink] = None,
+    ):
+        self.context = context or {}
+        self.on_event = on_event
+        self.pool = pool
+        self.run_id = run_id
+        self.step_sink = step_sink
+        self.step_offset = step_offset
+        self._pending: List[int] = []
+        self._pending_lock = threading.Lock()
+        self.results: Dict[int, Any] = {}
+        self.futures: Dict[int, Future] = {}
+        self.context_keys: Dict[int, Set[str]] = {}
+        self.include_planner_step = include_planner_step
+        self.planner_debug = planner_debug or {}
+        self.source = self.planner_debug.get("source", "ollama")
+        # Step timings are ms since this reference (the start of planning,
+        # when the caller passes it in planner_debug["started"]).
+        self.t0 = self.planner_debug.get("started") or time.perf_counter()
+        self.steps: List[Dict[str, Any]] = []
+        self.seen: List[Dict[str, Any]] = []
+        self.args: Dict[int, Dict[str, Any]] = {}
+        self.blocked: Optional[int] = None
+        self.stopped: Optional[Dict[str, Any]] = None
+        self.resume_at = 0
+        if checkpoint:
+            self.resume_at = checkpoint.get("resume_at", 0)
+            self.results.update({int(i): r for i, r in (checkpoint.get("results") or {}).items()})
+            self.args.update({int(i): a for i, a in (checkpoint.get("args") or {}).items()})
+
+        if include_planner_step:
+            PLANS.inc(self.source)
+            if self.source == "ollama":
+                thought = "Planner (Ollama) produced tool calls."
+            elif self.source == "rules":
+                thought = "Rule-based planner matched the goal (no LLM call)."
+            else:
+                thought = f"Planner reused a cached plan ({self.source})."
+            self.steps.append({
+                "thought": thought,
+                "tool_call": {"name": "planner", "args": {"user_goal": user_goal}},
+                "tool_result": None,
+                "started_ms": 0.0,
+                "duration_ms": None,
+            })
+
+    def plan_started(self, plan: Any) -> None:
+        if self.on_event is not None and isinstance(plan, list):
+            self.on_event("plan_ready", {"plan": plan[:MAX_STEPS], "source": self.source})
+
+    def take(self, call: Dict[str, Any]) -> bool:
+        """
+        Handle the next call pulled from the plan. Returns False once
+        MAX_STEPS calls have been seen: stop pulling. Drivers pull until the
+        plan ends or this says stop, so a streamed plan always gets to run
+        its closing bookkeeping.
+        """
+        if len(self.seen) >= MAX_STEPS:
+            return False
+        if self.stopped is not None:
+            # Pull the rest of the plan so /continue can resume it.
+            self.seen.append(call)
+        else:
+            self.stopped = self.feed(call)
+        return True
+
+    def plan_consumed(self, plan: Any) -> None:
+        if self.on_event is not None and not isinstance(plan, list):
+            # Streamed plan: complete only once the stream is consumed.
+            self.on_event("plan_ready", {"plan": self.seen, "source": self.source})
+
+    def feed(self, call: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        Validate and run one call. Returns a needs_input result if execution
+        has to stop for missing fields, otherwise None.
+        """
+        steps = self.steps
+        self.seen.append(call)
+        if len(self.seen) - 1 < self.resume_at:
+            # Ran before the checkpoint; its result is already in self.results.
+            return None
+        name = call.get("name")
+        tool = COMPILED.get(name) if isinstance(name, str) else None
+
+        if tool is None:
             steps.append({
                 "thought": "Planner returned an unknown tool. Skipping.",
                 "tool_call": call,
                 "tool_result": {"error": {"type": "unknown_tool", "message": f"Unknown tool: {name}"}},
+                "started_ms": self._ms(time.perf_counter()),
+                "duration_ms": 0.0,
             })
-            continue
+            self._done(len(steps) - 1)
+            return None
 
         # Validate
+        t = time.perf_counter()
         steps.append({"thought": f"Validating tool args: {name}", "tool_call": call, "tool_result": None})
-        clean_args, err = validate_tool_args(name, raw_args)
+        raw_args = _resolve_context_refs(call.get("args", {}) or {}, self.context)
+        clean_args, err = tool.prepare(raw_args, self.context)
+        steps[-1]["started_ms"] = self._ms(t)
+        steps[-1]["duration_ms"] = round((time.perf_counter() - t) * 1000, 3)
 
         if err:
             steps[-1]["tool_result"] = {"error": err}
+            VALIDATION_FAILURES.inc(name)
+        self._done(len(steps) - 1)
 
+        if err:
             if err.get("type") == "validation_error":
                 missing = extract_missing_fields(err)
                 questions = questions_for_missing(missing)
-                return (
-                    {
-                        "status": "needs_input",
-                        "final_answer": "I’m missing a few details before I can continue.",
-                        "missing_fields": missing,
-                        "questions": questions,
-                        "proposed_plan": plan,
-                    },
-                    steps,
-                    run_id,
-                )
-
-            continue
+                self.blocked = len(self.seen) - 1
+                return {
+                    "status": "needs_input",
+                    "final_answer": "I’m missing a few details before I can continue.",
+                    "missing_fields": missing,
+                    "questions": questions,
+                    "proposed_plan": self.seen,
+                }
+
+            return None
 
         # Execute
-        steps.append({
+        idx = len(self.seen) - 1
+        deps = {i for i in _result_refs(clean_args) if i < idx}
+        keys = {k for k in clean_args if k in self.context}
+        deps.update(j for j, used in self.context_keys.items() if used & keys)
+        self.context_keys[idx] = keys
+        self.args[idx] = clean_args
+
+        step = {
             "thought": f"Calling tool: {name}",
             "tool_call": {"name": name, "args": clean_args},
             "tool_result": None,
-        })
+            "started_ms": None,
+            "duration_ms": None,
+        }
+        steps.append(step)
+        pos = len(steps) - 1
+
+        if self.pool is None:
+            self._run_tool(idx, pos, name, clean_args, [])
+        else:
+            waits = [self.futures[j] for j in sorted(deps) if j in self.futures]
+            # The caller's context goes along so a profiled run samples its tools.
+            ctx = contextvars.copy_context()
+            self.futures[idx] = self.pool.submit(ctx.run, self._run_tool, idx, pos, name, clean_args, waits)
+        return None
+
+    def _run_tool(self, idx: int, pos: int, name: str, args: Dict[str, Any], waits: List[Future]) -> None:
+        with profile_thread():
+            self._call_tool(idx, pos, name, args, waits)
+
+    def _call_tool(self, idx: int, pos: int, name: str, args: Dict[str, Any], waits: List[Future]) -> None:
+        step = self.steps[pos]
+        for f in waits:
+            f.result()
+        if _result_refs(args):
+            args = _resolve_refs(args, self.results)
+            step["tool_call"] = {"name": name, "args": args}
 
         fn = TOOL_REGISTRY[name]
+        t = time.perf_counter()
         try:
-            steps[-1]["tool_result"] = fn(clean_args)
+            result = fn(args)
         except Exception as e:
-            steps[-1]["tool_result"] = {"error": {"type": "tool_runtime_error", "message": str(e)}}
+            result = {"error": {"type": "tool_runtime_error", "message": str(e)}}
+            TOOL_ERRORS.inc(name)
+        elapsed = time.perf_counter() - t
+        TOOL_SECONDS.observe(elapsed, name)
+        step["started_ms"] = self._ms(t)
+        step["duration_ms"] = round(elapsed * 1000, 3)
+        step["tool_result"] = result
+        self.results[idx] = result
+        self._done(pos)
+        if self.pool is not None:
+            # Already off the caller's thread (and event loop): persist now.
+            self.flush()
+
+    def _ms(self, t: float) -> float:
+        return round((t - self.t0) * 1000, 3)
 
-    # Compile final answer
-    parts: List[str] = []
-    for s in steps:
-        tc = s.get("tool_call") or {}
-        tool_name = tc.get("name")
-        if tool_name and tool_name != "planner" and s.get("tool_result") is not None:
-            parts.append(f"{tool_name}: {s['tool_result']}")
+    def _done(self, pos: int) -> None:
+        if self.step_sink is not None:
+            with self._pending_lock:
+                self._pending.append(pos)
 
-    final_answer = "Done.\n\n" + "\n".join(parts) if parts else "Done."
-    return {"status": "ok", "final_answer": final_answer}, steps, run_id
+    @property
+    def has_pending(self) -> bool:
+        return bool(self._pending)
 
+    def flush(self) -> None:
+        if self.step_sink is None:
+            return
+        with self._pending_lock:
+            pending, self._pending = self._pending, []
+        if pending:
+            self.step_sink(self.run_id, [(self.step_offset + i, self.steps[i]) for i in sorted(pending)])
 
-def run_agent(user_goal: str, context: Optional[Dict[str, Any]] = None) -> Tuple[Dict[str, Any], List[Dict[str, Any]], str]:
-    run_id = str(uuid.uuid4())
-    plan, debug = plan_with_ollama(user_goal, context)
-    return _execute_plan(plan, user_goal, context, run_id, include_planner_step=True, planner_debug=debug)
+    def wait(self) -> None:
+        wait(list(self.futures.values()))
 
+    async def await_all(self) -> None:
+        if self.futures:
+            await asyncio.gather(*(asyncio.wrap_future(f) for f in self.futures.values()))
 
-def continue_agent(run_id: str, user_goal: str, plan: List[Dict[str, Any]], context: Optional[Dict[str, Any]] = None) -> Tuple[Dict[str, Any], List[Dict[str, Any]], str]:
-    # Resume the given plan without replanning
-    return _execute_plan(plan, user_goal, context, run_id, include_planner_step=False)
+    def finish(self) -> Dict[str, Any]:
+        """
+        Call after all tools are done; the caller flushes the planner step.
+        """
+        stopped = self.stopped
+        if self.include_planner_step:
+            self.steps[0]["tool_result"] = {
+                "plan": self.seen,
+                "source": self.source,
+                "raw_output": self.planner_debug.get("raw_output"),
+            }
+            self.steps[0]["duration_ms"] = self.planner_debug.get("planner_ms")
+            if self.planner_debug.get("ollama"):
+                # Ollama's own numbers: durations in ns, *_count in tokens
+                self.steps[0]["tool_result"]["ollama"] = self.planner_debug["ollama"]
+            if "parse" in self.planner_debug:
+                # strict, salvaged (valid prefix kept) or repaired (second LLM call)
+                self.steps[0]["tool_result"]["parse"] = self.planner_debug["parse"]
+            if "confidence" in self.planner_debug:
+                self.steps[0]["tool_result"]["confidence"] = self.planner_debug["confidence"]
+            if "prompt_tokens_est" in self.planner_debug:
+                self.steps[0]["tool_result"]["prompt_tokens_est"] = self.planner_debug["prompt_tokens_est"]
+                self.steps[0]["tool_result"]["elided_context"] = self.planner_debug.get("elided_context", [])
+            self._done(0)
+        if stopped is not None:
+            if self.planner_debug.get("parse") == "salvaged":
+                stopped["warnings"] = [SALVAGED_WARNING]
+            if self.blocked is not None:
+                done = sorted(i for i in self.results if i < self.blocked)
+                stopped["checkpoint"] = {
+                    "resume_at": self.blocked,
+                    "results": {str(i): self.results[i] for i in done},
+                    "args": {str(i): self.args[i] for i in done if i in self.args},
+                }
+            return stopped
+
+        # Compile final answer (calls finished before a checkpoint come first)
+        parts: List[str] = [
+            f"{self.seen[i].get('name')}: {self.results[i]}"
+            for i in sorted(self.results)
+            if i < self.resume_at and i < len(self.seen)
+        ]
+        for s in self.steps:
+            tc = s.get("tool_call") or {}
+            tool_name = tc.get("name")
+            if tool_name and tool_name != "planner" and s.get("tool_result") is not None:
+                parts.append(f"{tool_name}: {s['tool_result']}")
+
+        final_answer = "Done.\n\n" + "\n".join(parts) if parts else "Done."
+        out: Dict[str, Any] = {"status": "ok", "final_answer": final_answer}
+        if self.planner_debug.get("parse") == "salvaged":
+            out["warnings"] = [SALVAGED_WARNING]
+        return out
+
+
+def _execute_plan(
+    plan: Iterable[Dict[str, Any]],
+    user_goal: str,
+    context: Optional[Dict[str, Any]],
+    run_id: str,
+    include_planner_step: bool = False,
+    planner_debug: Optional[Dict[str, Any]] = None,
+    step_sink: Optional[StepSink] = None,
+    step_offset: int = 0,
+    checkpoint: Optional[Dict[str, Any]] = None,
+    on_event: Optional[EventSink] = None,
+) -> Tuple[Dict[str, Any], List[Dict[str, Any]], str]:
+    """
+    plan may be a list or a lazy iterator (streaming planner); calls are
+    executed as they are pulled. The planner step is filled in once the
+    plan has been fully consumed.
+    """
+    ex = _PlanExecutor(
+        user_goal, context, include_planner_step, planner_debug,
+        _tool_pool() if PARALLEL_TOOLS else None, run_id, step_sink, step_offset, checkpoint, on_event,
+    )
+    ex.plan_started(plan)
+    calls = iter(plan)
+    try:
+        for call in calls:
+            if not ex.take(call):
+                break
+            ex.flush()
+    finally:
+        if hasattr(calls, "close"):
+            # Closes the Ollama stream if we stopped early.
+            calls.close()
+    ex.plan_consumed(plan)
+    ex.wait()
+    result = ex.finish()
+    ex.flush()
+    return result, ex.steps, run_id
+
+
+async def _aiter(plan: Union[Iterable[Dict[str, Any]], AsyncIterable[Dict[str, Any]]]) -> AsyncIterator[Dict[str, Any]]:
+    if hasattr(plan, "__aiter__"):
+        try:
+            async for call in plan:
+                yield call
+        finally:
+            # Closes the Ollama stream if we stopped early.
+            await plan.aclose()
+    else:
+        for call in plan:
+            yield call
+
+
+async def _aexecute_plan(
+    plan: Union[Iterable[Dict[str, Any]], AsyncIterable[Dict[str, Any]]],
+    user_goal: str,
+    context: Optional[Dict[str, Any]],
+    run_id: str,
+    include_planner_step: bool = False,
+    planner_debug: Optional[Dict[str, Any]] = None,
+    step_sink: Optional[StepSink] = None,
+    step_offset: int = 0,
+    checkpoint: Optional[Dict[str, Any]] = None,
+    on_event: Optional[EventSink] = None,
+) -> Tuple[Dict[str, Any], List[Dict[str, Any]], str]:
+    """
+    Async driver for _PlanExecutor; plan may also be an async iterator.
+    """
+    ex = _PlanExecutor(
+        user_goal, context, include_planner_step, planner_debug,
+        _tool_pool() if PARALLEL_TOOLS else None, run_id, step_sink, step_offset, checkpoint, on_event,
+    )
+    ex.plan_started(plan)
+    calls = _aiter(plan)
+    try:
+        async for call in calls:
+            # Without the tool pool, take() runs the tool inline: keep it
+            # off the event loop.
+            more = ex.take(call) if ex.pool is not None else await asyncio.to_thread(ex.take, call)
+            if not more:
+                break
+            if ex.has_pending:
+                await asyncio.to_thread(ex.flush)
+    finally:
+        await calls.aclose()
+    ex.plan_consumed(plan)
+    await ex.await_all()
+    result = ex.finish()
+    if ex.has_pending:
+        await asyncio.to_thread(ex.flush)
+    return result, ex.steps, run_id
+
+
+# Planner tiers (rules -> plan cache -> Ollama). The helpers below hold
+# everything run_agent and arun_agent share; they only differ in how the
+# cache and Ollama are called and how the plan is executed.
+
+def _plan_with_rules(user_goal: str, context: Optional[Dict[str, Any]], started: float) -> Optional[Tuple[List[Dict[str, Any]], Dict[str, Any]]]:
+    ruled = plan_with_rules(user_goal, context) if RULE_PLANNER_ENABLED else None
+    if ruled is not None:
+        ruled[1].update(started=started, planner_ms=_elapsed_ms(started))
+    return ruled
+
+def _plan_cache_key(user_goal: str, context: Optional[Dict[str, Any]], use_cache: bool) -> Optional[str]:
+    if not PLAN_CACHE_ENABLED:
+        return None
+    if not use_cache:
+        plan_cache.note_bypass()
+        return None
+    return cache_key(user_goal, context, OLLAMA_MODEL)
+
+def _cache_debug(where: Optional[str], started: float) -> Dict[str, Any]:
+    return {"source": f"cache:{where}", "raw_output": None, "started": started, "planner_ms": _elapsed_ms(started)}
+
+def _plan_to_cache(
+    key: Optional[str], steps: List[Dict[str, Any]], context: Optional[Dict[str, Any]], debug: Dict[str, Any]
+) -> Optional[List[Dict[str, Any]]]:
+    # A salvaged plan is the model's output cut short: run it once, but
+    # never serve it again from the cache. Neither is a plan that would carry
+    # this request's context values (templatize_plan returns None).
+    plan = steps[0]["tool_result"]["plan"]
+    if key is None or not plan or debug.get("parse") not in _CACHEABLE_PARSES:
+        return None
+    return templatize_plan(plan, context)
+
+
+def run_agent(
+    user_goal: str,
+    context: Optional[Dict[str, Any]] = None,
+    stream: Optional[bool] = None,
+    use_cache: bool = True,
+    step_sink: Optional[StepSink] = None,
+    run_id: Optional[str] = None,
+    on_event: Optional[EventSink] = None,
+) -> Tuple[Dict[str, Any], List[Dict[str, Any]], str]:
+    run_id = run_id or str(uuid.uuid4())
+    started = time.perf_counter()
+    execute = functools.partial(
+        _execute_plan, user_goal=user_goal, context=context, run_id=run_id,
+        include_planner_step=True, step_sink=step_sink, on_event=on_event,
+    )
+
+    ruled = _plan_with_rules(user_goal, context, started)
+    if ruled is not None:
+        return execute(ruled[0], planner_debug=ruled[1])
+
+    key = _plan_cache_key(user_goal, context, use_cache)
+    if key is not None:
+        cached, where = plan_cache.get(key)
+        if cached is not None:
+            return execute(cached, planner_debug=_cache_debug(where, started))
+
+    if PLANNER_STREAMING if stream is None else stream:
+        debug: Dict[str, Any] = {"started": started}
+        plan = stream_plan_with_ollama(user_goal, context, model=OLLAMA_MODEL, debug=debug)
+    else:
+        plan, debug = plan_with_ollama(user_goal, context, model=OLLAMA_MODEL)
+        debug["started"] = started
+    result, steps, run_id = execute(plan, planner_debug=debug)
+
+    to_cache = _plan_to_cache(key, steps, context, debug)
+    if to_cache is not None:
+        plan_cache.put(key, to_cache)
+    return result, steps, run_id
+
+
+async def arun_agent(
+    user_goal: str,
+    context: Optional[Dict[str, Any]] = None,
+    stream: Optional[bool] = None,
+    use_cache: bool = True,
+    step_sink: Optional[StepSink] = None,
+    run_id: Optional[str] = None,
+    on_event: Optional[EventSink] = None,
+) -> Tuple[Dict[str, Any], List[Dict[str, Any]], str]:
+    """
+    Async variant of run_agent: the Ollama call is awaited and SQLite work
+    is offloaded, so an in-flight run holds a coroutine, not a thread.
+    """
+    run_id = run_id or str(uuid.uuid4())
+    started = time.perf_counter()
+    execute = functools.partial(
+        _aexecute_plan, user_goal=user_goal, context=context, run_id=run_id,
+        include_planner_step=True, step_sink=step_sink, on_event=on_event,
+    )
+
+    ruled = _plan_with_rules(user_goal, context, started)
+    if ruled is not None:
+        return await execute(ruled[0], planner_debug=ruled[1])
+
+    key = _plan_cache_key(user_goal, context, use_cache)
+    if key is not None:
+        cached, where = await plan_cache.aget(key)
+        if cached is not None:
+            return await execute(cached, planner_debug=_cache_debug(where, started))
+
+    if PLANNER_STREAMING if stream is None else stream:
+        debug: Dict[str, Any] = {"started": started}
+        plan = astream_plan_with_ollama(user_goal, context, model=OLLAMA_MODEL, debug=debug)
+    else:
+        plan, debug = await aplan_with_ollama(user_goal, context, model=OLLAMA_MODEL)
+        debug["started"] = started
+    result, steps, run_id = await execute(plan, planner_debug=debug)
+
+    to_cache = _plan_to_cache(key, steps, context, debug)
+    if to_cache is not None:
+        await plan_cache.aput(key, to_cache)
+    return result, steps, run_id
+
+
+def continue_agent(
+    run_id: str,
+    user_goal: str,
+    plan: List[Dict[str, Any]],
+    context: Optional[Dict[str, Any]] = None,
+    step_sink: Optional[StepSink] = None,
+    step_offset: int = 0,
+    checkpoint: Optional[Dict[str, Any]] = None,
+) -> Tuple[Dict[str, Any], List[Dict[str, Any]], str]:
+    # Resume the given plan without replanning (from the checkpoint, if any)
+    return _execute_plan(
+        plan, user_goal, context, run_id, include_planner_step=False,
+        step_sink=step_sink, step_offset=step_offset, checkpoint=checkpoint,
+    )
+
+
+async def acontinue_agent(
+    run_id: str,
+    user_goal: str,
+    plan: List[Dict[str, Any]],
+    context: Optional[Dict[str, Any]] = None,
+    step_sink: Optional[StepSink] = None,
+    step_offset: int = 0,
+    checkpoint: Optional[Dict[str, Any]] = None,
+) -> Tuple[Dict[str, Any], List[Dict[str, Any]], str]:
+    return await _aexecute_plan(
+        plan, user_goal, context, run_id, include_planner_step=False,
+        step_sink=step_sink, step_offset=step_offset, checkpoint=checkpoint,
+    )
@@ -1,4 +1,6 @@
-from typing import Any, Dict, List, Tuple
+from typing import Any, Dict, List
+
+from .registry import COMPILED
 
 def extract_missing_fields(err: Dict[str, Any]) -> List[Dict[str, str]]:
     """
@@ -30,26 +32,14 @@ def questions_for_missing(missing: List[Dict[str, str]]) -> List[str]:
 
     for tool, items in by_tool.items():
         fields = [i["field"] for i in items]
-        if tool == "draft_email":
-            if "to" in fields:
-                questions.append("Who should I email? (provide an address like team@company.com)")
-            if "subject" in fields:
-                questions.append("What should the email subject be?")
-            if "bullet_points" in fields:
-                questions.append("What bullet points should I include in the email?")
-        elif tool == "schedule_reminder":
-            if "when" in fields:
-                questions.append("When should I schedule the reminder? (e.g., tomorrow 09:00)")
-            if "note" in fields:
-                questions.append("What should the reminder say?")
-        elif tool == "summarize_text":
-            if "text" in fields:
-                questions.append("What text should I summarize? Paste it in the context.")
-        elif tool == "create_tasks":
-            if "tasks" in fields:
-                questions.append("What tasks should I create? Provide a list of task titles.")
-        else:
+        compiled = COMPILED.get(tool)
+        if compiled is None:
             questions.append(f"I need more info for tool `{tool}`: {', '.join(fields)}")
+            continue
+        # Registry order, so questions read the same regardless of error order
+        for field, question in compiled.questions.items():
+            if field in fields:
+                questions.append(question)
 
     # remove duplicates while preserving order
     seen = set()
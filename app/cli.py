@@ -0,0 +1,63 @@
+import argparse
+import json
+import sys
+from typing import List, Optional
+
+from . import storage
+from .export import FORMATS, iter_export, resolve_format
+
+
+def _stats(args: argparse.Namespace) -> None:
+    print(json.dumps(storage.compression_stats(), indent=2))
+
+
+def _index_search(args: argparse.Namespace) -> None:
+    print(f"Indexed {storage.backfill_search_index(batch_size=args.batch_size)} runs")
+
+
+def _export(args: argparse.Namespace) -> None:
+    fmt = resolve_format(args.format)
+    out = open(args.output, "wb") if args.output else sys.stdout.buffer
+    try:
+        for chunk in iter_export(fmt, since=args.since, until=args.until, status=args.status):
+            out.write(chunk)
+    finally:
+        if args.output:
+            out.close()
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """
+    Maintenance commands, e.g.:
+      python -m app.cli --db runs.db stats
+      python -m app.cli index-search
+      python -m app.cli export --format columnar --since 1700000000 -o runs.parquet
+    """
+    parser = argparse.ArgumentParser(prog="python -m app.cli")
+    parser.add_argument("--db", help="SQLite file (defaults to AGENT_DB_PATH / runs.db)")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("stats", help="Report space saved by JSON column compression")
+    p.set_defaults(func=_stats)
+
+    p = sub.add_parser("index-search", help="Add runs missing from the full-text search index")
+    p.add_argument("--batch-size", type=int, default=500)
+    p.set_defaults(func=_index_search)
+
+    p = sub.add_parser("export", help="Export runs with their audit logs")
+    p.add_argument("--format", choices=FORMATS, default="jsonl")
+    p.add_argument("--since", type=int, help="created_at >= (unix seconds)")
+    p.add_argument("--until", type=int, help="created_at < (unix seconds)")
+    p.add_argument("--status")
+    p.add_argument("-o", "--output", help="File to write (default: stdout)")
+    p.set_defaults(func=_export)
+
+    args = parser.parse_args(argv)
+    if args.db:
+        storage.set_db_path(args.db)
+    storage.init_db()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
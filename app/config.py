@@ -1,2 +1,74 @@
+import os
+
 MAX_STEPS = 6
 OLLAMA_MODEL = "llama3.1:8b"
+
+# Load the model (and its system prompt) at startup; /health/ready stays 503
+# until that succeeds. With PLANNER_KEEP_WARM_SECONDS > 0 the app also pings
+# Ollama on that interval so the model is never unloaded while idle.
+PLANNER_WARMUP = True
+PLANNER_KEEP_WARM_SECONDS = 0
+PLANNER_LATENCY_WINDOW = 200
+
+# Send the plan's JSON Schema (built from the tool registry) as Ollama's
+# "format", so the output is valid by construction (needs Ollama >= 0.5).
+# Truncated output is salvaged locally; a repair call is the last resort.
+PLANNER_STRUCTURED_OUTPUT = True
+
+# Stream the planner output and start executing tool calls as they arrive.
+PLANNER_STREAMING = False
+
+# Rule-based planner tier: goals whose tools and args are fully determined by
+# keywords and context keys are planned without calling Ollama.
+RULE_PLANNER_ENABLED = True
+RULE_PLANNER_MIN_CONFIDENCE = 0.8
+
+# Planner prompt: when the context JSON is larger than this, the biggest
+# values are replaced by {{context:KEY}} references (resolved from the
+# context at execution time) until it fits.
+PLANNER_CONTEXT_BUDGET_CHARS = 4000
+
+# Plan cache: in-memory LRU in front of a SQLite table (survives restarts).
+PLAN_CACHE_ENABLED = True
+PLAN_CACHE_MAX_ENTRIES = 1024
+PLAN_CACHE_TTL_SECONDS = 24 * 3600
+
+# Run independent tool calls of a plan concurrently on a bounded thread pool.
+PARALLEL_TOOLS = True
+TOOL_MAX_WORKERS = 8
+
+# Background runs (/run with "background": true answer 202 at once): queued
+# runs wait for one of RUN_QUEUE_WORKERS workers; with RUN_QUEUE_MAX_DEPTH
+# runs already waiting, /run answers 503. The queue is stored in SQLite and
+# re-enqueued at startup. Progress is streamed from /runs/{run_id}/events.
+RUN_QUEUE_WORKERS = 4
+RUN_QUEUE_MAX_DEPTH = 256
+RUN_EVENTS_KEEP_FINISHED = 256
+SSE_HEARTBEAT_SECONDS = 15
+
+# /runs:batch - max runs per request and runs of one batch executing at once
+# (planning and tools; each run makes at most one Ollama call at a time).
+BATCH_MAX_RUNS = 100
+BATCH_CONCURRENCY = 4
+
+# SQLite storage (path can be overridden with AGENT_DB_PATH)
+DB_PATH = os.environ.get("AGENT_DB_PATH", "runs.db")
+DB_CACHE_SIZE_KB = 64 * 1024
+DB_MMAP_SIZE = 256 * 1024 * 1024
+DB_STATEMENT_CACHE = 256
+
+# Compress large JSON columns: "zlib", "zstd" (needs the zstandard package,
+# falls back to zlib) or None to store plain JSON text.
+DB_COMPRESSION = "zlib"
+DB_COMPRESSION_LEVEL = 6
+DB_COMPRESS_MIN_BYTES = 1024
+
+# Sampling profiler for /run: on for every run, or per request with the
+# "X-Profile: 1" header. Profiles are stored with the run (folded stacks).
+PROFILE_RUNS = False
+PROFILE_SAMPLE_INTERVAL_MS = 5
+PROFILE_MAX_DEPTH = 64
+
+# Rendered report / run JSON cache (LRU, bounded by total bytes).
+REPORT_CACHE_MAX_BYTES = 64 * 1024 * 1024
+REPORT_CACHE_MAX_ITEM_BYTES = 4 * 1024 * 1024
@@ -0,0 +1,144 @@
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+import csv
+import io
+import itertools
+import json
+
+from .storage import iter_runs
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc as pa_ipc
+    import pyarrow.parquet as pq
+except ImportError:  # optional
+    pa = None
+
+FORMATS = ("jsonl", "columnar", "parquet", "arrow", "csv")
+
+# Flat columns for the columnar formats; nested values are JSON strings.
+COLUMNS = ["run_id", "created_at", "user_goal", "status", "final_answer", "steps_json", "proposed_plan_json", "context_json"]
+
+
+def resolve_format(fmt: str) -> str:
+    """
+    "columnar" means Parquet when pyarrow is installed, CSV otherwise.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown export format: {fmt} (expected one of {', '.join(FORMATS)})")
+    if fmt == "columnar":
+        return "parquet" if pa is not None else "csv"
+    if fmt in ("parquet", "arrow") and pa is None:
+        raise ValueError(f"Format {fmt} needs pyarrow; use csv or columnar instead")
+    return fmt
+
+def media_type(fmt: str) -> Tuple[str, str]:
+    """
+    Returns: (media_type, file extension)
+    """
+    return {
+        "jsonl": ("application/x-ndjson", "jsonl"),
+        "csv": ("text/csv; charset=utf-8", "csv"),
+        "arrow": ("application/vnd.apache.arrow.stream", "arrows"),
+        "parquet": ("application/vnd.apache.parquet", "parquet"),
+    }[fmt]
+
+
+def _flat(run: Dict[str, Any]) -> List[Any]:
+    return [
+        run["run_id"],
+        run["created_at"],
+        run["user_goal"],
+        run["status"],
+        run["final_answer"],
+        json.dumps(run["steps"], ensure_ascii=False),
+        json.dumps(run["proposed_plan"], ensure_ascii=False) if run["proposed_plan"] is not None else None,
+        json.dumps(run["context"], ensure_ascii=False) if run["context"] is not None else None,
+    ]
+
+def _batches(runs: Iterator[Dict[str, Any]], size: int) -> Iterator[List[Dict[str, Any]]]:
+    while True:
+        batch = list(itertools.islice(runs, size))
+        if not batch:
+            return
+        yield batch
+
+
+def _jsonl(runs: Iterator[Dict[str, Any]], batch_size: int) -> Iterator[bytes]:
+    for batch in _batches(runs, batch_size):
+        yield "".join(json.dumps(r, ensure_ascii=False) + "\n" for r in batch).encode("utf-8")
+
+def _csv(runs: Iterator[Dict[str, Any]], batch_size: int) -> Iterator[bytes]:
+    buf = io.StringIO()
+    w = csv.writer(buf)
+    w.writerow(COLUMNS)
+    for batch in _batches(runs, batch_size):
+        for r in batch:
+            w.writerow(_flat(r))
+        yield buf.getvalue().encode("utf-8")
+        buf.seek(0)
+        buf.truncate()
+    if buf.tell():
+        yield buf.getvalue().encode("utf-8")
+
+
+class _Drain(io.RawIOBase):
+    """
+    Write-only sink whose bytes are handed out as soon as the writer flushes.
+    """
+
+    def __init__(self) -> None:
+        self.parts: List[bytes] = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, b: Any) -> int:
+        self.parts.append(bytes(b))
+        return len(b)
+
+    def drain(self) -> bytes:
+        out, self.parts = b"".join(self.parts), []
+        return out
+
+def _arrow_schema() -> Any:
+    return pa.schema([(c, pa.int64() if c == "created_at" else pa.string()) for c in COLUMNS])
+
+def _record_batch(batch: List[Dict[str, Any]], schema: Any) -> Any:
+    cols = list(zip(*(_flat(r) for r in batch)))
+    return pa.record_batch([pa.array(col, type=f.type) for col, f in zip(cols, schema)], schema=schema)
+
+def _arrow(runs: Iterator[Dict[str, Any]], batch_size: int, parquet: bool) -> Iterator[bytes]:
+    # One record batch (Arrow) or row group (Parquet) per chunk of runs.
+    sink = _Drain()
+    schema = _arrow_schema()
+    writer = pq.ParquetWriter(sink, schema) if parquet else pa_ipc.new_stream(sink, schema)
+    for batch in _batches(runs, batch_size):
+        rb = _record_batch(batch, schema)
+        if parquet:
+            writer.write_table(pa.Table.from_batches([rb]))
+        else:
+            writer.write_batch(rb)
+        data = sink.drain()
+        if data:
+            yield data
+    writer.close()
+    yield sink.drain()
+
+
+def iter_export(
+    fmt: str = "jsonl",
+    since: Optional[int] = None,
+    until: Optional[int] = None,
+    status: Optional[str] = None,
+    batch_size: int = 500,
+) -> Iterator[bytes]:
+    """
+    Encoded export of all runs in [since, until), streamed in chunks.
+    fmt must already be resolved with resolve_format().
+    """
+    runs = iter_runs(since=since, until=until, status=status, chunk_size=batch_size)
+    if fmt == "jsonl":
+        return _jsonl(runs, batch_size)
+    if fmt == "csv":
+        return _csv(runs, batch_size)
+    return _arrow(runs, batch_size, parquet=(fmt == "parquet"))
@@ -0,0 +1,298 @@
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Dict, List, Optional, Set, Tuple
+import asyncio
+import json
+import threading
+import time
+
+from fastapi.concurrency import run_in_threadpool
+
+from .agent import arun_agent
+from .config import RUN_QUEUE_WORKERS, RUN_QUEUE_MAX_DEPTH, RUN_EVENTS_KEEP_FINISHED, SSE_HEARTBEAT_SECONDS
+from .metrics import BACKGROUND_RUNS, RUN_QUEUE_WAIT_SECONDS
+from .profiling import StackSampler
+from .storage import append_steps, dequeue_run, enqueue_run, queued_runs, read_run, save_profile, save_run, start_queued_run
+
+# Events of a background run, in order:
+#   queued, planner_started, plan_ready, step_completed (one per step),
+#   then exactly one of ok / needs_input / error.
+TERMINAL = frozenset({"ok", "needs_input", "error"})
+
+Event = Tuple[int, str, Dict[str, Any]]
+
+
+class QueueFull(Exception):
+    pass
+
+
+class RunEvents:
+    """
+    Event history of one run plus its live subscribers. publish() may be
+    called from any thread (steps complete on the tool pool); subscribers
+    are asyncio queues on the app's event loop.
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop):
+        self.loop = loop
+        self.history: List[Event] = []
+        self.finished = False
+        self._subscribers: Set[asyncio.Queue] = set()
+        self._lock = threading.Lock()
+
+    def publish(self, event: str, data: Dict[str, Any]) -> None:
+        with self._lock:
+            item = (len(self.history) + 1, event, data)
+            self.history.append(item)
+            self.finished = self.finished or event in TERMINAL
+            for q in self._subscribers:
+                self.loop.call_soon_threadsafe(q.put_nowait, item)
+
+    def subscribe(self, after: int = 0) -> Tuple[List[Event], Optional[asyncio.Queue]]:
+        """
+        Events after id `after`, and a queue for the ones still to come
+        (None once the run has finished).
+        """
+        with self._lock:
+            backlog = self.history[after:]
+            if self.finished:
+                return backlog, None
+            q: asyncio.Queue = asyncio.Queue()
+            self._subscribers.add(q)
+            return backlog, q
+
+    def unsubscribe(self, q: asyncio.Queue) -> None:
+        with self._lock:
+            self._subscribers.discard(q)
+
+
+def _sse(event_id: int, event: str, data: Dict[str, Any]) -> str:
+    return f"id: {event_id}\nevent: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+def _outcome(run_id: str, result: Dict[str, Any]) -> Dict[str, Any]:
+    out = {"run_id": run_id, "status": result.get("status", "ok"), "final_answer": result.get("final_answer", "")}
+    if out["status"] == "needs_input":
+        out.update({
+            "questions": result.get("questions"),
+            "missing_fields": result.get("missing_fields"),
+            "proposed_plan": result.get("proposed_plan"),
+        })
+    if result.get("warnings"):
+        out["warnings"] = result["warnings"]
+    return out
+
+
+class JobQueue:
+    """
+    Bounded in-process queue of background runs. Each worker is a coroutine
+    that plans and executes one run at a time (tools still run on the tool
+    pool), so RUN_QUEUE_WORKERS bounds the runs in flight.
+
+    The queue itself is persisted (storage.run_queue): runs accepted but not
+    finished when the process stopped are re-enqueued by start().
+    """
+
+    def __init__(self, workers: int = RUN_QUEUE_WORKERS, max_depth: int = RUN_QUEUE_MAX_DEPTH):
+        self.workers = workers
+        self.max_depth = max_depth
+        self.depth = 0
+        self.running = 0
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._events: Dict[str, RunEvents] = {}
+        self._finished: "OrderedDict[str, None]" = OrderedDict()
+
+    def _run_events(self, run_id: str) -> RunEvents:
+        ev = self._events.get(run_id)
+        if ev is None:
+            ev = self._events[run_id] = RunEvents(self._loop or asyncio.get_running_loop())
+        return ev
+
+    def _forget_old(self, run_id: str) -> None:
+        # Keep the event history of the last RUN_EVENTS_KEEP_FINISHED runs.
+        self._finished[run_id] = None
+        while len(self._finished) > RUN_EVENTS_KEEP_FINISHED:
+            old, _ = self._finished.popitem(last=False)
+            self._events.pop(old, None)
+
+    async def start(self) -> int:
+        """
+        Start the workers and re-enqueue unfinished runs; returns how many.
+        Call from the app's event loop.
+        """
+        if self._queue is not None:
+            return 0
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        pending = await run_in_threadpool(queued_runs)
+        for job in pending:
+            self._put(job)
+        return len(pending)
+
+    async def stop(self) -> None:
+        # Runs in progress are cancelled; they stay in run_queue and start
+        # over on the next startup.
+        for t in self._tasks:
+            t.cancel()
+        for t in self._tasks:
+            try:
+                await t
+            except asyncio.CancelledError:
+                pass
+        self._tasks = []
+        self._queue = None
+
+    def _put(self, job: Dict[str, Any]) -> None:
+        job["queued_at"] = time.perf_counter()
+        self.depth += 1
+        self._run_events(job["run_id"]).publish("queued", {"run_id": job["run_id"], "position": self.depth})
+        self._queue.put_nowait(job)
+
+    async def submit(self, run_id: str, user_goal: str, context: Optional[Dict[str, Any]], use_cache: bool = True, profile: bool = False) -> None:
+        """
+        Persist the run as queued and enqueue it. Raises QueueFull when
+        max_depth runs are already waiting.
+        """
+        if self._queue is None:
+            raise RuntimeError("Job queue is not started")
+        if self.depth >= self.max_depth:
+            BACKGROUND_RUNS.inc("rejected")
+            raise QueueFull(f"{self.depth} runs are already queued")
+        self.depth += 1  # reserve the slot while the row is written
+        try:
+            options = {"use_cache": use_cache, "profile": profile}
+            await run_in_threadpool(enqueue_run, run_id, user_goal, context, options)
+        finally:
+            self.depth -= 1
+        self._put({"run_id": run_id, "user_goal": user_goal, "context": context, "options": options})
+
+    async def _worker(self) -> None:
+        while True:
+            job = await self._queue.get()
+            self.depth -= 1
+            RUN_QUEUE_WAIT_SECONDS.observe(time.perf_counter() - job["queued_at"])
+            self.running += 1
+            try:
+                await self._run(job)
+            except Exception as e:
+                # A failure outside the agent (storage, profiling) must not
+                # kill the worker or leave subscribers waiting.
+                await self._fail(job, e)
+            finally:
+                self.running -= 1
+
+    async def _fail(self, job: Dict[str, Any], error: Exception) -> None:
+        run_id = job["run_id"]
+        final_answer = f"Run failed: {error}"
+        try:
+            await run_in_threadpool(
+                save_run,
+                run_id=run_id,
+                user_goal=job["user_goal"],
+                status="error",
+                final_answer=final_answer,
+                proposed_plan=None,
+                context=job["context"],
+            )
+            await run_in_threadpool(dequeue_run, run_id)
+        except Exception:
+            pass  # best effort: the run stays queued and is retried on restart
+        BACKGROUND_RUNS.inc("error")
+        events = self._run_events(run_id)
+        if not events.finished:
+            events.publish("error", {"run_id": run_id, "status": "error", "final_answer": final_answer})
+        self._forget_old(run_id)
+
+    async def _run(self, job: Dict[str, Any]) -> None:
+        run_id = job["run_id"]
+        events = self._run_events(run_id)
+        options = job.get("options") or {}
+
+        def sink(rid: str, steps: List[Tuple[int, Dict[str, Any]]]) -> None:
+            append_steps(rid, steps)
+            for seq, step in steps:
+                events.publish("step_completed", {"seq": seq, "step": step})
+
+        await run_in_threadpool(start_queued_run, run_id)
+        events.publish("planner_started", {"run_id": run_id})
+        sampler = StackSampler().start() if options.get("profile") else None
+        try:
+            result, _, _ = await arun_agent(
+                job["user_goal"], job["context"], use_cache=options.get("use_cache", True),
+                step_sink=sink, run_id=run_id, on_event=events.publish,
+            )
+        except asyncio.CancelledError:
+            if sampler:
+                sampler.cancel()
+            raise
+        except Exception as e:
+            result = {"status": "error", "final_answer": f"Run failed: {e}"}
+        profile = await sampler.astop() if sampler else None
+
+        status = result.get("status", "ok")
+        await run_in_threadpool(
+            save_run,
+            run_id=run_id,
+            user_goal=job["user_goal"],
+            status=status,
+            final_answer=result.get("final_answer", ""),
+            proposed_plan=result.get("proposed_plan"),
+            context=job["context"],
+            checkpoint=result.get("checkpoint"),
+        )
+        if profile is not None:
+            await run_in_threadpool(save_profile, run_id, profile)
+        await run_in_threadpool(dequeue_run, run_id)
+        BACKGROUND_RUNS.inc(status)
+        events.publish(status, _outcome(run_id, result))
+        self._forget_old(run_id)
+
+    async def stream(self, run_id: str, last_event_id: int = 0) -> Optional[AsyncIterator[str]]:
+        """
+        SSE stream of a run's events (replayed from last_event_id on). Runs
+        whose history is no longer in memory get one event with their
+        stored status. None if the run does not exist.
+        """
+        ev = self._events.get(run_id)
+        if ev is None:
+            run = await run_in_threadpool(read_run, run_id, 0, 0)
+            if run is None:
+                return None
+            return self._stored(run)
+        return self._live(ev, last_event_id)
+
+    async def _stored(self, run: Dict[str, Any]) -> AsyncIterator[str]:
+        yield _sse(1, run["status"], {"run_id": run["run_id"], "status": run["status"], "final_answer": run["final_answer"]})
+
+    async def _live(self, ev: RunEvents, last_event_id: int) -> AsyncIterator[str]:
+        backlog, q = ev.subscribe(last_event_id)
+        try:
+            for item in backlog:
+                yield _sse(*item)
+            if q is None or any(e in TERMINAL for _, e, _ in backlog):
+                return
+            while True:
+                try:
+                    item = await asyncio.wait_for(q.get(), SSE_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    # Comment line: keeps proxies from timing out an idle stream.
+                    yield ": keep-alive\n\n"
+                    continue
+                yield _sse(*item)
+                if item[1] in TERMINAL:
+                    return
+        finally:
+            if q is not None:
+                ev.unsubscribe(q)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "workers": self.workers,
+            "running": self.running,
+            "queued": self.depth,
+            "max_depth": self.max_depth,
+        }
+
+
+job_queue = JobQueue()
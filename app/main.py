@@ -1,11 +1,28 @@
-from fastapi import FastAPI, HTTPException
+import asyncio
+import json
+import uuid
+from email.utils import formatdate
+from typing import Callable, Iterable, Optional, Set
+
+from fastapi import FastAPI, Header, HTTPException, Response
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
 
-from .schemas import RunRequest, ContinueRequest, RunResponse, AgentStep, ToolCall, MissingField
-from .agent import run_agent, continue_agent
-from .storage import init_db, save_run, load_run, list_runs, read_run
-from fastapi.responses import PlainTextResponse, HTMLResponse
-from .reporting import build_markdown_report, markdown_to_basic_html
+from .schemas import RunRequest, BatchRunRequest, ContinueRequest, RunResponse, AgentStep, ToolCall, MissingField
+from .agent import arun_agent, acontinue_agent
+from .config import BATCH_MAX_RUNS, BATCH_CONCURRENCY, PROFILE_RUNS
+from .storage import init_db, close_connections, save_run, append_steps, count_steps, iter_steps, run_version, load_run, list_runs, read_run, read_run_at_version, search_runs, save_profile, load_profile
+from fastapi.responses import JSONResponse, PlainTextResponse, HTMLResponse, StreamingResponse
+from .reporting import iter_markdown_report, iter_basic_html, iter_joined
+from .plan_cache import plan_cache
+from .planner import PLANNER_SYSTEM
+from .planner_health import planner_health
+from .jobs import job_queue, QueueFull
+from .report_cache import report_cache, make_etag, etag_matches
+from .export import iter_export, resolve_format, media_type
+from .metrics import REPORT_RENDER_SECONDS, render_metrics, timed_iter
+from .profiling import StackSampler
+from ollama_client import get_client
 
 
 app = FastAPI(title="AI Workflow Automation Agent")
@@ -19,43 +36,152 @@ app.add_middleware(
 )
 
 @app.on_event("startup")
-def startup():
-    init_db()
+async def startup():
+    await run_in_threadpool(init_db)
+    get_client()
+    # Loads the model in the background; /health/ready reports when it is warm.
+    planner_health.start(system=PLANNER_SYSTEM)
+    # Background workers; runs left queued by the last process are re-enqueued.
+    await job_queue.start()
 
-@app.post("/run", response_model=RunResponse)
-def run(req: RunRequest):
-    result, steps, run_id = run_agent(req.user_goal, req.context)
+@app.on_event("shutdown")
+async def shutdown():
+    await job_queue.stop()
+    await planner_health.stop()
+    await get_client().aclose()
+    close_connections()
 
-    status = result.get("status", "ok")
-    proposed_plan = result.get("proposed_plan")
+@app.get("/health/planner")
+async def health_planner():
+    return {**planner_health.snapshot(), "loaded": await planner_health.loaded()}
 
-    save_run(
-        run_id=run_id,
-        user_goal=req.user_goal,
-        status=status,
-        final_answer=result.get("final_answer", ""),
-        steps=steps,
-        proposed_plan=proposed_plan,
-        context=req.context,
-    )
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+@app.get("/health/ready")
+def health_ready():
+    if not planner_health.warm:
+        raise HTTPException(status_code=503, detail="Planner model is warming up")
+    return {"status": "ok"}
 
+def _build_response(run_id: str, result: dict, steps: list) -> RunResponse:
+    status = result.get("status", "ok")
     resp = RunResponse(
         run_id=run_id,
         status=status,
         final_answer=result.get("final_answer", ""),
         steps=[AgentStep(**s) for s in steps],
+        warnings=result.get("warnings"),
     )
 
     if status == "needs_input":
         resp.questions = result.get("questions")
         resp.missing_fields = [MissingField(**m) for m in (result.get("missing_fields") or [])]
-        resp.proposed_plan = [ToolCall(**tc) for tc in (proposed_plan or [])]
+        resp.proposed_plan = [ToolCall(**tc) for tc in (result.get("proposed_plan") or [])]
 
     return resp
 
+async def _save_result(run_id: str, req: RunRequest, result: dict) -> None:
+    # Steps were already appended to run_steps while executing.
+    await run_in_threadpool(
+        save_run,
+        run_id=run_id,
+        user_goal=req.user_goal,
+        status=result.get("status", "ok"),
+        final_answer=result.get("final_answer", ""),
+        proposed_plan=result.get("proposed_plan"),
+        context=req.context,
+        checkpoint=result.get("checkpoint"),
+    )
+
+@app.post("/run", response_model=RunResponse)
+async def run(req: RunRequest, x_profile: Optional[str] = Header(None)):
+    profiled = PROFILE_RUNS or x_profile in ("1", "true")
+    if req.background:
+        run_id = str(uuid.uuid4())
+        try:
+            await job_queue.submit(run_id, req.user_goal, req.context, use_cache=not req.bypass_plan_cache, profile=profiled)
+        except QueueFull as e:
+            raise HTTPException(status_code=503, detail=f"Run queue is full: {e}", headers={"Retry-After": "5"})
+        return JSONResponse(
+            {"run_id": run_id, "status": "queued", "events": f"/runs/{run_id}/events"},
+            status_code=202,
+            headers={"Location": f"/runs/{run_id}"},
+        )
+
+    # Opt-in profile of this run, downloadable from /runs/{run_id}/profile
+    sampler = StackSampler().start() if profiled else None
+    try:
+        result, steps, run_id = await arun_agent(
+            req.user_goal, req.context, use_cache=not req.bypass_plan_cache, step_sink=append_steps,
+        )
+    finally:
+        profile = await sampler.astop() if sampler else None
+
+    await _save_result(run_id, req, result)
+    if profile is not None:
+        await run_in_threadpool(save_profile, run_id, profile)
+
+    return _build_response(run_id, result, steps)
+
+# Batch runs in flight. They are not tied to the response stream: a run that
+# started keeps going and is saved even if the client disconnects.
+_batch_runs: Set[asyncio.Task] = set()
+
+async def _run_and_save(r: RunRequest):
+    result, steps, run_id = await arun_agent(
+        r.user_goal, r.context, use_cache=not r.bypass_plan_cache, step_sink=append_steps,
+    )
+    await _save_result(run_id, r, result)
+    return result, steps, run_id
+
+@app.post("/runs:batch")
+async def run_batch(req: BatchRunRequest):
+    """
+    Plan and execute many runs concurrently (at most BATCH_CONCURRENCY runs
+    in flight). Each result is streamed back as one NDJSON line as soon as it
+    finishes: {"index": i, "result": RunResponse} or {"index": i, "error": "..."}.
+    Every run is persisted when it finishes; runs not started yet when the
+    client disconnects are dropped.
+    """
+    if len(req.runs) > BATCH_MAX_RUNS:
+        raise HTTPException(status_code=413, detail=f"At most {BATCH_MAX_RUNS} runs per batch")
+
+    sem = asyncio.Semaphore(BATCH_CONCURRENCY)
+
+    async def one(i: int, r: RunRequest):
+        async with sem:
+            task = asyncio.create_task(_run_and_save(r))
+            _batch_runs.add(task)
+            task.add_done_callback(_batch_runs.discard)
+            try:
+                return i, r, await asyncio.shield(task), None
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                return i, r, None, e
+
+    async def lines():
+        tasks = [asyncio.create_task(one(i, r)) for i, r in enumerate(req.runs)]
+        try:
+            for fut in asyncio.as_completed(tasks):
+                i, r, out, err = await fut
+                if err is not None:
+                    yield json.dumps({"index": i, "error": str(err)}) + "\n"
+                    continue
+                result, steps, run_id = out
+                resp = _build_response(run_id, result, steps)
+                yield json.dumps({"index": i, "result": resp.model_dump(mode="json")}) + "\n"
+        finally:
+            for t in tasks:
+                t.cancel()
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
 @app.post("/continue", response_model=RunResponse)
-def cont(req: ContinueRequest):
-    saved = load_run(req.run_id)
+async def cont(req: ContinueRequest):
+    saved = await run_in_threadpool(load_run, req.run_id)
     if not saved:
         raise HTTPException(status_code=404, detail="run_id not found")
 
@@ -68,62 +194,206 @@ def cont(req: ContinueRequest):
     context_patch = req.context_patch or {}
     merged_context = {**context, **context_patch}
 
-    result, steps, run_id = continue_agent(
+    # New steps are appended after the existing audit log; calls that
+    # already ran (per the checkpoint) are not executed again.
+    offset = await run_in_threadpool(count_steps, req.run_id)
+    result, steps, run_id = await acontinue_agent(
         run_id=req.run_id,
         user_goal=saved.get("user_goal", ""),
         plan=plan,
         context=merged_context,
+        step_sink=append_steps,
+        step_offset=offset,
+        checkpoint=saved.get("checkpoint"),
     )
 
     status = result.get("status", "ok")
     proposed_plan = result.get("proposed_plan")  # might still need input
 
-    save_run(
+    await run_in_threadpool(
+        save_run,
         run_id=req.run_id,
-        user_goal=req.user_goal,
+        user_goal=saved.get("user_goal", ""),
         status=status,
         final_answer=result.get("final_answer", ""),
-        steps=steps,
         proposed_plan=proposed_plan,
         context=merged_context,
+        checkpoint=result.get("checkpoint"),
     )
 
-    resp = RunResponse(
-        run_id=req.run_id,
-        status=status,
-        final_answer=result.get("final_answer", ""),
-        steps=[AgentStep(**s) for s in steps],
-    )
+    return _build_response(req.run_id, result, steps)
+@app.get("/run-queue/stats")
+def run_queue_stats():
+    return job_queue.snapshot()
 
-    if status == "needs_input":
-        resp.questions = result.get("questions")
-        resp.missing_fields = [MissingField(**m) for m in (result.get("missing_fields") or [])]
-        resp.proposed_plan = [ToolCall(**tc) for tc in (proposed_plan or [])]
+@app.get("/plan-cache/stats")
+def plan_cache_stats():
+    return plan_cache.snapshot()
 
-    return resp
 @app.get("/runs")
-def runs(limit: int = 50):
-    return {"runs": list_runs(limit=limit)}
+def runs(
+    limit: int = 50,
+    before: Optional[str] = None,
+    status: Optional[str] = None,
+    since: Optional[int] = None,
+    until: Optional[int] = None,
+):
+    """
+    Paginate with ?before=<created_at,run_id>; pass back next_before from
+    the previous page to get the next one.
+    """
+    cursor = None
+    if before:
+        ts, _, rid = before.partition(",")
+        if not ts.isdigit() or not rid:
+            raise HTTPException(status_code=400, detail="before must be '<created_at>,<run_id>'")
+        cursor = (int(ts), rid)
+
+    limit = max(1, min(limit, 500))
+    rows = list_runs(limit=limit, before=cursor, status=status, since=since, until=until)
+    next_before = f"{rows[-1]['created_at']},{rows[-1]['run_id']}" if len(rows) == limit else None
+    return {"runs": rows, "next_before": next_before}
+
+@app.get("/runs/search")
+def runs_search(q: str, limit: int = 20, offset: int = 0, status: Optional[str] = None):
+    """
+    Full-text search over goals, answers and tool args/results, best match
+    first. Page with ?offset=<next_offset>.
+    """
+    limit = max(1, min(limit, 100))
+    offset = max(0, offset)
+    hits = search_runs(q, limit=limit, offset=offset, status=status)
+    return {"hits": hits, "next_offset": offset + limit if len(hits) == limit else None}
+
+@app.get("/runs/export")
+def export_runs(
+    format: str = "jsonl",
+    since: Optional[int] = None,
+    until: Optional[int] = None,
+    status: Optional[str] = None,
+):
+    """
+    Stream every run in [since, until) with its full audit log.
+    format: jsonl (default), columnar (Parquet if pyarrow is installed,
+    else CSV), parquet, arrow or csv.
+    """
+    try:
+        fmt = resolve_format(format)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    mt, ext = media_type(fmt)
+    return StreamingResponse(
+        iter_export(fmt, since=since, until=until, status=status),
+        media_type=mt,
+        headers={"Content-Disposition": f'attachment; filename="runs.{ext}"'},
+    )
+
+def _conditional(
+    run_id: str,
+    kind: str,
+    media_type: str,
+    if_none_match: Optional[str],
+    render: Callable[[dict], Iterable[str]],
+    with_steps: bool = True,
+) -> Response:
+    """
+    Serve a rendered view of a run with ETag/Last-Modified. Returns 304 when
+    the client's copy is current and reuses a cached body when the run has
+    not changed since it was last rendered.
+
+    Otherwise the run is read together with its version (one transaction)
+    and the ETag names that snapshot. Without with_steps, render gets the
+    steps as a stream from run_steps, cut off at the snapshot's step count.
+    """
+    v = run_version(run_id)
+    if not v:
+        raise HTTPException(status_code=404, detail="run_id not found")
+    version, last_modified = v
+    etag = make_etag(run_id, kind, version)
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=_cache_headers(etag, last_modified))
+
+    body = report_cache.get(run_id, kind, version)
+    if body is not None:
+        return Response(body, media_type=media_type, headers=_cache_headers(etag, last_modified))
+
+    snap = read_run_at_version(run_id, step_end=None if with_steps else 0)
+    if snap is None:
+        raise HTTPException(status_code=404, detail="run_id not found")
+    version, last_modified, run, step_count = snap
+    etag = make_etag(run_id, kind, version)
+    if not with_steps:
+        run["steps"] = iter_steps(run_id, end=step_count)
+
+    def still_current() -> bool:
+        # Steps below step_count only change with a new version (a re-save).
+        now = run_version(run_id)
+        return now is not None and now[0] == version
+
+    chunks = timed_iter(render(run), REPORT_RENDER_SECONDS, kind)
+    return StreamingResponse(
+        report_cache.tee(run_id, kind, version, chunks, still_current),
+        media_type=media_type,
+        headers=_cache_headers(etag, last_modified),
+    )
+
+def _cache_headers(etag: str, last_modified: int) -> dict:
+    return {"ETag": etag, "Last-Modified": formatdate(last_modified, usegmt=True), "Cache-Control": "no-cache"}
 
 @app.get("/runs/{run_id}")
-def run_details(run_id: str):
-    r = read_run(run_id)
-    if not r:
+def run_details(
+    run_id: str,
+    step_start: int = 0,
+    step_end: Optional[int] = None,
+    if_none_match: Optional[str] = Header(None),
+):
+    if step_start or step_end is not None:
+        r = read_run(run_id, step_start=step_start, step_end=step_end)
+        if not r:
+            raise HTTPException(status_code=404, detail="run_id not found")
+        return r
+
+    def render(r: dict):
+        yield json.dumps(r)
+
+    return _conditional(run_id, "json", "application/json", if_none_match, render)
+
+@app.get("/runs/{run_id}/events")
+async def run_events(run_id: str, last_event_id: Optional[str] = Header(None)):
+    """
+    Server-sent events for a background run: queued, planner_started,
+    plan_ready, step_completed, then ok / needs_input / error. Reconnects
+    with Last-Event-ID resume after the last event received.
+    """
+    after = int(last_event_id) if last_event_id and last_event_id.isdigit() else 0
+    events = await job_queue.stream(run_id, after)
+    if events is None:
         raise HTTPException(status_code=404, detail="run_id not found")
-    return r
+    return StreamingResponse(
+        events,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.get("/runs/{run_id}/profile", response_class=PlainTextResponse)
+def run_profile(run_id: str):
+    profile = load_profile(run_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="No profile stored for this run_id")
+    return PlainTextResponse(
+        profile, headers={"Content-Disposition": f'attachment; filename="{run_id}.folded.txt"'},
+    )
+
 @app.get("/runs/{run_id}/report.md", response_class=PlainTextResponse)
-def report_md(run_id: str):
-    r = read_run(run_id)
-    if not r:
-        raise HTTPException(status_code=404, detail="run_id not found")
-    md = build_markdown_report(r)
-    return PlainTextResponse(md, media_type="text/markdown")
+def report_md(run_id: str, if_none_match: Optional[str] = Header(None)):
+    def render(r: dict):
+        return iter_joined(iter_markdown_report(r))
+
+    return _conditional(run_id, "md", "text/markdown; charset=utf-8", if_none_match, render, with_steps=False)
 
 @app.get("/runs/{run_id}/report.html", response_class=HTMLResponse)
-def report_html(run_id: str):
-    r = read_run(run_id)
-    if not r:
-        raise HTTPException(status_code=404, detail="run_id not found")
-    md = build_markdown_report(r)
-    html = markdown_to_basic_html(md)
-    return HTMLResponse(html)
+def report_html(run_id: str, if_none_match: Optional[str] = Header(None)):
+    def render(r: dict):
+        return iter_joined(iter_basic_html(iter_markdown_report(r)))
+
+    return _conditional(run_id, "html", "text/html; charset=utf-8", if_none_match, render, with_steps=False)
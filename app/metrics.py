@@ -0,0 +1,190 @@
+from bisect import bisect_left
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Tuple
+import functools
+import threading
+import time
+
+# In-process metrics in Prometheus text format (no client library needed).
+# Each thread records into its own shard, so observing takes no lock; shards
+# are summed when /metrics is scraped.
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_metrics: List["_Metric"] = []
+
+
+def _escape(v: str) -> str:
+    return v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _fmt_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(str(v))}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+def _fmt_value(v: float) -> str:
+    return str(int(v)) if float(v).is_integer() else repr(float(v))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._local = threading.local()
+        self._shards: List[Dict[Tuple[str, ...], Any]] = []
+        self._lock = threading.Lock()
+        _metrics.append(self)
+
+    def _shard(self) -> Dict[Tuple[str, ...], Any]:
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = self._local.shard = {}
+            with self._lock:
+                self._shards.append(shard)
+        return shard
+
+    def _items(self) -> Iterator[Tuple[Tuple[str, ...], Any]]:
+        with self._lock:
+            shards = list(self._shards)
+        for shard in shards:
+            yield from list(shard.items())
+
+    def render(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        shard = self._shard()
+        shard[labels] = shard.get(labels, 0) + amount
+
+    def render(self) -> List[str]:
+        totals: Dict[Tuple[str, ...], float] = {}
+        for labels, v in self._items():
+            totals[labels] = totals.get(labels, 0) + v
+        return [f"{self.name}{_fmt_labels(self.labelnames, k)} {_fmt_value(v)}" for k, v in sorted(totals.items())]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Tuple[str, ...] = (), buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, *labels: str) -> None:
+        shard = self._shard()
+        series = shard.get(labels)
+        if series is None:
+            # per-bucket counts (last one is +Inf), then the sum
+            series = shard[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+        series[bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def time(self, *labels: str) -> "_Timer":
+        return _Timer(self, labels)
+
+    def render(self) -> List[str]:
+        totals: Dict[Tuple[str, ...], List[float]] = {}
+        for labels, series in self._items():
+            acc = totals.setdefault(labels, [0] * len(series))
+            for i, v in enumerate(series):
+                acc[i] += v
+        lines = []
+        for labels, series in sorted(totals.items()):
+            cumulative = 0
+            for le, n in zip(self.buckets + (float("inf"),), series):
+                cumulative += n
+                le_label = 'le="' + ("+Inf" if le == float("inf") else repr(le)) + '"'
+                lines.append(f"{self.name}_bucket{_fmt_labels(self.labelnames, labels, le_label)} {_fmt_value(cumulative)}")
+            lines.append(f"{self.name}_sum{_fmt_labels(self.labelnames, labels)} {_fmt_value(series[-1])}")
+            lines.append(f"{self.name}_count{_fmt_labels(self.labelnames, labels)} {_fmt_value(cumulative)}")
+        return lines
+
+
+class _Timer:
+    __slots__ = ("hist", "labels", "t0")
+
+    def __init__(self, hist: Histogram, labels: Tuple[str, ...]):
+        self.hist = hist
+        self.labels = labels
+
+    def __enter__(self) -> "_Timer":
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.hist.observe(time.perf_counter() - self.t0, *self.labels)
+
+
+def timed(hist: Histogram, *labels: str) -> Callable:
+    """
+    Decorator: observe the wall time of every call.
+    """
+    def deco(fn: Callable) -> Callable:
+        @functools.wraps(fn)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            t0 = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                hist.observe(time.perf_counter() - t0, *labels)
+        return wrapper
+    return deco
+
+def timed_iter(chunks: Iterable[Any], hist: Histogram, *labels: str) -> Iterator[Any]:
+    """
+    Pass chunks through, observing only the time spent producing them (not
+    the time the consumer spends sending them).
+    """
+    spent = 0.0
+    it = iter(chunks)
+    while True:
+        t0 = time.perf_counter()
+        try:
+            chunk = next(it)
+        except StopIteration:
+            spent += time.perf_counter() - t0
+            break
+        spent += time.perf_counter() - t0
+        yield chunk
+    hist.observe(spent, *labels)
+
+
+def render_metrics() -> str:
+    out: List[str] = []
+    for m in _metrics:
+        out.append(f"# HELP {m.name} {m.help}")
+        out.append(f"# TYPE {m.name} {m.kind}")
+        out.extend(m.render())
+    return "\n".join(out) + "\n"
+
+
+# Planner / Ollama
+OLLAMA_REQUEST_SECONDS = Histogram("agent_ollama_request_seconds", "Ollama /api/chat round trip.", ("call",))
+OLLAMA_TOKENS = Counter("agent_ollama_tokens_total", "Tokens reported by Ollama.", ("kind",))
+PLAN_PARSE_SECONDS = Histogram(
+    "agent_plan_parse_seconds", "Time spent extracting the JSON plan from model output.",
+    buckets=(0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.05),
+)
+PLAN_REPAIRS = Counter("agent_plan_repairs_total", "Planner outputs that needed a repair round trip.")
+PLAN_SALVAGES = Counter("agent_plan_salvages_total", "Invalid planner outputs recovered locally (valid prefix of the array).")
+PLANS = Counter("agent_plans_total", "Plans by the tier that produced them.", ("source",))
+
+# Execution
+TOOL_SECONDS = Histogram("agent_tool_seconds", "Tool execution time.", ("tool",))
+TOOL_ERRORS = Counter("agent_tool_errors_total", "Tools that raised.", ("tool",))
+VALIDATION_FAILURES = Counter("agent_validation_failures_total", "Tool calls whose args failed validation.", ("tool",))
+
+# Background runs
+RUN_QUEUE_WAIT_SECONDS = Histogram("agent_run_queue_wait_seconds", "Time a background run waited for a worker.")
+BACKGROUND_RUNS = Counter("agent_background_runs_total", "Background runs by final status (rejected: queue full).", ("status",))
+
+# Storage and rendering
+SQLITE_SECONDS = Histogram("agent_sqlite_seconds", "SQLite storage calls.", ("op",))
+REPORT_RENDER_SECONDS = Histogram("agent_report_render_seconds", "Rendering a run view (excludes cache hits).", ("kind",))
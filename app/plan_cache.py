@@ -0,0 +1,196 @@
+from collections import OrderedDict
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+import asyncio
+import hashlib
+import json
+import re
+import threading
+import time
+
+from .config import PLAN_CACHE_ENABLED, PLAN_CACHE_MAX_ENTRIES, PLAN_CACHE_TTL_SECONDS
+from .planner import REGISTRY_VERSION
+from .storage import init_db, get_cached_plan, put_cached_plan
+
+
+def _normalize_goal(user_goal: str) -> str:
+    return " ".join((user_goal or "").lower().split())
+
+def cache_key(user_goal: str, context: Optional[Dict[str, Any]], model: str) -> str:
+    """
+    Key on the goal, model, registry version and the *shape* of the context.
+    Context values are not part of the key: fill_from_context supplies them.
+    """
+    parts = {
+        "goal": _normalize_goal(user_goal),
+        "model": model,
+        "registry": REGISTRY_VERSION,
+        "context_keys": sorted((context or {}).keys()),
+    }
+    return hashlib.sha256(json.dumps(parts, sort_keys=True).encode("utf-8")).hexdigest()
+
+def _blank(value: Any) -> Any:
+    return [] if isinstance(value, list) else ""
+
+# A cached plan may only refer to context values, never contain them.
+_CONTEXT_REF = re.compile(r"\{\{context:[^{}]+\}\}")
+
+# Shorter strings are only matched whole: "en" inside a longer literal is
+# more likely a coincidence than a copied value.
+_MIN_SHARED_CHARS = 4
+
+def _strings(value: Any) -> Iterator[str]:
+    if isinstance(value, str):
+        yield value
+    elif isinstance(value, list):
+        for v in value:
+            yield from _strings(v)
+    elif isinstance(value, dict):
+        for v in value.values():
+            yield from _strings(v)
+
+def _to_refs(value: Any, refs: List[Tuple[Any, str]], pattern: Optional["re.Pattern[str]"], by_text: Dict[str, str]) -> Any:
+    for v, ref in refs:
+        if value == v and type(value) is type(v):
+            return ref
+    if isinstance(value, str):
+        return pattern.sub(lambda m: by_text[m.group(0)], value) if pattern else value
+    if isinstance(value, list):
+        return [_to_refs(v, refs, pattern, by_text) for v in value]
+    if isinstance(value, dict):
+        return {k: _to_refs(v, refs, pattern, by_text) for k, v in value.items()}
+    return value
+
+def _shares_text(literal: str, context_strings: List[str]) -> bool:
+    for part in _CONTEXT_REF.split(literal):
+        part = part.strip()
+        if part and any(
+            (len(part) >= _MIN_SHARED_CHARS and part in s) or (len(s) >= _MIN_SHARED_CHARS and s in part)
+            for s in context_strings
+        ):
+            return True
+    return False
+
+def templatize_plan(plan: List[Dict[str, Any]], context: Optional[Dict[str, Any]]) -> Optional[List[Dict[str, Any]]]:
+    """
+    Make a plan reusable for the next request with the same goal and context
+    shape. Args the context provides by name are blanked (fill_from_context
+    refills them), and any other value that equals or contains a context
+    value becomes a {{context:KEY}} reference, resolved against the next
+    request's context.
+
+    Returns None when a literal still shares text with the context (part of
+    a value, an item of a list value, a key that cannot be referenced):
+    caching it would replay this request's data to the next caller.
+    """
+    provided = set(context or {})
+    ctx = {k: v for k, v in (context or {}).items() if v not in (None, "", [], {})}
+    referable = {k: v for k, v in ctx.items() if "{" not in k and "}" not in k}
+    refs = [(v, f"{{{{context:{k}}}}}") for k, v in referable.items()]
+    by_text = {v: ref for v, ref in refs if isinstance(v, str) and len(v) >= _MIN_SHARED_CHARS}
+    pattern = re.compile("|".join(re.escape(t) for t in sorted(by_text, key=len, reverse=True))) if by_text else None
+    context_strings = [s for s in _strings(ctx) if s.strip()]
+
+    out = []
+    for call in plan:
+        args = {
+            k: (_blank(v) if k in provided else _to_refs(v, refs, pattern, by_text))
+            for k, v in (call.get("args") or {}).items()
+        }
+        if any(_shares_text(s, context_strings) for s in _strings(args)):
+            return None
+        out.append({"name": call.get("name"), "args": args})
+    return out
+
+
+class PlanCache:
+    """
+    Two-tier plan cache: in-memory LRU with TTL, backed by SQLite.
+    """
+
+    def __init__(self, max_entries: int = PLAN_CACHE_MAX_ENTRIES, ttl: int = PLAN_CACHE_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._mem: "OrderedDict[str, Tuple[float, List[Dict[str, Any]]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"memory_hits": 0, "sqlite_hits": 0, "misses": 0, "bypassed": 0, "stores": 0}
+        self._db_ready = False
+
+    def _ensure_db(self) -> None:
+        # Library users may call run_agent() without the app's startup hook.
+        if not self._db_ready:
+            init_db()
+            self._db_ready = True
+
+    def get(self, key: str) -> Tuple[Optional[List[Dict[str, Any]]], Optional[str]]:
+        """
+        Returns: (plan, source) where source is "memory" or "sqlite".
+        """
+        plan = self._get_memory(key)
+        if plan is not None:
+            return plan, "memory"
+        return self._get_sqlite(key)
+
+    async def aget(self, key: str) -> Tuple[Optional[List[Dict[str, Any]]], Optional[str]]:
+        """
+        Async get: memory hits stay on the event loop, SQLite is offloaded.
+        """
+        plan = self._get_memory(key)
+        if plan is not None:
+            return plan, "memory"
+        return await asyncio.to_thread(self._get_sqlite, key)
+
+    def _get_memory(self, key: str) -> Optional[List[Dict[str, Any]]]:
+        with self._lock:
+            hit = self._mem.get(key)
+            if hit and time.time() - hit[0] <= self.ttl:
+                self._mem.move_to_end(key)
+                self.stats["memory_hits"] += 1
+                return hit[1]
+            if hit:
+                del self._mem[key]
+        return None
+
+    def _get_sqlite(self, key: str) -> Tuple[Optional[List[Dict[str, Any]]], Optional[str]]:
+        now = time.time()
+        self._ensure_db()
+        plan = get_cached_plan(key, max_age=self.ttl)
+        with self._lock:
+            if plan is None:
+                self.stats["misses"] += 1
+                return None, None
+            self.stats["sqlite_hits"] += 1
+            self._remember(key, plan, now)
+        return plan, "sqlite"
+
+    def put(self, key: str, plan: List[Dict[str, Any]]) -> None:
+        with self._lock:
+            self._remember(key, plan, time.time())
+            self.stats["stores"] += 1
+        self._ensure_db()
+        put_cached_plan(key, plan)
+
+    async def aput(self, key: str, plan: List[Dict[str, Any]]) -> None:
+        await asyncio.to_thread(self.put, key, plan)
+
+    def note_bypass(self) -> None:
+        with self._lock:
+            self.stats["bypassed"] += 1
+
+    def _remember(self, key: str, plan: List[Dict[str, Any]], ts: float) -> None:
+        self._mem[key] = (ts, plan)
+        self._mem.move_to_end(key)
+        while len(self._mem) > self.max_entries:
+            self._mem.popitem(last=False)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "enabled": PLAN_CACHE_ENABLED,
+                "entries_in_memory": len(self._mem),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl,
+                **self.stats,
+            }
+
+
+plan_cache = PlanCache()
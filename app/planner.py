@@ -1,31 +1,15 @@
+import bisect
+import hashlib
 import json
-from typing import Any, Dict, List, Optional, Tuple
+import re
+import time
+from typing import Any, AsyncIterator, Dict, Generator, Iterator, List, Optional, Tuple
 
-from .config import MAX_STEPS
-from ollama_client import ollama_chat  # uses your root-level file
-
-TOOL_SPECS = [
-    {
-        "name": "summarize_text",
-        "description": "Summarize a text block.",
-        "args_schema": {"text": "string"},
-    },
-    {
-        "name": "draft_email",
-        "description": "Draft an email with bullet points.",
-        "args_schema": {"to": "string", "subject": "string", "bullet_points": "string[]"},
-    },
-    {
-        "name": "create_tasks",
-        "description": "Create task items from a list of task titles.",
-        "args_schema": {"tasks": "string[]"},
-    },
-    {
-        "name": "schedule_reminder",
-        "description": "Schedule a reminder note for a time.",
-        "args_schema": {"when": "string", "note": "string"},
-    },
-]
+from .config import MAX_STEPS, PLANNER_CONTEXT_BUDGET_CHARS, PLANNER_STRUCTURED_OUTPUT, RULE_PLANNER_MIN_CONFIDENCE
+from .planner_health import planner_health
+from .metrics import OLLAMA_REQUEST_SECONDS, OLLAMA_TOKENS, PLAN_PARSE_SECONDS, PLAN_REPAIRS, PLAN_SALVAGES
+from .registry import COMPILED, PLAN_SCHEMA, TOOLS, TOOL_NAMES, TOOL_SPECS
+from ollama_client import get_client  # uses your root-level file
 
 SYSTEM = """You are a strict JSON planner for a workflow automation agent.
 
@@ -42,32 +26,204 @@ Rules:
 - Args MUST match the args_schema types.
 - Prefer using values from Context JSON.
 - If a required arg is missing from context, include the key with an empty string "" (for strings) or [] (for lists).
+- To use the output of an earlier call, write "{{result:N.FIELD}}" as the value (N = 0-based position of that call in this array, FIELD = one of its result fields), e.g. "{{result:0.summary}}". Calls that do not reference each other may run in parallel.
 - Maximum number of tool calls: MAX_STEPS.
 
 Correct examples:
 [
   {"name":"summarize_text","args":{"text":"..."}},
-  {"name":"draft_email","args":{"to":"team@company.com","subject":"Follow-up","bullet_points":["a","b"]}},
+  {"name":"draft_email","args":{"to":"team@company.com","subject":"Follow-up","bullet_points":["{{result:0.summary}}"]}},
   {"name":"schedule_reminder","args":{"when":"tomorrow 09:00","note":"Follow up"}}
 ]
 """
 
 
-def _make_prompt(user_goal: str, context: Optional[Dict[str, Any]]) -> str:
-    return f"""
-Tool registry (name, description, args schema):
-{json.dumps(TOOL_SPECS, indent=2)}
+# Static part of every planner request, built once. It goes in the system
+# message so it is a byte-identical prefix across requests and Ollama can
+# reuse its KV cache instead of re-evaluating it; only the goal and context
+# in the user message vary.
+_REGISTRY_JSON = json.dumps(TOOL_SPECS, separators=(",", ":"))
+
+PLANNER_SYSTEM = f"""{SYSTEM}
+Tool registry (name, description, args schema, result fields):
+{_REGISTRY_JSON}
 
 MAX_STEPS = {MAX_STEPS}
 
-User goal:
-{user_goal}
+Large context values are shown as "{{{{context:KEY}}}}". Use that exact string as the arg value to pass the value through.
+"""
+
+# Ollama's "format": constrains generation to the plan schema.
+PLAN_FORMAT = PLAN_SCHEMA if PLANNER_STRUCTURED_OUTPUT else None
+
+# Changes whenever the tool registry or planner instructions change, so
+# cached plans from an older registry are never reused.
+REGISTRY_VERSION = hashlib.sha256(PLANNER_SYSTEM.encode("utf-8")).hexdigest()[:16]
+
+
+def _dumps(value: Any) -> str:
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+
+def _type_name(value: Any) -> str:
+    if isinstance(value, str):
+        return "string"
+    if isinstance(value, list):
+        return "list"
+    if isinstance(value, dict):
+        return "object"
+    return type(value).__name__
+
+def _budget_context(
+    context: Optional[Dict[str, Any]], budget: int = PLANNER_CONTEXT_BUDGET_CHARS
+) -> Tuple[Optional[Dict[str, Any]], Dict[str, str]]:
+    """
+    Shrink the context shown to the planner to about `budget` characters of
+    JSON by replacing the largest values with {{context:KEY}} references.
+    Returns: (context for the prompt, {elided key: "type, N chars"})
+    """
+    if not context:
+        return context, {}
+    sizes = {k: len(_dumps(v)) for k, v in context.items()}
+    total = sum(sizes.values()) + sum(len(k) + 4 for k in context)
+    shown = dict(context)
+    elided: Dict[str, str] = {}
+    for k in sorted(sizes, key=sizes.get, reverse=True):
+        if total <= budget:
+            break
+        ref = f"{{{{context:{k}}}}}"
+        if sizes[k] <= len(ref) + 2:
+            break
+        shown[k] = ref
+        elided[k] = f"{_type_name(context[k])}, {sizes[k]} chars"
+        total -= sizes[k] - (len(ref) + 2)
+    return shown, elided
+
+def estimate_tokens(text: str) -> int:
+    # ~4 characters per token for English/JSON with Llama-style tokenizers.
+    return (len(text) + 3) // 4
+
+def _make_prompt(user_goal: str, context: Optional[Dict[str, Any]]) -> Tuple[str, Dict[str, Any]]:
+    """
+    Returns: (user message, prompt stats for debug info)
+    """
+    shown, elided = _budget_context(context)
+    parts = [
+        f"User goal:\n{user_goal}",
+        f"Context JSON (may be null):\n{_dumps(shown) if shown else 'null'}",
+    ]
+    if elided:
+        parts.append("Elided context values:" + "".join(f"\n- {k} ({info})" for k, info in elided.items()))
+    parts.append("Return ONLY the JSON array plan now.")
+    prompt = "\n\n".join(parts)
+    stats = {
+        "prompt_tokens_est": estimate_tokens(PLANNER_SYSTEM) + estimate_tokens(prompt),
+        "prefix_tokens_est": estimate_tokens(PLANNER_SYSTEM),
+        "elided_context": sorted(elided),
+    }
+    return prompt, stats
+
+# Rule tier templates, compiled from the tool registry (goal keywords plus
+# the args each tool needs).
+RULE_TEMPLATES = [
+    {
+        "name": t["name"],
+        "pattern": re.compile(t["keywords"], re.IGNORECASE),
+        "args": t["args_schema"],
+        "required": set(COMPILED[t["name"]].required),
+        "from_results": t.get("from_results") or {},
+    }
+    for t in TOOLS
+    if t.get("keywords")
+]
+
+_ARG_TYPES = {"string": str, "string[]": list}
+
 
-Context JSON (may be null):
-{json.dumps(context, indent=2) if context else "null"}
+# Clause boundaries for intent detection: punctuation and the words that
+# join requests ("summarize the notes and email the team").
+_CLAUSE_BREAK = re.compile(r"[,;:.!?\n]|\b(?:and|then|also|plus)\b", re.IGNORECASE)
+
+def _goal_intents(user_goal: str) -> Tuple[List[Tuple[int, Dict[str, Any]]], int]:
+    """
+    Tools the goal asks for: in each clause, the tool whose keyword comes
+    first. Other tools' keywords later in the same clause are objects, not
+    requests ("summarize this email thread", "email the summary").
+    Returns: ([(position, template)], number of such object mentions)
+    """
+    breaks = [m.start() for m in _CLAUSE_BREAK.finditer(user_goal)]
+    hits = sorted(
+        (m.start(), i, tpl)
+        for i, tpl in enumerate(RULE_TEMPLATES)
+        for m in tpl["pattern"].finditer(user_goal)
+    )
+    intents: Dict[str, Tuple[int, Dict[str, Any]]] = {}
+    objects: set = set()
+    lead: Dict[int, str] = {}
+    for pos, _, tpl in hits:
+        clause = bisect.bisect_right(breaks, pos)
+        first = lead.setdefault(clause, tpl["name"])
+        if first == tpl["name"]:
+            intents.setdefault(tpl["name"], (pos, tpl))
+        else:
+            objects.add((clause, tpl["name"]))
+    return sorted(intents.values(), key=lambda x: x[0]), len(objects)
+
+def rule_plan(user_goal: str, context: Optional[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], float]:
+    """
+    Deterministic planner tier. A tool is planned when the goal asks for it
+    (see _goal_intents) and the context holds every required arg and at
+    least one arg at all (same key, right type); args
+    are emitted as {{context:KEY}} references. Tools are ordered by where
+    the goal mentions them. An arg the context lacks is taken from an
+    earlier call's result ({{result:N.FIELD}}) when the registry says so,
+    e.g. the email's bullet points from the summary.
+
+    Confidence is the share of requested tools that could be planned,
+    discounted for context keys no planned tool uses and for tool keywords
+    the goal uses as objects, since those goals are ambiguous.
+    Returns: (plan, confidence); confidence 0.0 means "ask the LLM".
+    """
+    ctx = context or {}
+    mentioned, objects = _goal_intents(user_goal)
+    if not mentioned:
+        return [], 0.0
+
+    plan: List[Dict[str, Any]] = []
+    used: set = set()
+    planned_at: Dict[str, int] = {}
+    for _, tpl in mentioned:
+        args: Dict[str, Any] = {}
+        for arg, typ in tpl["args"].items():
+            value = ctx.get(arg)
+            if isinstance(value, _ARG_TYPES.get(typ, str)) and value:
+                args[arg] = f"{{{{context:{arg}}}}}"
+                continue
+            tool, _, field = tpl["from_results"].get(arg, "").partition(".")
+            if tool in planned_at:
+                ref = f"{{{{result:{planned_at[tool]}.{field}}}}}"
+                args[arg] = [ref] if typ == "string[]" else ref
+        if args and tpl["required"] <= args.keys():
+            planned_at.setdefault(tpl["name"], len(plan))
+            plan.append({"name": tpl["name"], "args": args})
+            used.update(k for k in args if k in ctx)
+
+    if not plan:
+        return [], 0.0
+    coverage = len(plan) / len(mentioned)
+    unused = (len(ctx) - len(used)) / len(ctx) if ctx else 0.0
+    ambiguous = objects / (len(mentioned) + objects)
+    return plan[:MAX_STEPS], round(coverage * (1 - 0.5 * unused) * (1 - 0.5 * ambiguous), 3)
+
+def plan_with_rules(user_goal: str, context: Optional[Dict[str, Any]] = None) -> Optional[Tuple[List[Dict[str, Any]], Dict[str, Any]]]:
+    """
+    Returns (plan, debug_info) when the rule tier is confident enough,
+    otherwise None.
+    """
+    plan, confidence = rule_plan(user_goal, context)
+    if not plan or confidence < RULE_PLANNER_MIN_CONFIDENCE:
+        return None
+    return plan, {"source": "rules", "confidence": confidence, "raw_output": None}
 
-Return ONLY the JSON array plan now.
-""".strip()
 
 def _extract_json(text: str) -> Any:
     """
@@ -83,35 +239,336 @@ def _extract_json(text: str) -> Any:
         return json.loads(text[start : end + 1])
     raise ValueError("Could not find a JSON array in model output.")
 
-def plan_with_ollama(user_goal: str, context: Optional[Dict[str, Any]] = None, model: str = "llama3.1:8b") -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+def _parse(text: str) -> Any:
+    with PLAN_PARSE_SECONDS.time():
+        return _extract_json(text)
+
+def _salvage(text: str) -> Optional[List[Any]]:
     """
-    Returns: (plan, debug_info)
-    plan is a list of dicts: {"name":..., "args":...}
-    debug_info includes raw model output for logging.
+    The complete elements of a truncated or partly broken JSON array, up to
+    the first one that does not parse (None if there are none). Recovers
+    output cut off by the token limit without another LLM call.
+    """
+    parser = PlanStreamParser()
+    items: List[Any] = []
+    # Feed up to each closing bracket, so a bad element only loses itself.
+    for piece in re.split(r"(?<=[}\]])", text):
+        try:
+            items.extend(parser.feed(piece))
+        except json.JSONDecodeError:
+            break
+        if parser.done:
+            break
+    return items or None
+
+def _decode_plan(text: str) -> Tuple[Optional[Any], str]:
+    """
+    Returns: (parsed, how) with how "strict" or "salvaged"; parsed is None
+    (how "invalid") when only a repair call can help.
     """
-    prompt = _make_prompt(user_goal, context)
-    raw = ollama_chat(prompt=prompt, model=model, system=SYSTEM)
+    try:
+        return _parse(text), "strict"
+    except ValueError:
+        pass
+    items = _salvage(text)
+    if items is None:
+        return None, "invalid"
+    PLAN_SALVAGES.inc()
+    return items, "salvaged"
+
+def _usable(text: str) -> bool:
+    # Which reply of a hedged request (OllamaPool) is usable as a plan.
+    try:
+        _extract_json(text)
+    except ValueError:
+        return _salvage(text) is not None
+    return True
+
+def _observe_ollama(call: str, seconds: float, usage: Dict[str, Any]) -> None:
+    OLLAMA_REQUEST_SECONDS.observe(seconds, call)
+    if "prompt_eval_count" in usage:
+        OLLAMA_TOKENS.inc("prompt", amount=usage["prompt_eval_count"])
+    if "eval_count" in usage:
+        OLLAMA_TOKENS.inc("eval", amount=usage["eval_count"])
 
+def _clean_plan_item(item: Any) -> Optional[Dict[str, Any]]:
+    if not isinstance(item, dict):
+        return None
+    name = item.get("name")
+    args = item.get("args", {})
+    if name in TOOL_NAMES and isinstance(args, dict):
+        return {"name": name, "args": args}
+    return None
+
+REPAIR_SYSTEM = PLANNER_SYSTEM + "\nIf the previous output was invalid, fix it and output ONLY valid JSON."
+
+def _repair_prompt(raw: str) -> str:
+    return f"Fix this into valid JSON array ONLY:\n\n{raw}"
+
+# The planning logic is written once, as generators that yield Ollama chat
+# requests (keyword args for client.chat/achat), receive the reply text and
+# return their result. _drive and _adrive run one with the sync or async
+# client, so the two entry points differ only in the transport call.
+ChatSteps = Generator[Dict[str, Any], str, Any]
+
+def _chat_request(prompt: str, system: str, model: str, usage: Dict[str, Any]) -> Dict[str, Any]:
+    return {"prompt": prompt, "model": model, "system": system, "stats": usage, "format": PLAN_FORMAT}
+
+def _drive(steps: ChatSteps, client: Any) -> Any:
+    try:
+        request = next(steps)
+        while True:
+            request = steps.send(client.chat(**request))
+    except StopIteration as done:
+        return done.value
+
+async def _adrive(steps: ChatSteps, client: Any) -> Any:
     try:
-        parsed = _extract_json(raw)
-    except Exception as e:
-        # One repair attempt: tell model to fix JSON only.
-        repair_system = SYSTEM + "\nIf the previous output was invalid, fix it and output ONLY valid JSON."
-        raw2 = ollama_chat(prompt=f"Fix this into valid JSON array ONLY:\n\n{raw}", model=model, system=repair_system)
-        parsed = _extract_json(raw2)
-        raw = raw2
+        request = next(steps)
+        while True:
+            request = steps.send(await client.achat(**request, accept=_usable))
+    except StopIteration as done:
+        return done.value
 
+def _repair(raw: str, model: str) -> ChatSteps:
+    # One repair attempt: tell model to fix JSON only.
+    PLAN_REPAIRS.inc()
+    usage: Dict[str, Any] = {}
+    t0 = time.perf_counter()
+    raw2 = yield _chat_request(_repair_prompt(raw), REPAIR_SYSTEM, model, usage)
+    _observe_ollama("repair", time.perf_counter() - t0, usage)
+    return _parse(raw2), raw2
+
+def _to_plan(parsed: Any) -> List[Dict[str, Any]]:
     if not isinstance(parsed, list):
         raise ValueError("Planner output is not a JSON array.")
 
     # Basic validation + truncation
     plan: List[Dict[str, Any]] = []
     for item in parsed[:MAX_STEPS]:
-        if not isinstance(item, dict):
-            continue
-        name = item.get("name")
-        args = item.get("args", {})
-        if name in {t["name"] for t in TOOL_SPECS} and isinstance(args, dict):
-            plan.append({"name": name, "args": args})
-
-    return plan, {"raw_output": raw, "prompt": prompt}
+        call = _clean_plan_item(item)
+        if call is not None:
+            plan.append(call)
+    return plan
+
+def _plan(user_goal: str, context: Optional[Dict[str, Any]], model: str) -> ChatSteps:
+    prompt, stats = _make_prompt(user_goal, context)
+    usage: Dict[str, Any] = {}
+    t0 = time.perf_counter()
+    raw = yield _chat_request(prompt, PLANNER_SYSTEM, model, usage)
+    _observe_ollama("plan", time.perf_counter() - t0, usage)
+
+    parsed, how = _decode_plan(raw)
+    if parsed is None:
+        parsed, raw = yield from _repair(raw, model)
+        how = "repaired"
+
+    elapsed = time.perf_counter() - t0
+    planner_health.record(elapsed)
+    debug = {"raw_output": raw, "prompt": prompt, "planner_ms": round(elapsed * 1000, 3), "ollama": usage, "parse": how, **stats}
+    return _to_plan(parsed), debug
+
+def plan_with_ollama(user_goal: str, context: Optional[Dict[str, Any]] = None, model: str = "llama3.1:8b") -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+    """
+    Returns: (plan, debug_info)
+    plan is a list of dicts: {"name":..., "args":...}
+    debug_info includes raw model output for logging.
+    """
+    return _drive(_plan(user_goal, context, model), get_client())
+
+async def aplan_with_ollama(user_goal: str, context: Optional[Dict[str, Any]] = None, model: str = "llama3.1:8b") -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+    """
+    Async variant of plan_with_ollama (same return value).
+    """
+    return await _adrive(_plan(user_goal, context, model), get_client())
+
+
+class PlanStreamParser:
+    """
+    Incremental parser for a streamed JSON array of tool calls.
+    feed() returns every top-level array element whose closing brace/bracket
+    has arrived so far. Text before the opening '[' is ignored.
+    """
+
+    def __init__(self) -> None:
+        self.buf: List[str] = []
+        self.depth = 0
+        self.in_string = False
+        self.escape = False
+        self.started = False
+        self.done = False
+
+    def feed(self, chunk: str) -> List[Any]:
+        out: List[Any] = []
+        for ch in chunk:
+            if self.done:
+                break
+            if not self.started:
+                if ch == "[":
+                    self.started = True
+                    self.depth = 1
+                continue
+
+            if self.depth > 1:
+                self.buf.append(ch)
+
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif ch == "\\":
+                    self.escape = True
+                elif ch == '"':
+                    self.in_string = False
+                continue
+
+            if ch == '"':
+                self.in_string = True
+            elif ch in "{[":
+                if self.depth == 1:
+                    self.buf = [ch]
+                self.depth += 1
+            elif ch in "}]":
+                self.depth -= 1
+                if self.depth == 1:
+                    out.append(json.loads("".join(self.buf)))
+                    self.buf = []
+                elif self.depth == 0:
+                    self.done = True
+        return out
+
+
+class _PlanStream:
+    """
+    State of one streaming planner call (shared by sync/async): the request
+    to stream, the chunk parser, and the bookkeeping once the stream ends.
+    """
+
+    def __init__(self, user_goal: str, context: Optional[Dict[str, Any]], model: str, debug: Optional[Dict[str, Any]]) -> None:
+        self.debug = debug if debug is not None else {}
+        self.model = model
+        prompt, stats = _make_prompt(user_goal, context)
+        self.debug["prompt"] = prompt
+        self.debug.update(stats)
+        self.usage: Dict[str, Any] = {}
+        self.request = _chat_request(prompt, PLANNER_SYSTEM, model, self.usage)
+        self.parser = PlanStreamParser()
+        self.raw_parts: List[str] = []
+        self.emitted = 0
+        self.broken = False
+        # Time spent waiting on Ollama's stream. The consumer runs tools
+        # between chunks; that time is not part of the planner call.
+        self.waited = 0.0
+        self.wait_start = time.perf_counter()
+
+    @property
+    def finished(self) -> bool:
+        # Stop generating once MAX_STEPS calls are out. A closed array is
+        # read to the end: Ollama's stats come in the stream's last line.
+        return self.emitted >= MAX_STEPS
+
+    @property
+    def raw(self) -> str:
+        return "".join(self.raw_parts)
+
+    def outcome(self) -> str:
+        """
+        After the stream: "strict", or "salvaged" when the calls emitted are
+        only a prefix (a broken element, or the array was never closed).
+        """
+        if self.emitted >= MAX_STEPS or (self.parser.done and not self.broken):
+            return "strict"
+        PLAN_SALVAGES.inc()
+        return "salvaged"
+
+    def feed(self, chunk: str) -> List[Dict[str, Any]]:
+        self.waited += time.perf_counter() - self.wait_start
+        self.raw_parts.append(chunk)
+        if self.broken:
+            return []
+        try:
+            items = self.parser.feed(chunk)
+        except json.JSONDecodeError:
+            # Malformed element; keep reading so the repair path sees it all.
+            self.broken = True
+            return []
+        out = []
+        for item in items:
+            call = _clean_plan_item(item)
+            if call is not None and self.emitted < MAX_STEPS:
+                self.emitted += 1
+                out.append(call)
+        return out
+
+    def waiting(self) -> None:
+        # The consumer is done with the calls from the last chunk.
+        self.wait_start = time.perf_counter()
+
+    def finish(self) -> ChatSteps:
+        """
+        After the stream: fill in debug and return the calls still to run,
+        which are only non-empty if the stream produced none (then the whole
+        output is decoded, or repaired, like plan_with_ollama does).
+        """
+        debug = self.debug
+        t0 = time.perf_counter()
+        self.waited += t0 - self.wait_start
+        _observe_ollama("plan_stream", self.waited, self.usage)
+        raw = debug["raw_output"] = self.raw
+        debug["ollama"] = self.usage
+        plan: List[Dict[str, Any]] = []
+        if self.emitted:
+            debug["parse"] = self.outcome()
+        else:
+            parsed, debug["parse"] = _decode_plan(raw)
+            if parsed is None:
+                parsed, debug["raw_output"] = yield from _repair(raw, self.model)
+                debug["parse"] = "repaired"
+            plan = _to_plan(parsed)
+
+        elapsed = self.waited + time.perf_counter() - t0
+        debug["planner_ms"] = round(elapsed * 1000, 3)
+        planner_health.record(elapsed)
+        return plan
+
+
+def stream_plan_with_ollama(
+    user_goal: str,
+    context: Optional[Dict[str, Any]] = None,
+    model: str = "llama3.1:8b",
+    debug: Optional[Dict[str, Any]] = None,
+) -> Iterator[Dict[str, Any]]:
+    """
+    Streaming planner: yields each tool call as soon as its JSON object is
+    complete in Ollama's token stream, so execution can start before the
+    whole plan is generated.
+    debug (if given) is filled with raw_output/prompt once the stream ends.
+    """
+    client = get_client()
+    st = _PlanStream(user_goal, context, model, debug)
+    for chunk in client.chat_stream(**st.request):
+        yield from st.feed(chunk)
+        st.waiting()
+        if st.finished:
+            break
+    yield from _drive(st.finish(), client)
+
+
+async def astream_plan_with_ollama(
+    user_goal: str,
+    context: Optional[Dict[str, Any]] = None,
+    model: str = "llama3.1:8b",
+    debug: Optional[Dict[str, Any]] = None,
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Async variant of stream_plan_with_ollama.
+    """
+    client = get_client()
+    st = _PlanStream(user_goal, context, model, debug)
+    async for chunk in client.achat_stream(**st.request):
+        for call in st.feed(chunk):
+            yield call
+        st.waiting()
+        if st.finished:
+            break
+    for call in await _adrive(st.finish(), client):
+        yield call
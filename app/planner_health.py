@@ -0,0 +1,118 @@
+from collections import deque
+from typing import Any, Deque, Dict, Optional
+import asyncio
+import threading
+import time
+
+from .config import OLLAMA_MODEL, PLANNER_WARMUP, PLANNER_KEEP_WARM_SECONDS, PLANNER_LATENCY_WINDOW
+from ollama_client import OllamaPool, get_client
+
+
+def _percentile(sorted_values: list, q: float) -> float:
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+class PlannerHealth:
+    """
+    Warm-up state of the planner model and rolling latency of planner calls.
+    """
+
+    def __init__(self, model: str = OLLAMA_MODEL, window: int = PLANNER_LATENCY_WINDOW):
+        self.model = model
+        self.warm = not PLANNER_WARMUP
+        self.warmed_at: Optional[float] = None
+        self.warmup_seconds: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self._latencies: Deque[float] = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    def record(self, seconds: float) -> None:
+        # A successful planner call also proves the model is loaded.
+        with self._lock:
+            self._latencies.append(seconds)
+        self.warm = True
+
+    async def warm_up(self, system: Optional[str] = None) -> bool:
+        t0 = time.perf_counter()
+        try:
+            await get_client().awarm_up(self.model, system=system)
+        except Exception as e:
+            self.last_error = f"warm-up failed: {e}"
+            return False
+        self.warmup_seconds = round(time.perf_counter() - t0, 3)
+        self.warmed_at = time.time()
+        self.last_error = None
+        self.warm = True
+        return True
+
+    async def _keep_warm(self, system: Optional[str]) -> None:
+        # Retry warm-up until it succeeds, then ping so Ollama's keep_alive
+        # timer never runs out while the app is idle.
+        delay = 1.0
+        while not self.warm and PLANNER_WARMUP:
+            if await self.warm_up(system):
+                break
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 30.0)
+        while PLANNER_KEEP_WARM_SECONDS > 0:
+            await asyncio.sleep(PLANNER_KEEP_WARM_SECONDS)
+            try:
+                await get_client().aping(self.model)
+                self.last_error = None
+            except Exception as e:
+                self.last_error = f"keep-warm ping failed: {e}"
+
+    def start(self, system: Optional[str] = None) -> None:
+        """
+        Warm up (and keep warm) in the background; call from the app's event loop.
+        """
+        if self._task is None:
+            self._task = asyncio.create_task(self._keep_warm(system))
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def loaded(self) -> Optional[bool]:
+        """
+        Whether Ollama reports the model in memory (None if unreachable).
+        """
+        try:
+            names = await get_client().aloaded_models()
+        except Exception:
+            return None
+        return self.model in names or f"{self.model}:latest" in names
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            lat = sorted(self._latencies)
+        latency: Dict[str, Any] = {"count": len(lat)}
+        if lat:
+            latency.update({
+                "mean_ms": round(sum(lat) / len(lat) * 1000, 1),
+                "p50_ms": round(_percentile(lat, 0.5) * 1000, 1),
+                "p95_ms": round(_percentile(lat, 0.95) * 1000, 1),
+                "max_ms": round(lat[-1] * 1000, 1),
+            })
+        client = get_client()
+        out = {
+            "model": self.model,
+            "warm": self.warm,
+            "keep_alive": client.keep_alive,
+            "warmed_at": self.warmed_at,
+            "warmup_seconds": self.warmup_seconds,
+            "last_error": self.last_error,
+            "latency": latency,
+        }
+        if isinstance(client, OllamaPool):
+            out["pool"] = client.snapshot()
+        return out
+
+
+planner_health = PlannerHealth()
@@ -0,0 +1,131 @@
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar, Token
+from typing import Dict, Iterator, Optional
+import asyncio
+import sys
+import threading
+import time
+
+from .config import PROFILE_SAMPLE_INTERVAL_MS, PROFILE_MAX_DEPTH
+
+
+class StackSampler:
+    """
+    Statistical wall-clock profiler. While running, a background thread
+    samples the stacks of all other threads every interval and counts them
+    in collapsed ("folded") form: one "frame;frame;frame count" line per
+    distinct stack, loadable by flamegraph.pl or speedscope.
+
+    Only the profiled run is sampled: the event-loop thread while the task
+    that called start() is the one running, and other threads while they
+    are inside profile_thread() for this run (tools on the tool pool).
+    Concurrent requests sharing those threads stay out of the profile.
+    """
+
+    def __init__(self, interval_ms: float = PROFILE_SAMPLE_INTERVAL_MS, max_depth: int = PROFILE_MAX_DEPTH):
+        self.interval = interval_ms / 1000.0
+        self.max_depth = max_depth
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.started: Optional[float] = None
+        self.elapsed = 0.0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._owner = 0
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._task: Optional[asyncio.Task] = None
+        self._threads: Counter = Counter()
+        self._token: Optional[Token] = None
+
+    def _frames(self, frame) -> str:
+        names = []
+        while frame is not None and len(names) < self.max_depth:
+            code = frame.f_code
+            names.append(f"{code.co_name} ({code.co_filename.rsplit('/', 1)[-1]}:{code.co_firstlineno})")
+            frame = frame.f_back
+        return ";".join(reversed(names))
+
+    def _sampled(self, ident: int) -> bool:
+        if self._threads.get(ident):
+            return True
+        if ident != self._owner:
+            return False
+        # On the event loop, only while the run's own task is executing.
+        return self._task is None or asyncio.current_task(self._loop) is self._task
+
+    def _run(self) -> None:
+        thread_names: Dict[int, str] = {}
+        while not self._stop.wait(self.interval):
+            thread_names.update((t.ident, t.name) for t in threading.enumerate() if t.ident not in thread_names)
+            for ident, frame in sys._current_frames().items():
+                if self._sampled(ident):
+                    self.stacks[f"{thread_names.get(ident, ident)};{self._frames(frame)}"] += 1
+            self.samples += 1
+
+    def start(self) -> "StackSampler":
+        self.started = time.perf_counter()
+        self._owner = threading.get_ident()
+        try:
+            self._loop = asyncio.get_running_loop()
+            self._task = asyncio.current_task()
+        except RuntimeError:
+            pass
+        self._token = _current.set(self)
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+        self._thread.start()
+        return self
+
+    def _detach(self) -> None:
+        if self._token is not None:
+            _current.reset(self._token)
+            self._token = None
+        self._stop.set()
+
+    def cancel(self) -> None:
+        """
+        Stop sampling without waiting for the sampler thread (the profile is
+        discarded).
+        """
+        self._detach()
+
+    def stop(self) -> str:
+        """
+        Stop sampling; returns the folded stacks (with a header comment).
+        """
+        self._detach()
+        return self._collect()
+
+    async def astop(self) -> str:
+        """
+        stop() for the event loop: the sampler thread is joined off the loop.
+        """
+        self._detach()
+        return await asyncio.get_running_loop().run_in_executor(None, self._collect)
+
+    def _collect(self) -> str:
+        if self._thread is not None:
+            self._thread.join()
+        self.elapsed = time.perf_counter() - (self.started or time.perf_counter())
+        header = f"# {self.samples} samples every {self.interval * 1000:g} ms over {self.elapsed:.3f} s (folded stacks)\n"
+        return header + "".join(f"{stack} {n}\n" for stack, n in self.stacks.most_common())
+
+
+_current: ContextVar[Optional[StackSampler]] = ContextVar("stack_sampler", default=None)
+
+@contextmanager
+def profile_thread() -> Iterator[None]:
+    """
+    Include the calling thread in the profile of the run whose context this
+    is (if it is being profiled) until the block exits.
+    """
+    sampler = _current.get()
+    if sampler is None:
+        yield
+        return
+    ident = threading.get_ident()
+    sampler._threads[ident] += 1
+    try:
+        yield
+    finally:
+        sampler._threads[ident] -= 1
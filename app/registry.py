@@ -0,0 +1,208 @@
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from pydantic import BaseModel, TypeAdapter, ValidationError
+
+from . import tools
+from .config import MAX_STEPS
+from .tool_schemas import (
+    SummarizeTextArgs,
+    DraftEmailArgs,
+    CreateTasksArgs,
+    ScheduleReminderArgs,
+)
+
+# Single source of truth for tools. Everything else (planner specs,
+# validators, alias maps, context filling, clarification questions, rule
+# planner keywords) is compiled from this list once at import.
+#
+# args_schema: arg -> planner type ("string" or "string[]")
+# aliases:     common LLM key mistakes -> canonical arg
+# context:     args filled from the context key of the same name when empty
+# questions:   what to ask the user when an arg is missing
+# keywords:    goal regex for the rule-based planner tier
+# returns:     fields of the tool's result (for {{result:N.FIELD}} references)
+# from_results: args the rule tier may take from an earlier call's result
+#              ("tool.field") when the context has no value for them
+TOOLS: List[Dict[str, Any]] = [
+    {
+        "name": "summarize_text",
+        "description": "Summarize a text block.",
+        "fn": tools.summarize_text,
+        "args_model": SummarizeTextArgs,
+        "args_schema": {"text": "string"},
+        "aliases": {},
+        "context": ["text"],
+        "questions": {"text": "What text should I summarize? Paste it in the context."},
+        "keywords": r"\b(summar\w*|recap\w*|tl;?dr|digest)\b",
+        "returns": ["summary"],
+    },
+    {
+        "name": "draft_email",
+        "description": "Draft an email with bullet points.",
+        "fn": tools.draft_email,
+        "args_model": DraftEmailArgs,
+        "args_schema": {"to": "string", "subject": "string", "bullet_points": "string[]"},
+        "aliases": {
+            "email_to": "to",
+            "recipient": "to",
+            "email_subject": "subject",
+            "title": "subject",
+            "bullets": "bullet_points",
+            "bulletpoints": "bullet_points",
+        },
+        "context": ["to", "subject", "bullet_points"],
+        "questions": {
+            "to": "Who should I email? (provide an address like team@company.com)",
+            "subject": "What should the email subject be?",
+            "bullet_points": "What bullet points should I include in the email?",
+        },
+        "keywords": r"\b(e-?mail\w*|mail|reply|write to)\b",
+        "returns": ["to", "subject", "body"],
+        "from_results": {"bullet_points": "summarize_text.summary"},
+    },
+    {
+        "name": "create_tasks",
+        "description": "Create task items from a list of task titles.",
+        "fn": tools.create_tasks,
+        "args_model": CreateTasksArgs,
+        "args_schema": {"tasks": "string[]"},
+        "aliases": {},
+        "context": ["tasks"],
+        "questions": {"tasks": "What tasks should I create? Provide a list of task titles."},
+        "keywords": r"\b(tasks?|to-?dos?|action items?)\b",
+        "returns": ["created"],
+    },
+    {
+        "name": "schedule_reminder",
+        "description": "Schedule a reminder note for a time.",
+        "fn": tools.schedule_reminder,
+        "args_model": ScheduleReminderArgs,
+        "args_schema": {"when": "string", "note": "string"},
+        "aliases": {
+            "time": "when",
+            "datetime": "when",
+            "message": "note",
+            "text": "note",
+        },
+        "context": ["when", "note"],
+        "questions": {
+            "when": "When should I schedule the reminder? (e.g., tomorrow 09:00)",
+            "note": "What should the reminder say?",
+        },
+        "keywords": r"\b(remind\w*|schedule\w*)\b",
+        "returns": ["scheduled_for", "note", "created_at"],
+    },
+]
+
+_PY_TYPES = {"string": str, "string[]": list}
+
+# JSON Schema per planner type. A list arg may also be a single string: a
+# {{context:KEY}} reference, or one item (wrapped by validate()).
+_SCHEMA_TYPES: Dict[str, Dict[str, Any]] = {
+    "string": {"type": "string"},
+    "string[]": {"anyOf": [{"type": "array", "items": {"type": "string"}}, {"type": "string"}]},
+}
+
+
+def _ensure_list_of_str(x: Any) -> List[str]:
+    if x is None:
+        return []
+    if isinstance(x, list):
+        return [str(i) for i in x]
+    # if it's a single string, wrap it
+    return [str(x)]
+
+
+class CompiledTool:
+    """
+    Per-tool lookup tables, built once. prepare() turns planner args into
+    validated args with one pass over the dict and one validation.
+    """
+
+    __slots__ = ("name", "fn", "adapter", "aliases", "fill", "list_args", "required", "questions")
+
+    def __init__(self, spec: Dict[str, Any]):
+        self.name: str = spec["name"]
+        self.fn: Callable[[Dict[str, Any]], Dict[str, Any]] = spec["fn"]
+        model: type = spec["args_model"]
+        self.adapter: TypeAdapter = TypeAdapter(model)
+        self.aliases: Dict[str, str] = dict(spec.get("aliases") or {})
+        schema = spec["args_schema"]
+        self.fill: Tuple[Tuple[str, type], ...] = tuple((a, _PY_TYPES[schema[a]]) for a in spec.get("context") or [])
+        self.list_args: Tuple[str, ...] = tuple(a for a, t in schema.items() if t == "string[]")
+        self.required: Tuple[str, ...] = tuple(f for f, info in model.model_fields.items() if info.is_required())
+        self.questions: Dict[str, str] = dict(spec.get("questions") or {})
+
+    def normalize(self, args: Dict[str, Any]) -> Dict[str, Any]:
+        # Canonical keys win over aliases; the first alias seen wins otherwise.
+        out: Dict[str, Any] = {}
+        for k, v in args.items():
+            target = self.aliases.get(k)
+            if target is None:
+                out[k] = v
+            elif target not in args and target not in out:
+                out[target] = v
+        return out
+
+    def fill_from_context(self, args: Dict[str, Any], context: Dict[str, Any]) -> Dict[str, Any]:
+        for arg, typ in self.fill:
+            if not args.get(arg) and isinstance(context.get(arg), typ):
+                args[arg] = context[arg]
+        return args
+
+    def validate(self, args: Dict[str, Any]) -> Tuple[Optional[Dict[str, Any]], Optional[Dict[str, Any]]]:
+        for a in self.list_args:
+            args[a] = _ensure_list_of_str(args.get(a))
+        try:
+            model: BaseModel = self.adapter.validate_python(args)
+        except ValidationError as e:
+            return None, {
+                "type": "validation_error",
+                "tool": self.name,
+                "message": "Tool arguments failed validation",
+                "details": e.errors(),
+            }
+        return model.model_dump(), None
+
+    def prepare(self, args: Any, context: Optional[Dict[str, Any]]) -> Tuple[Optional[Dict[str, Any]], Optional[Dict[str, Any]]]:
+        """
+        Returns: (clean_args, error_dict), like validate_tool_args.
+        """
+        out = self.normalize(args) if isinstance(args, dict) else {}
+        return self.validate(self.fill_from_context(out, context or {}))
+
+
+COMPILED: Dict[str, CompiledTool] = {t["name"]: CompiledTool(t) for t in TOOLS}
+TOOL_NAMES = frozenset(COMPILED)
+TOOL_REGISTRY: Dict[str, Callable[[Dict[str, Any]], Dict[str, Any]]] = {t["name"]: t["fn"] for t in TOOLS}
+
+# What the planner sees
+TOOL_SPECS: List[Dict[str, Any]] = [
+    {"name": t["name"], "description": t["description"], "args_schema": t["args_schema"], "returns": t["returns"]}
+    for t in TOOLS
+]
+
+# Planner output schema (Ollama's structured-output "format"): an array of
+# calls, each a known tool name with exactly that tool's args.
+PLAN_SCHEMA: Dict[str, Any] = {
+    "type": "array",
+    "maxItems": MAX_STEPS,
+    "items": {
+        "anyOf": [
+            {
+                "type": "object",
+                "properties": {
+                    "name": {"enum": [t["name"]]},
+                    "args": {
+                        "type": "object",
+                        "properties": {a: _SCHEMA_TYPES[typ] for a, typ in t["args_schema"].items()},
+                        "required": list(t["args_schema"]),
+                        "additionalProperties": False,
+                    },
+                },
+                "required": ["name", "args"],
+                "additionalProperties": False,
+            }
+            for t in TOOLS
+        ]
+    },
+}
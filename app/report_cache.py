@@ -0,0 +1,95 @@
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+import hashlib
+import threading
+
+from .config import REPORT_CACHE_MAX_BYTES, REPORT_CACHE_MAX_ITEM_BYTES
+
+
+def make_etag(run_id: str, kind: str, version: str) -> str:
+    """
+    Strong ETag: the rendered bytes are a pure function of the run version.
+    """
+    digest = hashlib.sha256(f"{run_id}:{kind}:{version}".encode("utf-8")).hexdigest()[:32]
+    return f'"{kind}-{digest}"'
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    tags = [t.strip() for t in if_none_match.split(",")]
+    return "*" in tags or etag in tags or f"W/{etag}" in tags
+
+
+class ReportCache:
+    """
+    LRU of rendered bodies keyed on (run_id, kind), bounded by total bytes.
+    An entry is only served while the run's version still matches.
+    """
+
+    def __init__(self, max_bytes: int = REPORT_CACHE_MAX_BYTES, max_item_bytes: int = REPORT_CACHE_MAX_ITEM_BYTES):
+        self.max_bytes = max_bytes
+        self.max_item_bytes = max_item_bytes
+        self._items: "OrderedDict[Tuple[str, str], Tuple[str, bytes]]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+    def get(self, run_id: str, kind: str, version: str) -> Optional[bytes]:
+        key = (run_id, kind)
+        with self._lock:
+            hit = self._items.get(key)
+            if hit and hit[0] == version:
+                self._items.move_to_end(key)
+                self.stats["hits"] += 1
+                return hit[1]
+            self.stats["misses"] += 1
+            return None
+
+    def put(self, run_id: str, kind: str, version: str, body: bytes) -> None:
+        if len(body) > self.max_item_bytes:
+            return
+        key = (run_id, kind)
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old:
+                self._size -= len(old[1])
+            self._items[key] = (version, body)
+            self._size += len(body)
+            while self._size > self.max_bytes and self._items:
+                _, (_, evicted) = self._items.popitem(last=False)
+                self._size -= len(evicted)
+                self.stats["evictions"] += 1
+
+    def tee(
+        self,
+        run_id: str,
+        kind: str,
+        version: str,
+        chunks: Iterable[str],
+        still_current: Optional[Callable[[], bool]] = None,
+    ) -> Iterator[bytes]:
+        """
+        Pass rendered chunks through to the client and cache the full body
+        once rendering finishes (unless it grows past max_item_bytes, or
+        still_current() says the run changed while it was rendered).
+        """
+        buf: Optional[List[bytes]] = []
+        size = 0
+        for chunk in chunks:
+            data = chunk.encode("utf-8")
+            if buf is not None:
+                size += len(data)
+                if size > self.max_item_bytes:
+                    buf = None
+                else:
+                    buf.append(data)
+            yield data
+        if buf is not None and (still_current is None or still_current()):
+            self.put(run_id, kind, version, b"".join(buf))
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"entries": len(self._items), "bytes": self._size, "max_bytes": self.max_bytes, **self.stats}
+
+
+report_cache = ReportCache()
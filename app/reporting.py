@@ -1,4 +1,4 @@
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, Iterable, Iterator, List, Optional
 import datetime
 import json
 
@@ -7,10 +7,38 @@ def _ts(ts: Optional[int]) -> str:
         return ""
     return datetime.datetime.fromtimestamp(ts).strftime("%Y-%m-%d %H:%M:%S")
 
+def _fmt_ms(ms: Optional[float]) -> str:
+    return "" if ms is None else f"{ms:,.1f}"
+
+def _timing_row(i: int, step: Dict[str, Any]) -> str:
+    tool_call = step.get("tool_call") or {}
+    name = tool_call.get("name", "")
+    thought = step.get("thought", "")
+    kind = "validate" if thought.startswith("Validating") else ("plan" if name == "planner" else "run")
+    note = ""
+    result = step.get("tool_result")
+    if name == "planner" and isinstance(result, dict):
+        ollama = result.get("ollama") or {}
+        if ollama:
+            note = (f"ollama {_fmt_ms(ollama.get('total_duration', 0) / 1e6)} ms, "
+                    f"{ollama.get('prompt_eval_count', 0)} prompt / {ollama.get('eval_count', 0)} eval tokens")
+        else:
+            note = result.get("source", "")
+    return f"| {i} | `{name}` | {kind} | {_fmt_ms(step.get('started_ms'))} | {_fmt_ms(step.get('duration_ms'))} | {note} |"
+
 def build_markdown_report(run: Dict[str, Any]) -> str:
     """
     run is the object returned by storage.read_run(run_id)
     """
+    return "\n".join(iter_markdown_report(run))
+
+def iter_markdown_report(run: Dict[str, Any]) -> Iterator[str]:
+    """
+    Generator version of build_markdown_report: yields the report line by
+    line (a line may itself contain newlines). run["steps"] may be any
+    iterable, e.g. storage.iter_steps(run_id), so steps are never all in
+    memory at once.
+    """
     run_id = run.get("run_id", "")
     created_at = _ts(run.get("created_at"))
     user_goal = run.get("user_goal", "")
@@ -19,113 +47,165 @@ def build_markdown_report(run: Dict[str, Any]) -> str:
 
     context = run.get("context")
     proposed_plan = run.get("proposed_plan")
-    steps: List[Dict[str, Any]] = run.get("steps", []) or []
+    steps: Iterable[Dict[str, Any]] = run.get("steps", []) or []
 
-    md = []
-    md.append(f"# Workflow Agent Report\n")
-    md.append(f"- **Run ID:** `{run_id}`")
-    md.append(f"- **Created:** {created_at}")
-    md.append(f"- **Status:** `{status}`")
-    md.append(f"\n## Goal\n{user_goal}\n")
+    yield f"# Workflow Agent Report\n"
+    yield f"- **Run ID:** `{run_id}`"
+    yield f"- **Created:** {created_at}"
+    yield f"- **Status:** `{status}`"
+    yield f"\n## Goal\n{user_goal}\n"
 
-    md.append("## Final Answer\n")
-    md.append(final_answer if final_answer else "_(empty)_")
-    md.append("")
+    yield "## Final Answer\n"
+    yield final_answer if final_answer else "_(empty)_"
+    yield ""
 
     if context is not None:
-        md.append("## Context\n")
-        md.append("```json")
-        md.append(json.dumps(context, indent=2, ensure_ascii=False))
-        md.append("```")
-        md.append("")
+        yield "## Context\n"
+        yield "```json"
+        yield json.dumps(context, indent=2, ensure_ascii=False)
+        yield "```"
+        yield ""
 
     if proposed_plan is not None:
-        md.append("## Proposed Plan (Tool Calls)\n")
-        md.append("```json")
-        md.append(json.dumps(proposed_plan, indent=2, ensure_ascii=False))
-        md.append("```")
-        md.append("")
-
-    md.append("## Execution Steps (Audit Log)\n")
+        yield "## Proposed Plan (Tool Calls)\n"
+        yield "```json"
+        yield json.dumps(proposed_plan, indent=2, ensure_ascii=False)
+        yield "```"
+        yield ""
+
+    yield "## Execution Steps (Audit Log)\n"
+    timings: List[str] = []
     for i, s in enumerate(steps, start=1):
         thought = s.get("thought", "")
         tool_call = s.get("tool_call")
         tool_result = s.get("tool_result")
+        if s.get("duration_ms") is not None:
+            timings.append(_timing_row(i, s))
 
-        md.append(f"### Step {i}")
+        yield f"### Step {i}"
         if thought:
-            md.append(f"**Thought:** {thought}\n")
+            yield f"**Thought:** {thought}\n"
 
         if tool_call is not None:
-            md.append("**Tool call:**")
-            md.append("```json")
-            md.append(json.dumps(tool_call, indent=2, ensure_ascii=False))
-            md.append("```")
+            yield "**Tool call:**"
+            yield "```json"
+            yield json.dumps(tool_call, indent=2, ensure_ascii=False)
+            yield "```"
 
         if tool_result is not None:
-            md.append("**Tool result:**")
-            md.append("```json")
-            md.append(json.dumps(tool_result, indent=2, ensure_ascii=False))
-            md.append("```")
+            yield "**Tool result:**"
+            yield "```json"
+            yield json.dumps(tool_result, indent=2, ensure_ascii=False)
+            yield "```"
 
-        md.append("")
+        yield ""
 
-    return "\n".join(md)
+    if timings:
+        # Step start is ms since planning began (monotonic clock)
+        yield "## Timing\n"
+        yield "| Step | Tool | Phase | Start (ms) | Duration (ms) | Notes |"
+        yield "|---|---|---|---:|---:|---|"
+        yield from timings
+        yield ""
 
 def markdown_to_basic_html(md_text: str) -> str:
     """
     No extra dependencies. Very basic Markdown-ish HTML renderer.
     Keeps code blocks and paragraphs readable.
     """
+    return "\n".join(iter_basic_html([md_text]))
+
+def _split_lines(chunks: Iterable[str]) -> Iterator[str]:
+    # Same lines as "\n".join(chunks).splitlines() (every line boundary
+    # splitlines knows, "\r\n" across chunks included), one chunk at a time.
+    buf = ""
+    first = True
+    for chunk in chunks:
+        buf += chunk if first else "\n" + chunk
+        first = False
+        lines = buf.splitlines(keepends=True)
+        buf = ""
+        # Hold back an unterminated line, or one ending in "\r" (the next
+        # chunk may start with "\n").
+        if lines and (lines[-1].splitlines()[0] == lines[-1] or lines[-1].endswith("\r")):
+            buf = lines.pop()
+        for line in lines:
+            yield line.splitlines()[0]
+    yield from buf.splitlines()
+
+def iter_basic_html(md_lines: Iterable[str]) -> Iterator[str]:
+    """
+    Lazy version of markdown_to_basic_html: consumes markdown lines (e.g.
+    from iter_markdown_report) and yields HTML lines.
+    """
     # Minimal safe escaping in non-code lines
     def esc(s: str) -> str:
         return (s.replace("&", "&amp;")
                  .replace("<", "&lt;")
                  .replace(">", "&gt;"))
 
-    lines = md_text.splitlines()
-    html = []
-    html.append("<!doctype html><html><head><meta charset='utf-8'>")
-    html.append("<title>Workflow Agent Report</title>")
-    html.append("<style>body{font-family:system-ui;max-width:980px;margin:24px auto;padding:0 12px;}pre{background:#f6f6f6;padding:12px;border-radius:10px;overflow:auto;}code{font-family:ui-monospace,Menlo,monospace;}h1,h2,h3{margin-top:20px;}</style>")
-    html.append("</head><body>")
+    yield "<!doctype html><html><head><meta charset='utf-8'>"
+    yield "<title>Workflow Agent Report</title>"
+    yield "<style>body{font-family:system-ui;max-width:980px;margin:24px auto;padding:0 12px;}pre{background:#f6f6f6;padding:12px;border-radius:10px;overflow:auto;}code{font-family:ui-monospace,Menlo,monospace;}h1,h2,h3{margin-top:20px;}</style>"
+    yield "</head><body>"
 
     in_code = False
     code_lang = ""
 
-    for line in lines:
+    for line in _split_lines(md_lines):
         if line.startswith("```"):
             if not in_code:
                 in_code = True
                 code_lang = line[3:].strip()
-                html.append("<pre><code>")
+                yield "<pre><code>"
             else:
                 in_code = False
                 code_lang = ""
-                html.append("</code></pre>")
+                yield "</code></pre>"
             continue
 
         if in_code:
-            html.append(esc(line))
+            yield esc(line)
             continue
 
         # headings
         if line.startswith("# "):
-            html.append(f"<h1>{esc(line[2:])}</h1>")
+            yield f"<h1>{esc(line[2:])}</h1>"
         elif line.startswith("## "):
-            html.append(f"<h2>{esc(line[3:])}</h2>")
+            yield f"<h2>{esc(line[3:])}</h2>"
         elif line.startswith("### "):
-            html.append(f"<h3>{esc(line[4:])}</h3>")
+            yield f"<h3>{esc(line[4:])}</h3>"
         elif line.startswith("- **"):
             # bullet line
-            html.append(f"<p>{esc(line)}</p>")
+            yield f"<p>{esc(line)}</p>"
         elif line.strip() == "":
-            html.append("<br/>")
+            yield "<br/>"
         else:
-            html.append(f"<p>{esc(line)}</p>")
+            yield f"<p>{esc(line)}</p>"
 
     if in_code:
-        html.append("</code></pre>")
+        yield "</code></pre>"
+
+    yield "</body></html>"
 
-    html.append("</body></html>")
-    return "\n".join(html)
+def iter_joined(lines: Iterable[str], chunk_size: int = 64 * 1024) -> Iterator[str]:
+    """
+    Same text as "\\n".join(lines), emitted in chunks of about chunk_size
+    characters (for StreamingResponse). The first line goes out on its own
+    so the response starts without waiting for a full chunk.
+    """
+    buf: List[str] = []
+    size = 0
+    first = True
+    for line in lines:
+        if not first:
+            buf.append("\n")
+        buf.append(line)
+        size += len(line) + 1
+        if first or size >= chunk_size:
+            first = False
+            yield "".join(buf)
+            buf = []
+            size = 0
+    if buf:
+        yield "".join(buf)
@@ -4,6 +4,10 @@ from typing import Any, Dict, List, Optional, Literal
 class RunRequest(BaseModel):
     user_goal: str = Field(..., examples=["Summarize notes, draft email, and create tasks."])
     context: Optional[Dict[str, Any]] = None
+    # Skip the plan cache and always ask the planner
+    bypass_plan_cache: bool = False
+    # Queue the run and answer 202 at once; follow /runs/{run_id}/events
+    background: bool = False
 
 class ToolCall(BaseModel):
     name: str
@@ -13,6 +17,9 @@ class AgentStep(BaseModel):
     thought: str
     tool_call: Optional[ToolCall] = None
     tool_result: Optional[Any] = None
+    # Monotonic ms since the run started, and how long the step took
+    started_ms: Optional[float] = None
+    duration_ms: Optional[float] = None
 
 class MissingField(BaseModel):
     tool: str
@@ -30,6 +37,12 @@ class RunResponse(BaseModel):
     missing_fields: Optional[List[MissingField]] = None
     proposed_plan: Optional[List[ToolCall]] = None
 
+    # e.g. the planner output was salvaged (see the planner step's "parse")
+    warnings: Optional[List[str]] = None
+
+class BatchRunRequest(BaseModel):
+    runs: List[RunRequest]
+
 class ContinueRequest(BaseModel):
     run_id: str
     # user provides missing values here; we merge into stored context
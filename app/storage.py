@@ -1,12 +1,150 @@
 import sqlite3
 import json
+import threading
 import time
-from typing import Any, Dict, List, Optional, Tuple
+import weakref
+import zlib
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple, Union
+
+from .config import (
+    DB_PATH,
+    DB_CACHE_SIZE_KB,
+    DB_MMAP_SIZE,
+    DB_STATEMENT_CACHE,
+    DB_COMPRESSION,
+    DB_COMPRESSION_LEVEL,
+    DB_COMPRESS_MIN_BYTES,
+)
+
+from .metrics import SQLITE_SECONDS, timed
+
+try:
+    import zstandard
+except ImportError:  # optional
+    zstandard = None
+
+# Compressed JSON is stored as a BLOB starting with a format marker.
+# Plain TEXT values (older rows, small values) are read as-is.
+_ZLIB_MARK = b"z1:"
+_ZSTD_MARK = b"zs:"
+
+_local = threading.local()
+# Open connections, so set_db_path() can close them. A connection is
+# closed and dropped from here when its thread exits (see _conn()).
+_all_conns: Set[sqlite3.Connection] = set()
+_conns_lock = threading.Lock()
+_generation = 0
+
+
+def _codec() -> Optional[str]:
+    if DB_COMPRESSION == "zstd" and zstandard is None:
+        return "zlib"
+    return DB_COMPRESSION
+
+def _encode_json(obj: Any) -> Union[str, bytes]:
+    return _encode_text(json.dumps(obj))
+
+def _encode_text(text: str) -> Union[str, bytes]:
+    codec = _codec()
+    if not codec or len(text) < DB_COMPRESS_MIN_BYTES:
+        return text
+    raw = text.encode("utf-8")
+    if codec == "zstd":
+        return _ZSTD_MARK + zstandard.ZstdCompressor(level=DB_COMPRESSION_LEVEL).compress(raw)
+    return _ZLIB_MARK + zlib.compress(raw, DB_COMPRESSION_LEVEL)
+
+def _decode_bytes(value: Union[str, bytes]) -> str:
+    if isinstance(value, str):
+        return value
+    if value.startswith(_ZLIB_MARK):
+        return zlib.decompress(value[len(_ZLIB_MARK):]).decode("utf-8")
+    if value.startswith(_ZSTD_MARK):
+        if zstandard is None:
+            raise RuntimeError("Row is zstd-compressed but the zstandard package is not installed")
+        return zstandard.ZstdDecompressor().decompress(value[len(_ZSTD_MARK):]).decode("utf-8")
+    return value.decode("utf-8")
+
+def _decode_json(value: Optional[Union[str, bytes]]) -> Any:
+    return json.loads(_decode_bytes(value)) if value else None
+
+
+def set_db_path(path: str) -> None:
+    """
+    Point storage at another database file. Open connections are closed and
+    every thread reconnects on its next call.
+    """
+    global DB_PATH
+    DB_PATH = path
+    close_connections()
+
+
+class _ThreadConn:
+    """
+    Holds a thread's connection in _local. Thread-local values are released
+    when their thread exits, which closes the connection (weakref.finalize),
+    so short-lived pool threads do not leave connections behind.
+    """
+    __slots__ = ("conn", "generation", "__weakref__")
+
+    def __init__(self, conn: sqlite3.Connection, generation: int):
+        self.conn = conn
+        self.generation = generation
+
+def _release(conn: sqlite3.Connection) -> None:
+    with _conns_lock:
+        _all_conns.discard(conn)
+    try:
+        conn.close()
+    except sqlite3.Error:
+        pass
+
+def _conn() -> sqlite3.Connection:
+    """
+    Per-thread connection, opened once with WAL and tuned pragmas.
+    In WAL mode readers never wait for a writer (and vice versa).
+    """
+    held = getattr(_local, "held", None)
+    if held is not None and held.generation == _generation:
+        return held.conn
+
+    conn = sqlite3.connect(DB_PATH, timeout=10, cached_statements=DB_STATEMENT_CACHE, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(f"PRAGMA cache_size=-{int(DB_CACHE_SIZE_KB)}")
+    conn.execute(f"PRAGMA mmap_size={int(DB_MMAP_SIZE)}")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    _local.held = _ThreadConn(conn, _generation)
+    weakref.finalize(_local.held, _release, conn)
+    with _conns_lock:
+        _all_conns.add(conn)
+    return conn
+
+
+@contextmanager
+def _read_snapshot(conn: sqlite3.Connection) -> Iterator[sqlite3.Connection]:
+    # One read transaction: every query inside sees the same database state.
+    conn.execute("BEGIN")
+    try:
+        yield conn
+    finally:
+        conn.commit()
+
+
+def close_connections() -> None:
+    global _generation
+    with _conns_lock:
+        _generation += 1
+        for c in _all_conns:
+            try:
+                c.close()
+            except sqlite3.Error:
+                pass
+        _all_conns.clear()
 
-DB_PATH = "runs.db"
 
 def init_db() -> None:
-    conn = sqlite3.connect(DB_PATH)
+    conn = _conn()
     cur = conn.cursor()
 
     cur.execute("""
@@ -22,42 +160,434 @@ def init_db() -> None:
     )
     """)
 
+    # History is always read newest-first, optionally filtered by status.
+    # Not covering indexes: a page seeks the index, then reads goal/answer
+    # from the table by rowid, one lookup per returned row (bounded by LIMIT).
+    # Copying user_goal/final_answer into the index would double their size.
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_runs_created_at ON runs (created_at, run_id)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_runs_status_created_at ON runs (status, created_at, run_id)")
+
+    # One row per audit step; appended while a run executes.
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS run_steps (
+      run_id TEXT,
+      seq INTEGER,
+      step_json TEXT,
+      PRIMARY KEY (run_id, seq)
+    ) WITHOUT ROWID
+    """)
+
+    # Where a needs_input run stopped; /continue resumes from here.
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS run_checkpoints (
+      run_id TEXT PRIMARY KEY,
+      checkpoint_json TEXT
+    )
+    """)
+
+    # Background runs not finished yet (queued or running); re-enqueued at
+    # startup, see app/jobs.py.
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS run_queue (
+      run_id TEXT PRIMARY KEY,
+      enqueued_at REAL,
+      options_json TEXT
+    )
+    """)
+
+    # Optional per-run profile (folded stacks), see app/profiling.py.
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS run_profiles (
+      run_id TEXT PRIMARY KEY,
+      created_at INTEGER,
+      profile TEXT
+    )
+    """)
+
+    # Full-text index over goal, answer and the text found in tool args and
+    # results. Row i describes the run with runs.rowid = i.
+    cur.execute("""
+    CREATE VIRTUAL TABLE IF NOT EXISTS runs_fts USING fts5(
+      user_goal,
+      final_answer,
+      body,
+      tokenize = 'unicode61 remove_diacritics 2',
+      prefix = '2 3'
+    )
+    """)
+    cur.execute("INSERT INTO runs_fts (runs_fts, rank) VALUES ('rank', 'bm25(4.0, 2.0, 1.0)')")
+
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS plan_cache (
+      cache_key TEXT PRIMARY KEY,
+      created_at INTEGER,
+      plan_json TEXT
+    )
+    """)
+
     conn.commit()
-    conn.close()
 
+    if conn.execute("PRAGMA user_version").fetchone()[0] < 1:
+        migrate_steps_json()
+        conn.execute("PRAGMA user_version = 1")
+
+
+def migrate_steps_json(batch_size: int = 500) -> int:
+    """
+    One-shot migration: move steps_json blobs into run_steps rows.
+    Returns the number of runs migrated.
+    """
+    conn = _conn()
+    migrated = 0
+    while True:
+        rows = conn.execute(
+            "SELECT run_id, steps_json FROM runs WHERE steps_json IS NOT NULL LIMIT ?",
+            (batch_size,),
+        ).fetchall()
+        if not rows:
+            return migrated
+        with conn:
+            for run_id, steps_json in rows:
+                steps = _decode_json(steps_json) or []
+                conn.executemany(
+                    "INSERT OR REPLACE INTO run_steps VALUES (?, ?, ?)",
+                    [(run_id, seq, _encode_json(st)) for seq, st in enumerate(steps)],
+                )
+                conn.execute("UPDATE runs SET steps_json = NULL WHERE run_id = ?", (run_id,))
+        migrated += len(rows)
+
+def _run_row(
+    run_id: str,
+    user_goal: str,
+    status: str,
+    final_answer: str,
+    steps: Optional[List[Dict[str, Any]]] = None,
+    proposed_plan: Optional[List[Dict[str, Any]]] = None,
+    context: Optional[Dict[str, Any]] = None,
+) -> Tuple[Any, ...]:
+    # Steps live in run_steps; steps_json is only read for unmigrated rows.
+    return (
+        run_id,
+        int(time.time()),
+        user_goal,
+        status,
+        final_answer,
+        None,
+        _encode_json(proposed_plan) if proposed_plan is not None else None,
+        _encode_json(context) if context is not None else None,
+    )
+
+def _search_text(steps: List[Dict[str, Any]]) -> str:
+    """
+    Distinct string values found in tool args and results (email recipients,
+    task titles, summaries, ...). The planner step is skipped: its plan only
+    repeats the args.
+    """
+    seen: Dict[str, None] = {}
+
+    def walk(v: Any) -> None:
+        if isinstance(v, str):
+            if v.strip():
+                seen.setdefault(v, None)
+        elif isinstance(v, dict):
+            for x in v.values():
+                walk(x)
+        elif isinstance(v, list):
+            for x in v:
+                walk(x)
+
+    for st in steps:
+        call = st.get("tool_call") or {}
+        if call.get("name") == "planner":
+            continue
+        walk(call.get("args"))
+        walk(st.get("tool_result"))
+    return "\n".join(seen)
+
+# Statuses at which a run's tool args/results are indexed. Earlier saves
+# (needs_input checkpoints of /run and /continue) index goal and answer
+# only, so a save never has to read back every stored step.
+_FINAL_STATUSES = frozenset({"ok", "error"})
+
+def _steps_to_index(run_id: str, status: str, steps: Optional[List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+    if steps is not None:
+        return steps
+    return read_steps(run_id) if status in _FINAL_STATUSES else []
+
+def _unindex_run(conn: sqlite3.Connection, run_id: str) -> None:
+    conn.execute("DELETE FROM runs_fts WHERE rowid = (SELECT rowid FROM runs WHERE run_id = ?)", (run_id,))
+
+def _index_run(conn: sqlite3.Connection, run_id: str, user_goal: str, final_answer: str, steps: List[Dict[str, Any]]) -> None:
+    conn.execute(
+        "INSERT INTO runs_fts (rowid, user_goal, final_answer, body) SELECT rowid, ?, ?, ? FROM runs WHERE run_id = ?",
+        (user_goal, final_answer, _search_text(steps), run_id),
+    )
+
+def _replace_steps(conn: sqlite3.Connection, run_id: str, steps: List[Dict[str, Any]]) -> None:
+    conn.execute("DELETE FROM run_steps WHERE run_id = ?", (run_id,))
+    conn.executemany(
+        "INSERT INTO run_steps VALUES (?, ?, ?)",
+        [(run_id, seq, _encode_json(st)) for seq, st in enumerate(steps)],
+    )
+
+def _save_checkpoint(conn: sqlite3.Connection, run_id: str, checkpoint: Optional[Dict[str, Any]]) -> None:
+    if checkpoint is None:
+        conn.execute("DELETE FROM run_checkpoints WHERE run_id = ?", (run_id,))
+    else:
+        conn.execute("INSERT OR REPLACE INTO run_checkpoints VALUES (?, ?)", (run_id, _encode_json(checkpoint)))
+
+@timed(SQLITE_SECONDS, "save_run")
 def save_run(
     run_id: str,
     user_goal: str,
     status: str,
     final_answer: str,
-    steps: List[Dict[str, Any]],
+    steps: Optional[List[Dict[str, Any]]] = None,
     proposed_plan: Optional[List[Dict[str, Any]]] = None,
     context: Optional[Dict[str, Any]] = None,
+    checkpoint: Optional[Dict[str, Any]] = None,
 ) -> None:
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-    cur.execute(
-        "INSERT OR REPLACE INTO runs VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
-        (
-            run_id,
-            int(time.time()),
-            user_goal,
-            status,
-            final_answer,
-            json.dumps(steps),
-            json.dumps(proposed_plan) if proposed_plan is not None else None,
-            json.dumps(context) if context is not None else None,
-        ),
-    )
-    conn.commit()
-    conn.close()
+    """
+    Write the run row. Pass steps only when they were not already appended
+    with append_steps(); they then replace the run's stored steps.
+    checkpoint replaces the stored one (None clears it).
+    """
+    conn = _conn()
+    with conn:
+        _unindex_run(conn, run_id)
+        conn.execute(
+            "INSERT OR REPLACE INTO runs VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            _run_row(run_id, user_goal, status, final_answer, steps, proposed_plan, context),
+        )
+        if steps is not None:
+            _replace_steps(conn, run_id, steps)
+        _index_run(conn, run_id, user_goal, final_answer, _steps_to_index(run_id, status, steps))
+        _save_checkpoint(conn, run_id, checkpoint)
+
+@timed(SQLITE_SECONDS, "save_runs")
+def save_runs(runs: List[Dict[str, Any]]) -> None:
+    """
+    Persist many runs in one transaction. Each item takes save_run's kwargs.
+    """
+    if not runs:
+        return
+    conn = _conn()
+    with conn:
+        for r in runs:
+            _unindex_run(conn, r["run_id"])
+        conn.executemany(
+            "INSERT OR REPLACE INTO runs VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            [_run_row(**{k: v for k, v in r.items() if k != "checkpoint"}) for r in runs],
+        )
+        for r in runs:
+            steps = r.get("steps")
+            if steps is not None:
+                _replace_steps(conn, r["run_id"], steps)
+            _index_run(conn, r["run_id"], r["user_goal"], r["final_answer"], _steps_to_index(r["run_id"], r["status"], steps))
+            _save_checkpoint(conn, r["run_id"], r.get("checkpoint"))
+
+@timed(SQLITE_SECONDS, "enqueue_run")
+def enqueue_run(run_id: str, user_goal: str, context: Optional[Dict[str, Any]], options: Dict[str, Any]) -> None:
+    """
+    Store a background run as "queued" together with its queue entry.
+    """
+    conn = _conn()
+    with conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO runs VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            _run_row(run_id, user_goal, "queued", "", context=context),
+        )
+        _index_run(conn, run_id, user_goal, "", [])
+        conn.execute("INSERT OR REPLACE INTO run_queue VALUES (?, ?, ?)", (run_id, time.time(), json.dumps(options)))
+
+@timed(SQLITE_SECONDS, "start_queued_run")
+def start_queued_run(run_id: str) -> None:
+    """
+    Mark a queued run as running. Steps of an attempt interrupted by a
+    restart are dropped; the run starts over.
+    """
+    conn = _conn()
+    with conn:
+        conn.execute("UPDATE runs SET status = 'running' WHERE run_id = ?", (run_id,))
+        conn.execute("DELETE FROM run_steps WHERE run_id = ?", (run_id,))
+        conn.execute("DELETE FROM run_checkpoints WHERE run_id = ?", (run_id,))
+
+def dequeue_run(run_id: str) -> None:
+    conn = _conn()
+    with conn:
+        conn.execute("DELETE FROM run_queue WHERE run_id = ?", (run_id,))
+
+def queued_runs() -> List[Dict[str, Any]]:
+    """
+    Unfinished background runs, oldest first.
+    """
+    rows = _conn().execute(
+        """
+        SELECT q.run_id, q.enqueued_at, q.options_json, r.user_goal, r.context_json
+        FROM run_queue q
+        JOIN runs r ON r.run_id = q.run_id
+        ORDER BY q.enqueued_at
+        """
+    ).fetchall()
+    return [
+        {
+            "run_id": r[0],
+            "enqueued_at": r[1],
+            "options": json.loads(r[2] or "{}"),
+            "user_goal": r[3],
+            "context": _decode_json(r[4]),
+        }
+        for r in rows
+    ]
+
+@timed(SQLITE_SECONDS, "append_steps")
+def append_steps(run_id: str, steps: List[Tuple[int, Dict[str, Any]]]) -> None:
+    """
+    Append (seq, step) rows for a run. Cost is O(new steps), not O(all steps).
+    """
+    if not steps:
+        return
+    conn = _conn()
+    with conn:
+        conn.executemany(
+            "INSERT OR REPLACE INTO run_steps VALUES (?, ?, ?)",
+            [(run_id, seq, _encode_json(st)) for seq, st in steps],
+        )
+
+@timed(SQLITE_SECONDS, "count_steps")
+def count_steps(run_id: str) -> int:
+    conn = _conn()
+    row = conn.execute("SELECT COALESCE(MAX(seq) + 1, 0) FROM run_steps WHERE run_id = ?", (run_id,)).fetchone()
+    return row[0]
+
+@timed(SQLITE_SECONDS, "read_steps")
+def read_steps(run_id: str, start: int = 0, end: Optional[int] = None) -> List[Dict[str, Any]]:
+    """
+    Steps [start, end) of a run, in order.
+    """
+    conn = _conn()
+    rows = conn.execute(
+        "SELECT step_json FROM run_steps WHERE run_id = ? AND seq >= ? AND seq < ? ORDER BY seq",
+        (run_id, start, end if end is not None else 2**62),
+    ).fetchall()
+    return [_decode_json(r[0]) for r in rows]
+
+def iter_steps(run_id: str, page_size: int = 200, end: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+    """
+    Stream a run's steps [0, end) page by page (keyset on seq). Each page is
+    a fresh query, so the generator can be resumed from any thread.
+    """
+    last = -1
+    while True:
+        conn = _conn()
+        rows = conn.execute(
+            "SELECT seq, step_json FROM run_steps WHERE run_id = ? AND seq > ? AND seq < ? ORDER BY seq LIMIT ?",
+            (run_id, last, end if end is not None else 2**62, page_size),
+        ).fetchall()
+        for seq, step_json in rows:
+            yield _decode_json(step_json)
+        if len(rows) < page_size:
+            return
+        last = rows[-1][0]
+
+def iter_runs(
+    since: Optional[int] = None,
+    until: Optional[int] = None,
+    status: Optional[str] = None,
+    chunk_size: int = 500,
+) -> Iterator[Dict[str, Any]]:
+    """
+    Full run records (with steps) in created_at order, for bulk export.
+    One ordered scan of runs joined to run_steps, read with fetchmany on a
+    dedicated connection, so memory stays flat and the generator can be
+    advanced from any thread.
+    """
+    where = []
+    params: List[Any] = []
+    if since is not None:
+        where.append("r.created_at >= ?")
+        params.append(since)
+    if until is not None:
+        where.append("r.created_at < ?")
+        params.append(until)
+    if status:
+        where.append("r.status = ?")
+        params.append(status)
+
+    conn = sqlite3.connect(DB_PATH, timeout=10, check_same_thread=False)
+    try:
+        cur = conn.execute(
+            f"""
+            SELECT r.run_id, r.created_at, r.user_goal, r.status, r.final_answer,
+                   r.steps_json, r.proposed_plan_json, r.context_json, s.step_json
+            FROM runs r
+            LEFT JOIN run_steps s ON s.run_id = r.run_id
+            {"WHERE " + " AND ".join(where) if where else ""}
+            ORDER BY r.created_at, r.run_id, s.seq
+            """,
+            params,
+        )
+        current: Optional[Dict[str, Any]] = None
+        while True:
+            rows = cur.fetchmany(chunk_size)
+            if not rows:
+                break
+            for row in rows:
+                if current is None or current["run_id"] != row[0]:
+                    if current is not None:
+                        yield current
+                    current = {
+                        "run_id": row[0],
+                        "created_at": row[1],
+                        "user_goal": row[2],
+                        "status": row[3],
+                        "final_answer": row[4],
+                        "steps": _decode_json(row[5]) or [],
+                        "proposed_plan": _decode_json(row[6]),
+                        "context": _decode_json(row[7]),
+                    }
+                if row[8] is not None:
+                    current["steps"].append(_decode_json(row[8]))
+        if current is not None:
+            yield current
+    finally:
+        conn.close()
+
+@timed(SQLITE_SECONDS, "run_version")
+def run_version(run_id: str) -> Optional[Tuple[str, int]]:
+    """
+    Cheap change marker for a run: (version, last_modified). save_run's
+    INSERT OR REPLACE gives the row a new rowid and created_at, and
+    appended steps bump the step count, so any change yields a new version.
+    """
+    conn = _conn()
+    row = conn.execute(
+        """
+        SELECT r.rowid, r.created_at, r.status,
+               (SELECT COALESCE(MAX(seq) + 1, 0) FROM run_steps s WHERE s.run_id = r.run_id)
+        FROM runs r
+        WHERE r.run_id = ?
+        """,
+        (run_id,),
+    ).fetchone()
+    if not row:
+        return None
+    return f"{row[0]}-{row[1]}-{row[2]}-{row[3]}", row[1] or 0
 
+@timed(SQLITE_SECONDS, "load_run")
 def load_run(run_id: str) -> Optional[Dict[str, Any]]:
-    conn = sqlite3.connect(DB_PATH)
+    conn = _conn()
     cur = conn.cursor()
-    cur.execute("SELECT run_id, user_goal, status, proposed_plan_json, context_json FROM runs WHERE run_id = ?", (run_id,))
+    cur.execute(
+        """
+        SELECT r.run_id, r.user_goal, r.status, r.proposed_plan_json, r.context_json, c.checkpoint_json
+        FROM runs r
+        LEFT JOIN run_checkpoints c ON c.run_id = r.run_id
+        WHERE r.run_id = ?
+        """,
+        (run_id,),
+    )
     row = cur.fetchone()
-    conn.close()
 
     if not row:
         return None
@@ -66,23 +596,51 @@ def load_run(run_id: str) -> Optional[Dict[str, Any]]:
         "run_id": row[0],
         "user_goal": row[1],
         "status": row[2],
-        "proposed_plan": json.loads(row[3]) if row[3] else None,
-        "context": json.loads(row[4]) if row[4] else None,
+        "proposed_plan": _decode_json(row[3]),
+        "context": _decode_json(row[4]),
+        "checkpoint": _decode_json(row[5]),
     }
-def list_runs(limit: int = 50) -> List[Dict[str, Any]]:
-    conn = sqlite3.connect(DB_PATH)
+@timed(SQLITE_SECONDS, "list_runs")
+def list_runs(
+    limit: int = 50,
+    before: Optional[Tuple[int, str]] = None,
+    status: Optional[str] = None,
+    since: Optional[int] = None,
+    until: Optional[int] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Newest-first history page. `before` is a keyset cursor (created_at, run_id)
+    taken from the last row of the previous page, so deep pages cost the same
+    index seek (plus one table lookup per returned row) as the first one.
+    """
+    where = []
+    params: List[Any] = []
+    if before is not None:
+        where.append("(created_at, run_id) < (?, ?)")
+        params.extend(before)
+    if status:
+        where.append("status = ?")
+        params.append(status)
+    if since is not None:
+        where.append("created_at >= ?")
+        params.append(since)
+    if until is not None:
+        where.append("created_at < ?")
+        params.append(until)
+
+    conn = _conn()
     cur = conn.cursor()
     cur.execute(
-        """
+        f"""
         SELECT run_id, created_at, user_goal, status, final_answer
         FROM runs
-        ORDER BY created_at DESC
+        {"WHERE " + " AND ".join(where) if where else ""}
+        ORDER BY created_at DESC, run_id DESC
         LIMIT ?
         """,
-        (limit,),
+        (*params, limit),
     )
     rows = cur.fetchall()
-    conn.close()
 
     out = []
     for r in rows:
@@ -96,8 +654,12 @@ def list_runs(limit: int = 50) -> List[Dict[str, Any]]:
     return out
 
 
-def read_run(run_id: str) -> Optional[Dict[str, Any]]:
-    conn = sqlite3.connect(DB_PATH)
+@timed(SQLITE_SECONDS, "read_run")
+def read_run(run_id: str, step_start: int = 0, step_end: Optional[int] = None) -> Optional[Dict[str, Any]]:
+    """
+    Full run record; steps can be limited to the range [step_start, step_end).
+    """
+    conn = _conn()
     cur = conn.cursor()
     cur.execute(
         """
@@ -108,7 +670,6 @@ def read_run(run_id: str) -> Optional[Dict[str, Any]]:
         (run_id,),
     )
     row = cur.fetchone()
-    conn.close()
 
     if not row:
         return None
@@ -119,7 +680,181 @@ def read_run(run_id: str) -> Optional[Dict[str, Any]]:
         "user_goal": row[2],
         "status": row[3],
         "final_answer": row[4],
-        "steps": json.loads(row[5]) if row[5] else [],
-        "proposed_plan": json.loads(row[6]) if row[6] else None,
-        "context": json.loads(row[7]) if row[7] else None,
+        # Unmigrated rows still carry the steps_json blob.
+        "steps": _decode_json(row[5])[step_start:step_end] if row[5] else read_steps(run_id, step_start, step_end),
+        "proposed_plan": _decode_json(row[6]),
+        "context": _decode_json(row[7]),
     }
+
+
+def read_run_at_version(run_id: str, step_end: Optional[int] = None) -> Optional[Tuple[str, int, Dict[str, Any], int]]:
+    """
+    run_version() and read_run() from one read transaction, so the version
+    describes exactly the data returned: (version, last_modified, run,
+    step count at that version). Steps appended later have seq >= the count.
+    """
+    conn = _conn()
+    with _read_snapshot(conn):
+        v = run_version(run_id)
+        if v is None:
+            return None
+        run = read_run(run_id, step_end=step_end)
+        step_count = count_steps(run_id)
+    return v[0], v[1], run, step_count
+
+def save_profile(run_id: str, profile: str) -> None:
+    conn = _conn()
+    with conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO run_profiles VALUES (?, ?, ?)",
+            (run_id, int(time.time()), _encode_text(profile)),
+        )
+
+def load_profile(run_id: str) -> Optional[str]:
+    conn = _conn()
+    row = conn.execute("SELECT profile FROM run_profiles WHERE run_id = ?", (run_id,)).fetchone()
+    return _decode_bytes(row[0]) if row else None
+
+
+def backfill_search_index(batch_size: int = 500) -> int:
+    """
+    Index runs written before runs_fts existed (or missing from it).
+    Safe to re-run; returns the number of runs indexed.
+    """
+    conn = _conn()
+    indexed = 0
+    last = 0
+    while True:
+        rows = conn.execute(
+            """
+            SELECT r.rowid, r.run_id, r.user_goal, r.final_answer, r.steps_json
+            FROM runs r
+            WHERE r.rowid > ? AND NOT EXISTS (SELECT 1 FROM runs_fts f WHERE f.rowid = r.rowid)
+            ORDER BY r.rowid
+            LIMIT ?
+            """,
+            (last, batch_size),
+        ).fetchall()
+        if not rows:
+            return indexed
+        with conn:
+            conn.executemany(
+                "INSERT INTO runs_fts (rowid, user_goal, final_answer, body) VALUES (?, ?, ?, ?)",
+                [
+                    (rowid, goal or "", answer or "", _search_text(_decode_json(steps_json) if steps_json else read_steps(run_id)))
+                    for rowid, run_id, goal, answer, steps_json in rows
+                ],
+            )
+        indexed += len(rows)
+        last = rows[-1][0]
+
+def _fts_query(q: str) -> str:
+    # Every word must match; each is quoted so FTS5 operators in user input
+    # are searched literally. A trailing * keeps prefix matching.
+    terms = []
+    for word in q.split():
+        prefix = word.endswith("*")
+        word = word.rstrip("*")
+        if word:
+            terms.append('"' + word.replace('"', '""') + '"' + ("*" if prefix else ""))
+    return " ".join(terms)
+
+@timed(SQLITE_SECONDS, "search_runs")
+def search_runs(
+    q: str,
+    limit: int = 20,
+    offset: int = 0,
+    status: Optional[str] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Best-ranked runs matching every word of q (bm25; goal matches weigh
+    most). Each hit carries a snippet with matches wrapped in <mark>.
+    """
+    match = _fts_query(q)
+    if not match:
+        return []
+    conn = _conn()
+    rows = conn.execute(
+        f"""
+        SELECT r.run_id, r.created_at, r.user_goal, r.status,
+               snippet(runs_fts, -1, '<mark>', '</mark>', '…', 16), runs_fts.rank
+        FROM runs_fts
+        JOIN runs r ON r.rowid = runs_fts.rowid
+        WHERE runs_fts MATCH ? {"AND r.status = ?" if status else ""}
+        ORDER BY runs_fts.rank
+        LIMIT ? OFFSET ?
+        """,
+        (match, *([status] if status else []), limit, offset),
+    ).fetchall()
+    return [
+        {
+            "run_id": r[0],
+            "created_at": r[1],
+            "user_goal": r[2],
+            "status": r[3],
+            "snippet": r[4],
+            "score": round(-r[5], 4),
+        }
+        for r in rows
+    ]
+
+
+@timed(SQLITE_SECONDS, "get_cached_plan")
+def get_cached_plan(cache_key: str, max_age: int) -> Optional[List[Dict[str, Any]]]:
+    conn = _conn()
+    cur = conn.cursor()
+    cur.execute(
+        "SELECT plan_json FROM plan_cache WHERE cache_key = ? AND created_at >= ?",
+        (cache_key, int(time.time()) - max_age),
+    )
+    row = cur.fetchone()
+    return json.loads(row[0]) if row else None
+
+
+@timed(SQLITE_SECONDS, "put_cached_plan")
+def put_cached_plan(cache_key: str, plan: List[Dict[str, Any]]) -> None:
+    conn = _conn()
+    with conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO plan_cache VALUES (?, ?, ?)",
+            (cache_key, int(time.time()), json.dumps(plan)),
+        )
+
+
+def compression_stats() -> Dict[str, Any]:
+    """
+    Stored vs. uncompressed size of the JSON columns (full scan).
+    """
+    conn = _conn()
+    columns = [
+        ("run_steps.step_json", "SELECT step_json FROM run_steps"),
+        ("runs.steps_json", "SELECT steps_json FROM runs WHERE steps_json IS NOT NULL"),
+        ("runs.context_json", "SELECT context_json FROM runs WHERE context_json IS NOT NULL"),
+        ("runs.proposed_plan_json", "SELECT proposed_plan_json FROM runs WHERE proposed_plan_json IS NOT NULL"),
+    ]
+    out: Dict[str, Any] = {"codec": _codec(), "columns": {}}
+    total_stored = total_raw = 0
+    for name, sql in columns:
+        rows = compressed = stored = raw = 0
+        for (value,) in conn.execute(sql):
+            rows += 1
+            if isinstance(value, bytes):
+                compressed += 1
+                stored += len(value)
+            else:
+                stored += len(value.encode("utf-8"))
+            raw += len(_decode_bytes(value).encode("utf-8"))
+        out["columns"][name] = {
+            "rows": rows,
+            "compressed_rows": compressed,
+            "stored_bytes": stored,
+            "uncompressed_bytes": raw,
+            "saved_bytes": raw - stored,
+        }
+        total_stored += stored
+        total_raw += raw
+    out["stored_bytes"] = total_stored
+    out["uncompressed_bytes"] = total_raw
+    out["saved_bytes"] = total_raw - total_stored
+    out["ratio"] = round(total_raw / total_stored, 2) if total_stored else None
+    return out
@@ -1,4 +1,4 @@
-from typing import Dict, Any, List
+from typing import Dict, Any
 import uuid
 import datetime
 
@@ -36,9 +36,10 @@ def schedule_reminder(args: Dict[str, Any]) -> Dict[str, Any]:
     created_at = datetime.datetime.now().isoformat(timespec="seconds")
     return {"scheduled_for": when, "note": note, "created_at": created_at}
 
-TOOL_REGISTRY = {
-    "summarize_text": summarize_text,
-    "draft_email": draft_email,
-    "create_tasks": create_tasks,
-    "schedule_reminder": schedule_reminder,
-}
+def __getattr__(name: str) -> Any:
+    # TOOL_REGISTRY moved to registry.py, which imports this module; resolve
+    # it lazily so `from app.tools import TOOL_REGISTRY` keeps working.
+    if name == "TOOL_REGISTRY":
+        from .registry import TOOL_REGISTRY
+        return TOOL_REGISTRY
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
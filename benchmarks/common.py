@@ -0,0 +1,74 @@
+from typing import Any, Dict, List, Optional
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(ROOT, "benchmarks", "results")
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    # Nearest-rank on an already sorted list.
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+def summarize(seconds: List[float], elapsed: Optional[float] = None, errors: int = 0) -> Dict[str, Any]:
+    """
+    Latency summary in ms. With elapsed (wall seconds) also reports throughput.
+    """
+    lat = sorted(seconds)
+    out: Dict[str, Any] = {"count": len(lat), "errors": errors}
+    if elapsed:
+        out["throughput_per_s"] = round(len(lat) / elapsed, 2)
+    if lat:
+        out.update({
+            "mean_ms": round(sum(lat) / len(lat) * 1000, 3),
+            "p50_ms": round(percentile(lat, 0.50) * 1000, 3),
+            "p95_ms": round(percentile(lat, 0.95) * 1000, 3),
+            "p99_ms": round(percentile(lat, 0.99) * 1000, 3),
+            "max_ms": round(lat[-1] * 1000, 3),
+        })
+    return out
+
+def _git_rev() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def write_results(name: str, config: Dict[str, Any], results: Dict[str, Any], out: Optional[str] = None) -> str:
+    """
+    Write one benchmark result file (JSON) and return its path. The default
+    path is benchmarks/results/<name>-<timestamp>.json.
+    """
+    now = datetime.datetime.now()
+    if out is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        out = os.path.join(RESULTS_DIR, f"{name}-{now.strftime('%Y%m%d-%H%M%S')}.json")
+    doc = {
+        "benchmark": name,
+        "started": now.isoformat(timespec="seconds"),
+        "git_rev": _git_rev(),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "config": config,
+        "results": results,
+    }
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(doc, f, indent=2)
+        f.write("\n")
+    return out
+
+def print_table(results: Dict[str, Dict[str, Any]]) -> None:
+    print(f"{'name':<28} {'count':>8} {'err':>5} {'ops/s':>10} {'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10}")
+    for name, r in results.items():
+        if "count" not in r:
+            continue
+        print(
+            f"{name:<28} {r['count']:>8} {r.get('errors', 0):>5} {r.get('throughput_per_s', ''):>10} "
+            f"{r.get('p50_ms', ''):>10} {r.get('p95_ms', ''):>10} {r.get('p99_ms', ''):>10}"
+        )
@@ -0,0 +1,232 @@
+"""
+Stub Ollama server for benchmarks: answers /api/chat (streaming and not)
+with a fixed plan, at a configurable latency and token rate, and returns
+malformed JSON for a configurable share of planner calls so the repair
+path is exercised too (truncated JSON when the request carries a "format"
+schema, which the planner salvages). Error and slow-reply rates exercise the backend
+pool's ejection and hedged requests.
+
+    python -m benchmarks.fake_ollama --latency-ms 200 --tokens-per-sec 40 --malformed-rate 0.1
+
+Point the app at it with OLLAMA_URL=http://127.0.0.1:11434, or start several
+on different ports and list them in OLLAMA_URLS.
+"""
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List
+import argparse
+import json
+import random
+import sys
+import threading
+import time
+
+# summarize -> email -> tasks; args are empty so they are filled from the
+# context (or reported missing, which is what /continue benchmarks need).
+PLAN = [
+    {"name": "summarize_text", "args": {"text": ""}},
+    {"name": "draft_email", "args": {"to": "", "subject": "", "bullet_points": []}},
+    {"name": "create_tasks", "args": {"tasks": []}},
+]
+PLAN_JSON = json.dumps(PLAN)
+# Prose around the array plus a trailing comma: _extract_json finds the
+# brackets but json.loads fails, so the planner asks for a repair.
+MALFORMED = "Sure! Here is the plan:\n" + PLAN_JSON[:-1] + ",]\nLet me know if you need anything else."
+# With a "format" schema the output is valid JSON but can still be cut off
+# by the token limit: the planner salvages the complete calls.
+TRUNCATED = PLAN_JSON[: PLAN_JSON.index('{"name": "create_tasks"') + 20]
+
+REPAIR_PREFIX = "Fix this into valid JSON"
+CHARS_PER_TOKEN = 4
+
+
+class Settings:
+    latency_ms = 200.0
+    jitter_ms = 0.0
+    tokens_per_sec = 50.0
+    malformed_rate = 0.0
+    error_rate = 0.0
+    slow_rate = 0.0
+    slow_ms = 2000.0
+    model = "llama3.1:8b"
+    rng = random.Random()
+    lock = threading.Lock()
+    counts: Dict[str, int] = {"plan": 0, "malformed": 0, "repair": 0, "truncated": 0, "warmup": 0, "ping": 0, "error": 0, "slow": 0}
+
+    @classmethod
+    def count(cls, kind: str) -> None:
+        with cls.lock:
+            cls.counts[kind] += 1
+
+    @classmethod
+    def random(cls) -> float:
+        with cls.lock:
+            return cls.rng.random()
+
+
+def _tokens(text: str) -> List[str]:
+    return [text[i:i + CHARS_PER_TOKEN] for i in range(0, len(text), CHARS_PER_TOKEN)]
+
+def _done(prompt_chars: int, eval_tokens: int, t0: float, first_token: float) -> Dict[str, Any]:
+    now = time.perf_counter()
+    return {
+        "model": Settings.model,
+        "message": {"role": "assistant", "content": ""},
+        "done": True,
+        "total_duration": int((now - t0) * 1e9),
+        "load_duration": 0,
+        "prompt_eval_count": prompt_chars // CHARS_PER_TOKEN,
+        "prompt_eval_duration": int((first_token - t0) * 1e9),
+        "eval_count": eval_tokens,
+        "eval_duration": int((now - first_token) * 1e9),
+    }
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args: Any) -> None:
+        pass
+
+    def _json(self, obj: Any, status: int = 200) -> None:
+        body = json.dumps(obj).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _chunk(self, obj: Any) -> None:
+        line = (json.dumps(obj) + "\n").encode()
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(line), line))
+        self.wfile.flush()
+
+    def do_GET(self) -> None:
+        if self.path in ("/api/ps", "/api/tags"):
+            self._json({"models": [{"name": Settings.model, "model": Settings.model}]})
+        else:
+            self._json({"error": "not found"}, 404)
+
+    def do_POST(self) -> None:
+        n = int(self.headers.get("Content-Length", 0))
+        req = json.loads(self.rfile.read(n) or b"{}")
+        if self.path != "/api/chat":
+            self._json({"error": "not found"}, 404)
+            return
+
+        t0 = time.perf_counter()
+        if Settings.error_rate and Settings.random() < Settings.error_rate:
+            Settings.count("error")
+            self._json({"error": "stub failure"}, 500)
+            return
+        messages = req.get("messages") or []
+        if not messages:
+            # keep-warm ping
+            Settings.count("ping")
+            self._json(_done(0, 0, t0, t0))
+            return
+
+        prompt_chars = sum(len(m.get("content", "")) for m in messages)
+        user = messages[-1].get("content", "")
+        if (req.get("options") or {}).get("num_predict") == 1:
+            Settings.count("warmup")
+            content = ""
+        elif user.startswith(REPAIR_PREFIX):
+            Settings.count("repair")
+            content = PLAN_JSON
+        elif Settings.random() < Settings.malformed_rate:
+            if req.get("format") is not None:
+                Settings.count("truncated")
+                content = TRUNCATED
+            else:
+                Settings.count("malformed")
+                content = MALFORMED
+        else:
+            Settings.count("plan")
+            content = PLAN_JSON
+
+        # Time to first token, then one token every 1/tokens_per_sec.
+        delay = Settings.latency_ms + (Settings.random() * Settings.jitter_ms if Settings.jitter_ms else 0.0)
+        if Settings.slow_rate and Settings.random() < Settings.slow_rate:
+            Settings.count("slow")
+            delay += Settings.slow_ms
+        time.sleep(delay / 1000.0)
+        first_token = time.perf_counter()
+        tokens = _tokens(content)
+        per_token = 1.0 / Settings.tokens_per_sec if Settings.tokens_per_sec > 0 else 0.0
+
+        if not req.get("stream", True):
+            time.sleep(per_token * len(tokens))
+            out = _done(prompt_chars, len(tokens), t0, first_token)
+            out["message"]["content"] = content
+            self._json(out)
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for tok in tokens:
+            if per_token:
+                time.sleep(per_token)
+            self._chunk({"model": Settings.model, "message": {"role": "assistant", "content": tok}, "done": False})
+        self._chunk(_done(prompt_chars, len(tokens), t0, first_token))
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+
+class Server(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request: Any, client_address: Any) -> None:
+        # Clients hang up mid-reply on purpose (cancelled hedged requests).
+        if not isinstance(sys.exc_info()[1], (BrokenPipeError, ConnectionResetError)):
+            super().handle_error(request, client_address)
+
+
+def serve(host: str = "127.0.0.1", port: int = 11434) -> ThreadingHTTPServer:
+    """
+    Start the server on a background thread (for in-process use).
+    """
+    server = Server((host, port), Handler)
+    threading.Thread(target=server.serve_forever, name="fake-ollama", daemon=True).start()
+    return server
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Stub Ollama server for benchmarks")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11434)
+    parser.add_argument("--latency-ms", type=float, default=Settings.latency_ms, help="time to first token")
+    parser.add_argument("--jitter-ms", type=float, default=Settings.jitter_ms, help="uniform extra latency, 0..jitter")
+    parser.add_argument("--tokens-per-sec", type=float, default=Settings.tokens_per_sec, help="0 = no generation delay")
+    parser.add_argument("--malformed-rate", type=float, default=Settings.malformed_rate, help="share of planner calls answered with invalid JSON (truncated JSON when a format schema is sent)")
+    parser.add_argument("--error-rate", type=float, default=Settings.error_rate, help="share of requests answered with HTTP 500")
+    parser.add_argument("--slow-rate", type=float, default=Settings.slow_rate, help="share of chat calls delayed by --slow-ms")
+    parser.add_argument("--slow-ms", type=float, default=Settings.slow_ms)
+    parser.add_argument("--model", default=Settings.model)
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    Settings.latency_ms = args.latency_ms
+    Settings.jitter_ms = args.jitter_ms
+    Settings.tokens_per_sec = args.tokens_per_sec
+    Settings.malformed_rate = args.malformed_rate
+    Settings.error_rate = args.error_rate
+    Settings.slow_rate = args.slow_rate
+    Settings.slow_ms = args.slow_ms
+    Settings.model = args.model
+    Settings.rng = random.Random(args.seed)
+
+    server = Server((args.host, args.port), Handler)
+    print(f"fake ollama on http://{args.host}:{args.port} "
+          f"(latency {args.latency_ms:g} ms, {args.tokens_per_sec:g} tok/s, malformed {args.malformed_rate:g})", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(json.dumps({"calls": Settings.counts}), flush=True)
+
+
+if __name__ == "__main__":
+    main()
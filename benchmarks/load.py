@@ -0,0 +1,289 @@
+"""
+Load generator: drives /run, /continue, /runs and the report endpoints at a
+fixed concurrency for a fixed time and reports throughput and p50/p95/p99
+latency per endpoint.
+
+Against a running app:
+
+    python -m benchmarks.load --base-url http://127.0.0.1:8000 --concurrency 16 --duration 30
+
+Or let it start benchmarks/fake_ollama.py and the app (on a temp database):
+
+    python -m benchmarks.load --spawn --ollama-latency-ms 200 --ollama-malformed-rate 0.1
+
+Against a pool of three stubs with slow tails and hedged planner calls:
+
+    python -m benchmarks.load --spawn --ollama-backends 3 --ollama-slow-rate 0.05 --ollama-hedge-quantile 0.9
+"""
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+import argparse
+import asyncio
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+from .common import ROOT, print_table, summarize, write_results
+
+DEFAULT_MIX = "run=4,continue=1,runs=3,report_md=2,report_html=1"
+
+# No summarize/email/task keywords, so the rule tier passes and every /run
+# goes to the (stub) LLM planner.
+GOAL = "Process the weekly sync notes for the platform team"
+CONTEXT = {
+    "text": "Weekly sync. Release 2.3 slipped a week because of the migration. "
+            "Search latency is back under 200 ms. On-call rotation changes next month. " * 4,
+    "to": "team@company.com",
+    "subject": "Weekly sync follow-up",
+    "bullet_points": ["Release 2.3 moves one week", "Search latency fixed", "New on-call rotation"],
+    "tasks": ["Update release notes", "Announce on-call rotation", "Close migration tickets"],
+}
+
+Sample = Tuple[str, float, bool]
+
+
+class Load:
+    def __init__(self, client: httpx.AsyncClient, plan_cache: bool, rng: random.Random):
+        self.client = client
+        self.plan_cache = plan_cache
+        self.rng = rng
+        self.run_ids: List[str] = []
+        self.n = 0
+
+    def _goal(self) -> str:
+        # A distinct goal per request keeps the plan cache out of the way
+        # even if the server ignores bypass_plan_cache.
+        self.n += 1
+        return GOAL if self.plan_cache else f"{GOAL} (#{self.n})"
+
+    async def _timed(self, name: str, call: Awaitable[httpx.Response], ok: Callable[[httpx.Response], bool]) -> Tuple[Sample, Optional[httpx.Response]]:
+        t0 = time.perf_counter()
+        try:
+            r = await call
+        except httpx.HTTPError:
+            return (name, time.perf_counter() - t0, False), None
+        return (name, time.perf_counter() - t0, ok(r)), r
+
+    async def run(self) -> List[Sample]:
+        body = {"user_goal": self._goal(), "context": CONTEXT, "bypass_plan_cache": not self.plan_cache}
+        sample, r = await self._timed(
+            "run", self.client.post("/run", json=body),
+            lambda r: r.status_code == 200 and r.json().get("status") == "ok",
+        )
+        if r is not None and r.status_code == 200:
+            self.run_ids.append(r.json()["run_id"])
+            if len(self.run_ids) > 1000:
+                del self.run_ids[:500]
+        return [sample]
+
+    async def cont(self) -> List[Sample]:
+        # Leave "to" out so the run stops for input, then supply it.
+        context = {k: v for k, v in CONTEXT.items() if k != "to"}
+        body = {"user_goal": self._goal(), "context": context, "bypass_plan_cache": not self.plan_cache}
+        first, r = await self._timed(
+            "run (needs_input)", self.client.post("/run", json=body),
+            lambda r: r.status_code == 200 and r.json().get("status") == "needs_input",
+        )
+        if r is None or not first[2]:
+            return [first]
+        patch = {"run_id": r.json()["run_id"], "context_patch": {"to": CONTEXT["to"]}}
+        second, _ = await self._timed(
+            "continue", self.client.post("/continue", json=patch),
+            lambda r: r.status_code == 200 and r.json().get("status") == "ok",
+        )
+        return [first, second]
+
+    async def runs(self) -> List[Sample]:
+        sample, _ = await self._timed("runs", self.client.get("/runs", params={"limit": 50}), lambda r: r.status_code == 200)
+        return [sample]
+
+    async def _report(self, name: str, suffix: str) -> List[Sample]:
+        if not self.run_ids:
+            return await self.run()
+        run_id = self.rng.choice(self.run_ids)
+        sample, _ = await self._timed(name, self.client.get(f"/runs/{run_id}/{suffix}"), lambda r: r.status_code == 200)
+        return [sample]
+
+    async def report_md(self) -> List[Sample]:
+        return await self._report("report.md", "report.md")
+
+    async def report_html(self) -> List[Sample]:
+        return await self._report("report.html", "report.html")
+
+
+SCENARIOS: Dict[str, Callable[[Load], Callable[[], Awaitable[List[Sample]]]]] = {
+    "run": lambda l: l.run,
+    "continue": lambda l: l.cont,
+    "runs": lambda l: l.runs,
+    "report_md": lambda l: l.report_md,
+    "report_html": lambda l: l.report_html,
+}
+
+def parse_mix(mix: str) -> Dict[str, float]:
+    weights: Dict[str, float] = {}
+    for part in mix.split(","):
+        name, _, w = part.partition("=")
+        name = name.strip()
+        if name not in SCENARIOS:
+            raise SystemExit(f"unknown scenario {name!r} (choose from {', '.join(SCENARIOS)})")
+        weights[name] = float(w or 1)
+    return weights
+
+
+async def _worker(load: Load, weights: Dict[str, float], warm_until: float, stop_at: float, samples: List[Sample]) -> None:
+    names = list(weights)
+    cum = list(weights.values())
+    while time.perf_counter() < stop_at:
+        name = load.rng.choices(names, weights=cum)[0]
+        got = await SCENARIOS[name](load)()
+        if time.perf_counter() >= warm_until:
+            samples.extend(got)
+
+def _server_counters(text: str) -> Dict[str, float]:
+    # The planner counters from /metrics: plans per tier, repairs and salvages.
+    out: Dict[str, float] = {}
+    for line in text.splitlines():
+        if line.startswith(("agent_plans_total", "agent_plan_repairs_total", "agent_plan_salvages_total")):
+            key, _, value = line.rpartition(" ")
+            out[key] = float(value)
+    return out
+
+async def run_load(args: argparse.Namespace, base_url: str) -> Dict[str, Any]:
+    weights = parse_mix(args.mix)
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=base_url, timeout=args.timeout, limits=limits) as client:
+        load = Load(client, plan_cache=args.plan_cache, rng=random.Random(args.seed))
+
+        # Seed runs so the report endpoints have something to read.
+        for _ in range(args.seed_runs):
+            await load.run()
+
+        samples: List[Sample] = []
+        t0 = time.perf_counter()
+        warm_until = t0 + args.warmup
+        stop_at = warm_until + args.duration
+        await asyncio.gather(*(_worker(load, weights, warm_until, stop_at, samples) for _ in range(args.concurrency)))
+        elapsed = time.perf_counter() - warm_until
+
+        try:
+            counters = _server_counters((await client.get("/metrics")).text)
+            pool = (await client.get("/health/planner")).json().get("pool")
+        except httpx.HTTPError:
+            counters, pool = {}, None
+
+    by_name: Dict[str, List[Sample]] = {}
+    for s in samples:
+        by_name.setdefault(s[0], []).append(s)
+    results: Dict[str, Any] = {
+        name: summarize([s[1] for s in group if s[2]], elapsed, errors=sum(1 for s in group if not s[2]))
+        for name, group in sorted(by_name.items())
+    }
+    results["total"] = summarize([s[1] for s in samples if s[2]], elapsed, errors=sum(1 for s in samples if not s[2]))
+    results["server_counters"] = counters
+    if pool:
+        results["ollama_pool"] = pool
+    return results
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def _wait_ready(base_url: str, timeout: float) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(f"{base_url}/health/ready", timeout=2).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise SystemExit(f"{base_url} did not become ready within {timeout:g}s")
+
+def spawn(args: argparse.Namespace, workdir: str) -> Tuple[str, List[subprocess.Popen]]:
+    """
+    Start the stub Ollama server(s) and the app (uvicorn, temp database).
+    With several backends the app uses them as one pool (OLLAMA_URLS).
+    """
+    stubs, urls = [], []
+    for n in range(args.ollama_backends):
+        port = _free_port()
+        stubs.append(subprocess.Popen(
+            [sys.executable, "-m", "benchmarks.fake_ollama", "--port", str(port),
+             "--latency-ms", str(args.ollama_latency_ms), "--tokens-per-sec", str(args.ollama_tokens_per_sec),
+             "--malformed-rate", str(args.ollama_malformed_rate), "--slow-rate", str(args.ollama_slow_rate),
+             "--slow-ms", str(args.ollama_slow_ms), "--seed", str(args.seed + n)],
+            cwd=ROOT,
+        ))
+        urls.append(f"http://127.0.0.1:{port}")
+    env = {
+        **os.environ,
+        "OLLAMA_URL": urls[0],
+        "OLLAMA_URLS": ",".join(urls),
+        "AGENT_DB_PATH": os.path.join(workdir, "runs.db"),
+    }
+    if args.ollama_hedge_quantile is not None:
+        env["OLLAMA_HEDGE_QUANTILE"] = str(args.ollama_hedge_quantile)
+    app_port = _free_port()
+    app = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(app_port), "--log-level", "warning"],
+        cwd=ROOT, env=env,
+    )
+    base_url = f"http://127.0.0.1:{app_port}"
+    try:
+        _wait_ready(base_url, 30)
+    except SystemExit:
+        for p in (app, *stubs):
+            p.terminate()
+        raise
+    return base_url, [app, *stubs]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="HTTP load generator for the workflow agent API")
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--spawn", action="store_true", help="start fake_ollama and the app on a temp database")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=30.0, help="measured seconds")
+    parser.add_argument("--warmup", type=float, default=3.0, help="seconds of load before measuring")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"scenario weights (default {DEFAULT_MIX})")
+    parser.add_argument("--seed-runs", type=int, default=20, help="runs created before measuring, for the report endpoints")
+    parser.add_argument("--plan-cache", action="store_true", help="reuse one goal and let the plan cache answer")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--ollama-latency-ms", type=float, default=200.0, help="with --spawn")
+    parser.add_argument("--ollama-tokens-per-sec", type=float, default=50.0, help="with --spawn")
+    parser.add_argument("--ollama-malformed-rate", type=float, default=0.0, help="with --spawn")
+    parser.add_argument("--ollama-slow-rate", type=float, default=0.0, help="with --spawn: share of slow replies")
+    parser.add_argument("--ollama-slow-ms", type=float, default=2000.0, help="with --spawn")
+    parser.add_argument("--ollama-backends", type=int, default=1, help="with --spawn: stub servers behind the pool")
+    parser.add_argument("--ollama-hedge-quantile", type=float, default=None, help="with --spawn: enable hedged planner calls")
+    parser.add_argument("-o", "--out", default=None, help="result JSON path (default benchmarks/results/)")
+    args = parser.parse_args()
+
+    procs: List[subprocess.Popen] = []
+    with tempfile.TemporaryDirectory() as workdir:
+        base_url = args.base_url
+        if args.spawn:
+            base_url, procs = spawn(args, workdir)
+        try:
+            results = asyncio.run(run_load(args, base_url))
+        finally:
+            for p in procs:
+                p.terminate()
+                p.wait(timeout=10)
+
+    config = {k: v for k, v in vars(args).items() if k != "out"}
+    config["base_url"] = base_url
+    print_table(results)
+    print(f"\nwrote {write_results('load', config, results, args.out)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+"""
+Micro-benchmarks for the storage and reporting hot paths: save_run,
+read_run and list_runs against a pre-populated database, and report
+rendering for one very large run.
+
+    python -m benchmarks.micro --rows 1000000
+    python -m benchmarks.micro --rows 10000 --iterations 200   # quick run
+
+The populated database is kept in benchmarks/data/ and reused by later runs
+with the same --rows (populating 1M rows takes a few minutes).
+"""
+from typing import Any, Callable, Dict, List
+import argparse
+import os
+import random
+import sys
+import time
+
+from app import storage
+from app.reporting import build_markdown_report, iter_basic_html, iter_markdown_report
+
+from .common import ROOT, print_table, summarize, write_results
+
+DATA_DIR = os.path.join(ROOT, "benchmarks", "data")
+POPULATE_BATCH = 1000
+
+
+def _run_id(i: int) -> str:
+    return f"bench-{i:08d}"
+
+def make_steps(i: int, n_tools: int = 3, text_chars: int = 600) -> List[Dict[str, Any]]:
+    """
+    Steps shaped like the agent's audit log: a planner step, then a
+    validate + call pair per tool.
+    """
+    text = (f"Run {i}: meeting notes about release planning, search latency and on-call. " * 20)[:text_chars]
+    plan = [
+        {"name": "summarize_text", "args": {"text": text}},
+        {"name": "draft_email", "args": {"to": f"team{i % 97}@company.com", "subject": f"Follow-up {i}", "bullet_points": ["Release moves", "Latency fixed"]}},
+        {"name": "create_tasks", "args": {"tasks": [f"Task {i}-{k}" for k in range(3)]}},
+    ][:n_tools]
+    steps: List[Dict[str, Any]] = [{
+        "thought": "Planner (Ollama) produced tool calls.",
+        "tool_call": {"name": "planner", "args": {"user_goal": f"Process notes {i}"}},
+        "tool_result": {"plan": plan, "source": "ollama", "ollama": {"total_duration": 812000000, "prompt_eval_count": 410, "eval_count": 96}},
+        "started_ms": 0.0,
+        "duration_ms": 812.4,
+    }]
+    t = 812.4
+    for call in plan:
+        steps.append({"thought": f"Validating tool args: {call['name']}", "tool_call": call, "tool_result": None, "started_ms": t, "duration_ms": 0.1})
+        steps.append({
+            "thought": f"Calling tool: {call['name']}",
+            "tool_call": call,
+            "tool_result": {"ok": True, "output": text[: text_chars // 2]},
+            "started_ms": t + 0.1,
+            "duration_ms": 1.7,
+        })
+        t += 1.8
+    return steps
+
+def make_run(i: int, **step_kwargs: Any) -> Dict[str, Any]:
+    needs_input = i % 10 == 0
+    return {
+        "run_id": _run_id(i),
+        "user_goal": f"Process notes {i}",
+        "status": "needs_input" if needs_input else "ok",
+        "final_answer": "" if needs_input else f"Completed 3 tool calls for run {i}.",
+        "steps": make_steps(i, **step_kwargs),
+        "proposed_plan": None,
+        "context": {"text": f"notes {i}", "subject": f"Follow-up {i}"},
+    }
+
+
+def populate(path: str, rows: int) -> float:
+    """
+    Fill the database up to `rows` runs (through save_runs, so the FTS index
+    and compression are included). Returns the seconds spent.
+    """
+    storage.set_db_path(path)
+    storage.init_db()
+    have = storage._conn().execute("SELECT COUNT(*) FROM runs").fetchone()[0]
+    if have >= rows:
+        return 0.0
+    t0 = time.perf_counter()
+    for start in range(have, rows, POPULATE_BATCH):
+        storage.save_runs([make_run(i) for i in range(start, min(start + POPULATE_BATCH, rows))])
+        if (start // POPULATE_BATCH) % 50 == 0:
+            print(f"populating {start:,}/{rows:,}", file=sys.stderr, flush=True)
+    return time.perf_counter() - t0
+
+
+def bench(fn: Callable[[int], Any], iterations: int) -> Dict[str, Any]:
+    times = []
+    for n in range(iterations):
+        t0 = time.perf_counter()
+        fn(n)
+        times.append(time.perf_counter() - t0)
+    return summarize(times, sum(times))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Storage and report micro-benchmarks")
+    parser.add_argument("--rows", type=int, default=1_000_000, help="runs in the pre-populated database")
+    parser.add_argument("--db", default=None, help="database path (default benchmarks/data/runs-<rows>.db)")
+    parser.add_argument("--iterations", type=int, default=2000, help="calls per storage benchmark")
+    parser.add_argument("--report-steps", type=int, default=3000, help="steps in the large run for report rendering")
+    parser.add_argument("--report-iterations", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("-o", "--out", default=None, help="result JSON path (default benchmarks/results/)")
+    args = parser.parse_args()
+
+    path = args.db
+    if path is None:
+        os.makedirs(DATA_DIR, exist_ok=True)
+        path = os.path.join(DATA_DIR, f"runs-{args.rows}.db")
+    populate_seconds = populate(path, args.rows)
+
+    rng = random.Random(args.seed)
+    ids = [_run_id(rng.randrange(args.rows)) for _ in range(args.iterations)]
+    cursors = []
+    for run_id in ids[:100]:
+        run = storage.read_run(run_id, 0, 0)
+        cursors.append((run["created_at"], run["run_id"]))
+    # save_run writes new ids past the populated range (and removes them after).
+    fresh = [make_run(args.rows + n) for n in range(args.iterations)]
+
+    results: Dict[str, Any] = {}
+    results["save_run"] = bench(lambda n: storage.save_run(**fresh[n]), args.iterations)
+    results["read_run"] = bench(lambda n: storage.read_run(ids[n]), args.iterations)
+    results["list_runs (first page)"] = bench(lambda n: storage.list_runs(limit=50), args.iterations)
+    results["list_runs (keyset page)"] = bench(lambda n: storage.list_runs(limit=50, before=cursors[n % len(cursors)]), args.iterations)
+    results["list_runs (status)"] = bench(lambda n: storage.list_runs(limit=50, status="needs_input"), args.iterations)
+
+    conn = storage._conn()
+    with conn:
+        for r in fresh:
+            storage._unindex_run(conn, r["run_id"])
+            conn.execute("DELETE FROM run_steps WHERE run_id = ?", (r["run_id"],))
+            conn.execute("DELETE FROM runs WHERE run_id = ?", (r["run_id"],))
+
+    # One very large run: many tool calls with sizeable results.
+    large = make_run(0)
+    large["run_id"] = "bench-large"
+    large["steps"] = [st for i in range(args.report_steps // 7 + 1) for st in make_steps(i, text_chars=2000)][: args.report_steps]
+    storage.save_run(**large)
+    results["read_run (large)"] = bench(lambda n: storage.read_run("bench-large"), args.report_iterations)
+    run = storage.read_run("bench-large")
+    results["build_markdown_report (large)"] = bench(lambda n: build_markdown_report(run), args.report_iterations)
+    results["report html (large)"] = bench(lambda n: "".join(iter_basic_html(iter_markdown_report(run))), args.report_iterations)
+    results["report_bytes (large)"] = {"markdown": len(build_markdown_report(run).encode())}
+
+    config = {k: v for k, v in vars(args).items() if k != "out"}
+    config.update({"db": path, "populate_seconds": round(populate_seconds, 1), "codec": storage._codec(), "db_bytes": os.path.getsize(path)})
+    print_table(results)
+    print(f"\nwrote {write_results('micro', config, results, args.out)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,26 +1,578 @@
+import asyncio
+import itertools
+import json
+import os
+import threading
+import time
+from collections import deque
 import httpx
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, AsyncIterator, Callable, Deque, Iterator, List, Sequence, Union
 
-OLLAMA_URL = "http://localhost:11434"
+# Set OLLAMA_URL to point the app at another server (e.g. benchmarks/fake_ollama.py)
+OLLAMA_URL = os.environ.get("OLLAMA_URL", "http://localhost:11434")
+# Several servers (comma-separated) are used as one pool, see OllamaPool.
+OLLAMA_URLS = [u.strip() for u in os.environ.get("OLLAMA_URLS", OLLAMA_URL).split(",") if u.strip()]
 DEFAULT_MODEL = "llama3.1:8b"
 
-def ollama_chat(prompt: str, model: str = DEFAULT_MODEL, system: Optional[str]= None) -> str:
-    '''
-    Minimal ollama chat wrapper using api/chat.
-    '''
+# Per-phase timeouts (seconds). Generation can be slow on CPU, connecting to a
+# local Ollama should not be.
+CONNECT_TIMEOUT = 5.0
+READ_TIMEOUT = 60.0
+WRITE_TIMEOUT = 10.0
+POOL_TIMEOUT = 5.0
+
+# Connection pool sizing
+MAX_CONNECTIONS = 20
+MAX_KEEPALIVE_CONNECTIONS = 10
+KEEPALIVE_EXPIRY = 30.0
+
+# How long Ollama keeps the model loaded after each request (Ollama's own
+# default is 5m, after which the next call pays the model load again).
+KEEP_ALIVE = "30m"
+
+# Pool: a backend is ejected for POOL_EJECT_SECONDS after this many failed
+# requests in a row (it gets one trial request afterwards). A backend
+# without the model loaded counts as POOL_AFFINITY_WEIGHT extra requests in
+# flight when choosing where to send a request.
+POOL_EJECT_AFTER_FAILURES = 3
+POOL_EJECT_SECONDS = 10.0
+POOL_AFFINITY_WEIGHT = 2
+POOL_LATENCY_WINDOW = 200
+
+# Hedged requests (pool only): when achat() has not answered after this
+# quantile of recent latencies, the request is also sent to another backend.
+# Unset (None) disables hedging.
+HEDGE_QUANTILE: Optional[float] = float(os.environ["OLLAMA_HEDGE_QUANTILE"]) if os.environ.get("OLLAMA_HEDGE_QUANTILE") else None
+HEDGE_MIN_SAMPLES = 20
+
+
+# Fields of Ollama's final ("done") message worth keeping: durations are in
+# nanoseconds, *_count are token counts.
+STAT_FIELDS = ("total_duration", "load_duration", "prompt_eval_count", "prompt_eval_duration", "eval_count", "eval_duration")
+
+def _fill_stats(stats: Optional[Dict[str, Any]], data: Dict[str, Any]) -> None:
+    if stats is not None:
+        stats.update({k: data[k] for k in STAT_FIELDS if k in data})
+
+
+def _messages(prompt: str, system: Optional[str]) -> List[Dict[str, str]]:
     message = []
     if system:
         message.append({"role":"system", "content":system})
     message.append({"role":"user", "content":prompt})
+    return message
+
+
+class OllamaClient:
+    '''
+    Long-lived Ollama client. Keeps pooled keep-alive connections for both
+    sync and async callers, so planner calls don't pay TCP setup every time.
+    '''
+
+    def __init__(
+        self,
+        base_url: str = OLLAMA_URL,
+        connect_timeout: float = CONNECT_TIMEOUT,
+        read_timeout: float = READ_TIMEOUT,
+        write_timeout: float = WRITE_TIMEOUT,
+        pool_timeout: float = POOL_TIMEOUT,
+        max_connections: int = MAX_CONNECTIONS,
+        max_keepalive_connections: int = MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry: float = KEEPALIVE_EXPIRY,
+        keep_alive: Optional[str] = KEEP_ALIVE,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.keep_alive = keep_alive
+        self.timeout = httpx.Timeout(
+            connect=connect_timeout,
+            read=read_timeout,
+            write=write_timeout,
+            pool=pool_timeout,
+        )
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self._client: Optional[httpx.Client] = None
+        self._aclient: Optional[httpx.AsyncClient] = None
+        self._lock = threading.Lock()
+
+    @property
+    def client(self) -> httpx.Client:
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    self._client = httpx.Client(base_url=self.base_url, timeout=self.timeout, limits=self.limits)
+        return self._client
+
+    @property
+    def aclient(self) -> httpx.AsyncClient:
+        if self._aclient is None:
+            with self._lock:
+                if self._aclient is None:
+                    self._aclient = httpx.AsyncClient(base_url=self.base_url, timeout=self.timeout, limits=self.limits)
+        return self._aclient
+
+    def _payload(self, prompt: str, model: str, system: Optional[str], stream: bool = False, format: Optional[Any] = None) -> Dict[str, Any]:
+        payload = {
+            "model":model,
+            "messages": _messages(prompt, system),
+            "stream":stream,
+            "options": {"temperature": 0.2}
+        }
+        if self.keep_alive is not None:
+            payload["keep_alive"] = self.keep_alive
+        if format is not None:
+            # "json" or a JSON Schema the output is constrained to
+            payload["format"] = format
+        return payload
+
+    def chat(self, prompt: str, model: str = DEFAULT_MODEL, system: Optional[str] = None, stats: Optional[Dict[str, Any]] = None, format: Optional[Any] = None) -> str:
+        '''
+        stats (if given) is filled with Ollama's timing/token counts (STAT_FIELDS).
+        format ("json" or a JSON Schema) constrains the output.
+        '''
+        r = self.client.post("/api/chat", json=self._payload(prompt, model, system, format=format))
+        r.raise_for_status()
+        data = r.json()
+        _fill_stats(stats, data)
+        return data["message"]["content"]
+
+    async def achat(
+        self,
+        prompt: str,
+        model: str = DEFAULT_MODEL,
+        system: Optional[str] = None,
+        stats: Optional[Dict[str, Any]] = None,
+        accept: Optional[Callable[[str], bool]] = None,
+        format: Optional[Any] = None,
+    ) -> str:
+        '''
+        accept is only used by OllamaPool (which reply of a hedged request
+        to take); a single server has nothing to choose from.
+        '''
+        r = await self.aclient.post("/api/chat", json=self._payload(prompt, model, system, format=format))
+        r.raise_for_status()
+        data = r.json()
+        _fill_stats(stats, data)
+        return data["message"]["content"]
+
+    def chat_stream(self, prompt: str, model: str = DEFAULT_MODEL, system: Optional[str] = None, stats: Optional[Dict[str, Any]] = None, format: Optional[Any] = None) -> Iterator[str]:
+        '''
+        Yields content chunks as Ollama generates them (NDJSON stream).
+        stats is filled from the final message, if the stream gets that far.
+        '''
+        payload = self._payload(prompt, model, system, stream=True, format=format)
+        with self.client.stream("POST", "/api/chat", json=payload) as r:
+            r.raise_for_status()
+            for line in r.iter_lines():
+                if not line:
+                    continue
+                data = json.loads(line)
+                chunk = (data.get("message") or {}).get("content")
+                if chunk:
+                    yield chunk
+                if data.get("done"):
+                    _fill_stats(stats, data)
+                    break
+
+    async def achat_stream(self, prompt: str, model: str = DEFAULT_MODEL, system: Optional[str] = None, stats: Optional[Dict[str, Any]] = None, format: Optional[Any] = None) -> AsyncIterator[str]:
+        payload = self._payload(prompt, model, system, stream=True, format=format)
+        async with self.aclient.stream("POST", "/api/chat", json=payload) as r:
+            r.raise_for_status()
+            async for line in r.aiter_lines():
+                if not line:
+                    continue
+                data = json.loads(line)
+                chunk = (data.get("message") or {}).get("content")
+                if chunk:
+                    yield chunk
+                if data.get("done"):
+                    _fill_stats(stats, data)
+                    break
+
+    async def awarm_up(self, model: str = DEFAULT_MODEL, system: Optional[str] = None) -> None:
+        '''
+        Load the model and evaluate `system` (one generated token), so the
+        first real request neither loads the model nor re-reads the prefix.
+        '''
+        payload = self._payload("ok", model, system)
+        payload["options"] = {**payload["options"], "num_predict": 1}
+        r = await self.aclient.post("/api/chat", json=payload)
+        r.raise_for_status()
+
+    async def aping(self, model: str = DEFAULT_MODEL) -> None:
+        '''
+        Chat request without messages: loads the model if needed and resets
+        its keep_alive timer, without generating anything.
+        '''
+        payload: Dict[str, Any] = {"model": model, "messages": [], "stream": False}
+        if self.keep_alive is not None:
+            payload["keep_alive"] = self.keep_alive
+        r = await self.aclient.post("/api/chat", json=payload)
+        r.raise_for_status()
+
+    async def aloaded_models(self) -> List[str]:
+        '''
+        Names of the models Ollama currently has in memory (/api/ps).
+        '''
+        r = await self.aclient.get("/api/ps", timeout=CONNECT_TIMEOUT)
+        r.raise_for_status()
+        return [m.get("name") or m.get("model") for m in r.json().get("models", [])]
+
+    def close(self) -> None:
+        if self._client is not None:
+            self._client.close()
+            self._client = None
+
+    async def aclose(self) -> None:
+        if self._aclient is not None:
+            await self._aclient.aclose()
+            self._aclient = None
+        self.close()
+
+
+class NoBackendAvailable(RuntimeError):
+    pass
+
+
+class _Backend:
+    __slots__ = ("client", "outstanding", "failures", "ejected_until", "models", "requests", "errors")
+
+    def __init__(self, client: OllamaClient):
+        self.client = client
+        self.outstanding = 0
+        self.failures = 0
+        self.ejected_until = 0.0
+        self.models: set = set()
+        self.requests = 0
+        self.errors = 0
+
+
+def _backend_fault(e: Exception) -> bool:
+    # Connection problems, timeouts and 5xx say something about the server;
+    # 4xx (bad request, unknown model) do not.
+    if isinstance(e, httpx.HTTPStatusError):
+        return e.response.status_code >= 500
+    return isinstance(e, httpx.TransportError)
+
 
-    payload: DICT[str, Any] = {
-        "model":model,
-        "messages": message,
-        "stream":False,
-        "options": {"temperature": 0.2}
-    }
-
-    r = httpx.post(f"{OLLAMA_URL}/api/chat", json=payload, timeout=60)
-    r.raise_for_status()
-    data = r.json()
-    return data["message"]["content"]
\ No newline at end of file
+class OllamaPool:
+    '''
+    Several Ollama servers behind OllamaClient's interface.
+
+    Each request goes to the backend with the fewest requests in flight,
+    preferring backends that already have the model loaded. A backend that
+    fails POOL_EJECT_AFTER_FAILURES times in a row is skipped for
+    POOL_EJECT_SECONDS; failed requests (and 404 "model not found") are
+    retried on another backend. Streams fail over only before their first
+    chunk.
+
+    With hedge_quantile, achat() sends the request to a second backend when
+    the first has not answered after that quantile of recent latencies; the
+    first reply that passes `accept` wins and the other is cancelled.
+    '''
+
+    def __init__(
+        self,
+        urls: Sequence[str],
+        hedge_quantile: Optional[float] = HEDGE_QUANTILE,
+        eject_after: int = POOL_EJECT_AFTER_FAILURES,
+        eject_seconds: float = POOL_EJECT_SECONDS,
+        affinity_weight: float = POOL_AFFINITY_WEIGHT,
+        **client_kwargs: Any,
+    ):
+        if not urls:
+            raise ValueError("OllamaPool needs at least one URL")
+        self.backends = [_Backend(OllamaClient(u, **client_kwargs)) for u in urls]
+        self.keep_alive = self.backends[0].client.keep_alive
+        self.hedge_quantile = hedge_quantile
+        self.eject_after = eject_after
+        self.eject_seconds = eject_seconds
+        self.affinity_weight = affinity_weight
+        self.hedges = 0
+        self.hedge_wins = 0
+        self._latencies: Dict[str, Deque[float]] = {}
+        self._rotation = itertools.count()
+        self._lock = threading.Lock()
+
+    # -- routing and health --------------------------------------------------
+
+    def _pick(self, model: str, tried: List[_Backend]) -> _Backend:
+        now = time.monotonic()
+        with self._lock:
+            live = [b for b in self.backends if b not in tried]
+            if not live:
+                raise NoBackendAvailable("All Ollama backends were tried")
+            # If every backend is ejected, try them anyway rather than fail.
+            healthy = [b for b in live if b.ejected_until <= now] or live
+            # Rotate the starting point so ties are spread round-robin.
+            start = next(self._rotation) % len(healthy)
+            ordered = healthy[start:] + healthy[:start]
+            b = min(ordered, key=lambda b: b.outstanding + (0 if model in b.models else self.affinity_weight))
+            b.outstanding += 1
+            b.requests += 1
+            tried.append(b)
+            return b
+
+    def _release(self, b: _Backend) -> None:
+        with self._lock:
+            b.outstanding -= 1
+
+    def _succeeded(self, b: _Backend, model: str, seconds: Optional[float] = None) -> None:
+        with self._lock:
+            b.outstanding -= 1
+            b.failures = 0
+            b.ejected_until = 0.0
+            b.models.add(model)
+            if seconds is not None:
+                self._latencies.setdefault(model, deque(maxlen=POOL_LATENCY_WINDOW)).append(seconds)
+
+    def _failed(self, b: _Backend, model: str, e: Exception) -> bool:
+        '''
+        Record a failed request; returns whether another backend may succeed.
+        '''
+        with self._lock:
+            b.outstanding -= 1
+            b.errors += 1
+            if isinstance(e, httpx.HTTPStatusError) and e.response.status_code == 404:
+                b.models.discard(model)
+                return True
+            if not _backend_fault(e):
+                return False
+            b.failures += 1
+            if b.failures >= self.eject_after:
+                b.ejected_until = time.monotonic() + self.eject_seconds
+            return True
+
+    def _mark_healthy(self, b: _Backend, model: Optional[str] = None) -> None:
+        with self._lock:
+            b.failures = 0
+            b.ejected_until = 0.0
+            if model:
+                b.models.add(model)
+
+    def _hedge_delay(self, model: str) -> Optional[float]:
+        if self.hedge_quantile is None or len(self.backends) < 2:
+            return None
+        with self._lock:
+            lat = sorted(self._latencies.get(model) or ())
+        if len(lat) < HEDGE_MIN_SAMPLES:
+            return None
+        return lat[min(len(lat) - 1, int(self.hedge_quantile * len(lat)))]
+
+    # -- requests ------------------------------------------------------------
+
+    def chat(self, prompt: str, model: str = DEFAULT_MODEL, system: Optional[str] = None, stats: Optional[Dict[str, Any]] = None, format: Optional[Any] = None) -> str:
+        tried: List[_Backend] = []
+        while True:
+            b = self._pick(model, tried)
+            t0 = time.perf_counter()
+            try:
+                out = b.client.chat(prompt, model, system, stats, format=format)
+            except Exception as e:
+                if not self._failed(b, model, e) or len(tried) >= len(self.backends):
+                    raise
+                continue
+            except BaseException:
+                self._release(b)
+                raise
+            self._succeeded(b, model, time.perf_counter() - t0)
+            return out
+
+    async def _achat_failover(self, prompt: str, model: str, system: Optional[str], stats: Dict[str, Any], tried: List[_Backend], format: Optional[Any]) -> str:
+        while True:
+            b = self._pick(model, tried)
+            t0 = time.perf_counter()
+            try:
+                out = await b.client.achat(prompt, model, system, stats, format=format)
+            except Exception as e:
+                if not self._failed(b, model, e) or len(tried) >= len(self.backends):
+                    raise
+                continue
+            except BaseException:
+                self._release(b)
+                raise
+            self._succeeded(b, model, time.perf_counter() - t0)
+            return out
+
+    async def achat(
+        self,
+        prompt: str,
+        model: str = DEFAULT_MODEL,
+        system: Optional[str] = None,
+        stats: Optional[Dict[str, Any]] = None,
+        accept: Optional[Callable[[str], bool]] = None,
+        format: Optional[Any] = None,
+    ) -> str:
+        tried: List[_Backend] = []
+        delay = self._hedge_delay(model)
+        attempts: Dict[asyncio.Task, Dict[str, Any]] = {}
+        first_stats: Dict[str, Any] = {}
+        primary = asyncio.ensure_future(self._achat_failover(prompt, model, system, first_stats, tried, format))
+        attempts[primary] = first_stats
+        try:
+            if delay is not None:
+                done, _ = await asyncio.wait({primary}, timeout=delay)
+                if not done and len(tried) < len(self.backends):
+                    self.hedges += 1
+                    hedge_stats: Dict[str, Any] = {}
+                    attempts[asyncio.ensure_future(self._achat_failover(prompt, model, system, hedge_stats, tried, format))] = hedge_stats
+            fallback = None
+            error: Optional[BaseException] = None
+            pending = set(attempts)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for t in done:
+                    if t.exception() is not None:
+                        error = t.exception()
+                        continue
+                    content = t.result()
+                    if accept is None or accept(content):
+                        if t is not primary:
+                            self.hedge_wins += 1
+                        _fill_stats(stats, attempts[t])
+                        return content
+                    if fallback is None:
+                        fallback = t
+            if fallback is not None:
+                _fill_stats(stats, attempts[fallback])
+                return fallback.result()
+            raise error
+        finally:
+            for t in attempts:
+                t.cancel()
+
+    def chat_stream(self, prompt: str, model: str = DEFAULT_MODEL, system: Optional[str] = None, stats: Optional[Dict[str, Any]] = None, format: Optional[Any] = None) -> Iterator[str]:
+        tried: List[_Backend] = []
+        while True:
+            b = self._pick(model, tried)
+            started = False
+            inner = b.client.chat_stream(prompt, model, system, stats, format=format)
+            try:
+                for chunk in inner:
+                    started = True
+                    yield chunk
+            except Exception as e:
+                if not self._failed(b, model, e) or started or len(tried) >= len(self.backends):
+                    raise
+                continue
+            except BaseException:
+                self._release(b)
+                raise
+            finally:
+                inner.close()
+            self._succeeded(b, model)
+            return
+
+    async def achat_stream(self, prompt: str, model: str = DEFAULT_MODEL, system: Optional[str] = None, stats: Optional[Dict[str, Any]] = None, format: Optional[Any] = None) -> AsyncIterator[str]:
+        tried: List[_Backend] = []
+        while True:
+            b = self._pick(model, tried)
+            started = False
+            inner = b.client.achat_stream(prompt, model, system, stats, format=format)
+            try:
+                async for chunk in inner:
+                    started = True
+                    yield chunk
+            except Exception as e:
+                if not self._failed(b, model, e) or started or len(tried) >= len(self.backends):
+                    raise
+                continue
+            except BaseException:
+                self._release(b)
+                raise
+            finally:
+                # Closes the HTTP stream if the caller stopped early.
+                await inner.aclose()
+            self._succeeded(b, model)
+            return
+
+    # -- every backend -------------------------------------------------------
+
+    async def _each(self, call: Callable[[OllamaClient], Any], model: Optional[str]) -> List[Any]:
+        results = await asyncio.gather(*(call(b.client) for b in self.backends), return_exceptions=True)
+        for b, r in zip(self.backends, results):
+            if not isinstance(r, BaseException):
+                self._mark_healthy(b, model)
+        if all(isinstance(r, BaseException) for r in results):
+            raise results[0]
+        return results
+
+    async def awarm_up(self, model: str = DEFAULT_MODEL, system: Optional[str] = None) -> None:
+        '''
+        Warm up every backend; succeeds if at least one did.
+        '''
+        await self._each(lambda c: c.awarm_up(model, system), model)
+
+    async def aping(self, model: str = DEFAULT_MODEL) -> None:
+        # Also a health probe: a backend that answers is taken back in.
+        await self._each(lambda c: c.aping(model), model)
+
+    async def aloaded_models(self) -> List[str]:
+        '''
+        Models loaded on any backend; refreshes each backend's model set.
+        '''
+        results = await self._each(lambda c: c.aloaded_models(), None)
+        names: Dict[str, None] = {}
+        for b, r in zip(self.backends, results):
+            if isinstance(r, BaseException):
+                continue
+            with self._lock:
+                b.models = set(r) | {n.rsplit(":latest", 1)[0] for n in r if n.endswith(":latest")}
+            names.update(dict.fromkeys(r))
+        return list(names)
+
+    def snapshot(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        with self._lock:
+            backends = [
+                {
+                    "url": b.client.base_url,
+                    "outstanding": b.outstanding,
+                    "requests": b.requests,
+                    "errors": b.errors,
+                    "consecutive_failures": b.failures,
+                    "ejected_for_s": round(max(0.0, b.ejected_until - now), 1),
+                    "models": sorted(b.models),
+                }
+                for b in self.backends
+            ]
+        return {
+            "backends": backends,
+            "hedge_quantile": self.hedge_quantile,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+        }
+
+    def close(self) -> None:
+        for b in self.backends:
+            b.client.close()
+
+    async def aclose(self) -> None:
+        for b in self.backends:
+            await b.client.aclose()
+
+
+_default_client: Optional[Union[OllamaClient, OllamaPool]] = None
+_default_lock = threading.Lock()
+
+def get_client() -> Union[OllamaClient, OllamaPool]:
+    '''
+    Process-wide shared client (used by the planner and the API); a pool
+    when OLLAMA_URLS lists more than one server.
+    '''
+    global _default_client
+    if _default_client is None:
+        with _default_lock:
+            if _default_client is None:
+                _default_client = OllamaPool(OLLAMA_URLS) if len(OLLAMA_URLS) > 1 else OllamaClient(OLLAMA_URLS[0])
+    return _default_client
+
+
+def ollama_chat(prompt: str, model: str = DEFAULT_MODEL, system: Optional[str]= None) -> str:
+    '''
+    Minimal ollama chat wrapper using api/chat.
+    '''
+    return get_client().chat(prompt=prompt, model=model, system=system)
@@ -0,0 +1,32 @@
+import pytest
+
+from app import storage
+
+
+@pytest.fixture
+def db(tmp_path):
+    """
+    A fresh, initialized database per test.
+    """
+    storage.set_db_path(str(tmp_path / "runs.db"))
+    storage.init_db()
+    yield storage
+    storage.close_connections()
+
+
+class Clock:
+    def __init__(self, now: float = 1_700_000_000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """
+    Wall clock (time.time) under the test's control.
+    """
+    c = Clock()
+    monkeypatch.setattr("time.time", c)
+    return c
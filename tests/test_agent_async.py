@@ -0,0 +1,56 @@
+import asyncio
+import json
+import time
+
+import pytest
+
+from app import agent, planner
+from app.plan_cache import PlanCache
+from app.registry import TOOL_REGISTRY
+
+GOAL = "Summarize the notes"
+CONTEXT = {"text": "line one\nline two"}
+PLAN = [{"name": "summarize_text", "args": {"text": "{{context:text}}"}}]
+
+
+class _Ollama:
+    def chat(self, prompt, model, system=None):
+        return json.dumps(PLAN)
+
+    async def achat(self, prompt, model, system=None):
+        return json.dumps(PLAN)
+
+
+@pytest.fixture(autouse=True)
+def llm(db, monkeypatch):
+    monkeypatch.setattr(planner, "get_client", lambda: _Ollama())
+    monkeypatch.setattr(agent, "plan_cache", PlanCache(ttl=60))
+
+
+@pytest.mark.parametrize("parallel", [True, False])
+def test_slow_tools_do_not_block_the_event_loop(monkeypatch, parallel):
+    def slow_summary(args):
+        time.sleep(0.3)
+        return {"summary": "done"}
+
+    monkeypatch.setattr(agent, "PARALLEL_TOOLS", parallel)
+    monkeypatch.setitem(TOOL_REGISTRY, "summarize_text", slow_summary)
+
+    async def scenario():
+        ticks = 0
+        run = asyncio.ensure_future(agent.arun_agent(GOAL, CONTEXT, stream=False))
+        while not run.done():
+            await asyncio.sleep(0.01)
+            ticks += 1
+        return await run, ticks
+
+    (result, steps, _), ticks = asyncio.run(scenario())
+    assert result["status"] == "ok"
+    assert steps[-1]["tool_result"] == {"summary": "done"}
+    assert ticks >= 10
+
+def test_sync_and_async_runs_agree():
+    sync_result, sync_steps, _ = agent.run_agent(GOAL, CONTEXT, stream=False, use_cache=False)
+    async_result, async_steps, _ = asyncio.run(agent.arun_agent(GOAL, CONTEXT, stream=False, use_cache=False))
+    assert sync_result == async_result
+    assert [s["tool_call"] for s in sync_steps] == [s["tool_call"] for s in async_steps]
@@ -0,0 +1,64 @@
+import asyncio
+import json
+import time
+
+import pytest
+
+from app import agent, main, planner, storage
+from app.plan_cache import PlanCache
+from app.schemas import BatchRunRequest
+from app.registry import TOOL_REGISTRY
+
+GOAL = "Summarize the notes"
+PLAN = [{"name": "summarize_text", "args": {"text": "{{context:text}}"}}]
+
+
+class _Ollama:
+    async def achat(self, prompt, model, system=None):
+        return json.dumps(PLAN)
+
+
+@pytest.fixture(autouse=True)
+def llm(db, monkeypatch):
+    monkeypatch.setattr(planner, "get_client", lambda: _Ollama())
+    monkeypatch.setattr(agent, "plan_cache", PlanCache(ttl=60))
+    monkeypatch.setitem(TOOL_REGISTRY, "summarize_text", _slow_summary)
+
+
+def _batch(*delays: float) -> BatchRunRequest:
+    return BatchRunRequest(runs=[{"user_goal": GOAL, "context": {"text": str(d)}} for d in delays])
+
+
+def _slow_summary(args):
+    time.sleep(float(args["text"]))
+    return {"summary": args["text"]}
+
+
+def test_batch_streams_and_saves_every_run():
+    async def scenario():
+        resp = await main.run_batch(_batch(0.0, 0.0, 0.0))
+        return [json.loads(line) async for line in resp.body_iterator]
+
+    rows = asyncio.run(scenario())
+    assert sorted(r["index"] for r in rows) == [0, 1, 2]
+    for r in rows:
+        saved = storage.read_run(r["result"]["run_id"])
+        assert saved["status"] == "ok"
+        assert saved["steps"][-1]["tool_result"] == r["result"]["steps"][-1]["tool_result"]
+
+
+def test_runs_in_flight_are_saved_after_disconnect():
+    async def scenario():
+        resp = await main.run_batch(_batch(0.0, 0.3, 0.3))
+        body = resp.body_iterator
+        first = json.loads(await body.__anext__())
+        await body.aclose()  # the client went away
+        assert main._batch_runs
+        await asyncio.gather(*list(main._batch_runs))
+        return first
+
+    first = asyncio.run(scenario())
+    assert first["index"] == 0
+    rows = storage.list_runs(limit=10)
+    assert len(rows) == 3
+    assert {r["status"] for r in rows} == {"ok"}
@@ -0,0 +1,52 @@
+import pytest
+
+from app import storage
+
+BIG = {"text": "release planning, search latency and on-call " * 100}
+SMALL = {"text": "short"}
+
+
+@pytest.fixture(params=["zlib", "zstd"])
+def codec(request, monkeypatch):
+    if request.param == "zstd" and storage.zstandard is None:
+        pytest.skip("zstandard is not installed")
+    monkeypatch.setattr(storage, "DB_COMPRESSION", request.param)
+    return request.param
+
+
+def test_large_values_round_trip(codec):
+    encoded = storage._encode_json(BIG)
+    assert isinstance(encoded, bytes)
+    assert encoded.startswith(storage._ZSTD_MARK if codec == "zstd" else storage._ZLIB_MARK)
+    assert storage._decode_json(encoded) == BIG
+
+def test_small_values_stay_text(codec):
+    encoded = storage._encode_json(SMALL)
+    assert encoded == '{"text": "short"}'
+    assert storage._decode_json(encoded) == SMALL
+
+def test_compression_can_be_disabled(monkeypatch):
+    monkeypatch.setattr(storage, "DB_COMPRESSION", None)
+    assert isinstance(storage._encode_json(BIG), str)
+
+def test_zstd_falls_back_to_zlib_without_the_package(monkeypatch):
+    monkeypatch.setattr(storage, "DB_COMPRESSION", "zstd")
+    monkeypatch.setattr(storage, "zstandard", None)
+    assert storage._encode_json(BIG).startswith(storage._ZLIB_MARK)
+
+def test_decode_handles_empty_values():
+    assert storage._decode_json(None) is None
+    assert storage._decode_json("") is None
+
+
+def test_stored_runs_round_trip(db, codec):
+    steps = [{"thought": "t", "tool_call": None, "tool_result": BIG}, {"thought": "s", "tool_result": SMALL}]
+    storage.save_run(run_id="r", user_goal="g", status="ok", final_answer="done", steps=steps, context=BIG)
+    run = storage.read_run("r")
+    assert run["steps"] == steps
+    assert run["context"] == BIG
+
+    stats = storage.compression_stats()
+    assert stats["columns"]["run_steps.step_json"]["compressed_rows"] == 1
+    assert stats["columns"]["runs.context_json"]["compressed_rows"] == 1
+    assert stats["saved_bytes"] > 0
@@ -0,0 +1,32 @@
+import gc
+import os
+import threading
+
+from app import storage
+
+
+def _open_fds():
+    return len(os.listdir("/proc/self/fd")) if os.path.isdir("/proc/self/fd") else None
+
+
+def test_a_thread_reuses_its_connection(db):
+    assert storage._conn() is storage._conn()
+
+def test_connections_are_closed_when_their_threads_exit(db):
+    storage._conn()
+    before_fds = _open_fds()
+    for _ in range(50):
+        t = threading.Thread(target=storage.read_run, args=("missing",))
+        t.start()
+        t.join()
+    gc.collect()
+    assert len(storage._all_conns) == 1  # this thread's
+    if before_fds is not None:
+        assert _open_fds() <= before_fds + 2
+
+def test_set_db_path_closes_every_connection(db, tmp_path):
+    storage._conn()
+    storage.set_db_path(str(tmp_path / "other.db"))
+    assert not storage._all_conns
+    storage.init_db()
+    assert len(storage._all_conns) == 1
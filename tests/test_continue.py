@@ -0,0 +1,58 @@
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import agent, main, planner
+from app.plan_cache import PlanCache
+from app.registry import TOOL_REGISTRY
+
+GOAL = "Process the weekly notes"  # no rule-tier keywords: goes to the LLM
+PLAN = [
+    {"name": "summarize_text", "args": {"text": "{{context:text}}"}},
+    {"name": "create_tasks", "args": {"tasks": ["Send the summary"]}},
+    {"name": "draft_email", "args": {"subject": "Notes", "bullet_points": ["{{result:0.summary}}"]}},
+]
+
+
+class _Ollama:
+    async def achat(self, prompt, model, system=None, stats=None, accept=None, format=None):
+        return json.dumps(PLAN)
+
+
+@pytest.fixture
+def calls(db, monkeypatch):
+    monkeypatch.setattr(planner, "get_client", lambda: _Ollama())
+    monkeypatch.setattr(agent, "plan_cache", PlanCache(ttl=60))
+    ran = []
+    for name in ("summarize_text", "create_tasks", "draft_email"):
+        def counted(args, fn=TOOL_REGISTRY[name], name=name):
+            ran.append(name)
+            return fn(args)
+        monkeypatch.setitem(TOOL_REGISTRY, name, counted)
+    return ran
+
+
+def test_continue_resumes_at_the_checkpoint(db, calls):
+    client = TestClient(main.app)
+    first = client.post("/run", json={"user_goal": GOAL, "context": {"text": "Line one. Line two."}}).json()
+    assert first["status"] == "needs_input"
+    assert [m["field"] for m in first["missing_fields"]] == ["to"]
+    assert calls == ["summarize_text", "create_tasks"]
+    before = db.read_run(first["run_id"])["steps"]
+    assert len(before) == db.count_steps(first["run_id"])
+
+    done = client.post("/continue", json={"run_id": first["run_id"], "context_patch": {"to": "team@a.io"}}).json()
+    assert done["status"] == "ok"
+    # Calls before the checkpoint were not executed again
+    assert calls == ["summarize_text", "create_tasks", "draft_email"]
+    email = done["steps"][-1]
+    assert email["tool_call"]["args"]["to"] == "team@a.io"
+    summary = [s for s in before if s["thought"] == "Calling tool: summarize_text"][0]
+    assert email["tool_call"]["args"]["bullet_points"] == [summary["tool_result"]["summary"]]
+
+    # New steps are appended after the first request's audit log
+    after = db.read_run(first["run_id"])["steps"]
+    assert after[:len(before)] == before
+    assert after[len(before):] == done["steps"]
+    assert db.count_steps(first["run_id"]) == len(after)
@@ -0,0 +1,62 @@
+import csv
+import io
+import json
+
+import pytest
+
+from app import export, storage
+
+
+def _save(clock, run_id, at, status="ok", n_steps=3):
+    clock.now = at
+    steps = [{"thought": f"{run_id} step {i}", "tool_result": {"i": i}} for i in range(n_steps)]
+    storage.save_run(run_id=run_id, user_goal=f"goal {run_id}", status=status, final_answer="done", steps=steps, context={"k": run_id})
+    return steps
+
+@pytest.fixture
+def runs(db, clock):
+    return {
+        "a": _save(clock, "a", 100),
+        "b": _save(clock, "b", 200, status="needs_input"),
+        "c": _save(clock, "c", 300, n_steps=0),
+    }
+
+
+def test_iter_runs_groups_steps_across_chunks(runs):
+    got = list(storage.iter_runs(chunk_size=2))
+    assert [r["run_id"] for r in got] == ["a", "b", "c"]
+    assert [r["steps"] for r in got] == [runs["a"], runs["b"], []]
+    assert got[0]["context"] == {"k": "a"}
+
+def test_iter_runs_filters(runs):
+    assert [r["run_id"] for r in storage.iter_runs(since=200)] == ["b", "c"]
+    assert [r["run_id"] for r in storage.iter_runs(until=200)] == ["a"]
+    assert [r["run_id"] for r in storage.iter_runs(status="needs_input")] == ["b"]
+
+
+def test_jsonl_export(runs):
+    body = b"".join(export.iter_export("jsonl", batch_size=2)).decode("utf-8")
+    got = [json.loads(line) for line in body.splitlines()]
+    assert [r["run_id"] for r in got] == ["a", "b", "c"]
+    assert got[1]["steps"] == runs["b"]
+
+def test_csv_export(runs):
+    body = b"".join(export.iter_export("csv", batch_size=2)).decode("utf-8")
+    rows = list(csv.reader(io.StringIO(body)))
+    assert rows[0] == export.COLUMNS
+    assert [r[0] for r in rows[1:]] == ["a", "b", "c"]
+    assert json.loads(rows[1][export.COLUMNS.index("steps_json")]) == runs["a"]
+
+def test_empty_export_still_has_a_header(db):
+    body = b"".join(export.iter_export("csv")).decode("utf-8")
+    assert body.splitlines() == [",".join(export.COLUMNS)]
+
+
+def test_resolve_format_without_pyarrow(monkeypatch):
+    monkeypatch.setattr(export, "pa", None)
+    assert export.resolve_format("columnar") == "csv"
+    assert export.resolve_format("jsonl") == "jsonl"
+    with pytest.raises(ValueError):
+        export.resolve_format("parquet")
+    with pytest.raises(ValueError):
+        export.resolve_format("xml")
@@ -0,0 +1,94 @@
+import asyncio
+
+import pytest
+
+from app import jobs, storage
+
+GOAL = "Summarize the notes"  # planned by the rule tier, no Ollama needed
+CONTEXT = {"text": "line one\nline two"}
+
+
+async def _events(queue, run_id):
+    out = []
+    async for chunk in await queue.stream(run_id):
+        out.append(chunk.split("\n")[1][len("event: "):])
+    return out
+
+def _run(coro):
+    async def main():
+        queue = jobs.JobQueue(workers=1, max_depth=2)
+        try:
+            return await coro(queue)
+        finally:
+            await queue.stop()
+    return asyncio.run(main())
+
+
+def test_background_run_events(db):
+    async def scenario(queue):
+        await queue.start()
+        await queue.submit("r", GOAL, CONTEXT)
+        return await _events(queue, "r")
+
+    events = _run(scenario)
+    assert events[0] == "queued"
+    assert events[1] == "planner_started"
+    assert "step_completed" in events
+    assert events[-1] == "ok"
+    assert storage.read_run("r", 0, 0)["status"] == "ok"
+    assert storage.queued_runs() == []
+
+def test_unfinished_runs_are_recovered_on_start(db):
+    # Left behind by a previous process: one queued, one interrupted mid-run.
+    storage.enqueue_run("queued", GOAL, CONTEXT, {"use_cache": False})
+    storage.enqueue_run("interrupted", GOAL, CONTEXT, {})
+    storage.start_queued_run("interrupted")
+    storage.append_steps("interrupted", [(0, {"thought": "stale"})])
+
+    async def scenario(queue):
+        recovered = await queue.start()
+        return recovered, await _events(queue, "queued"), await _events(queue, "interrupted")
+
+    recovered, *events = _run(scenario)
+    assert recovered == 2
+    assert [e[-1] for e in events] == ["ok", "ok"]
+    assert storage.queued_runs() == []
+    assert all(s.get("thought") != "stale" for s in storage.read_steps("interrupted"))
+
+def test_worker_survives_a_failing_job(db, monkeypatch):
+    real = jobs.start_queued_run
+
+    def start(run_id):
+        if run_id == "bad":
+            raise RuntimeError("disk full")
+        real(run_id)
+
+    monkeypatch.setattr(jobs, "start_queued_run", start)
+
+    async def scenario(queue):
+        await queue.start()
+        await queue.submit("bad", GOAL, CONTEXT)
+        await queue.submit("good", GOAL, CONTEXT)
+        return await _events(queue, "bad"), await _events(queue, "good"), queue.snapshot()
+
+    bad, good, snapshot = _run(scenario)
+    assert bad[-1] == "error"
+    assert good[-1] == "ok"
+    assert snapshot["running"] == 0 and snapshot["queued"] == 0
+    run = storage.read_run("bad", 0, 0)
+    assert run["status"] == "error" and "disk full" in run["final_answer"]
+    assert storage.queued_runs() == []
+
+def test_submit_rejects_when_full(db):
+    async def scenario(queue):
+        # Without workers the submitted runs stay queued.
+        await queue.start()
+        for t in queue._tasks:
+            t.cancel()
+        await queue.submit("a", GOAL, CONTEXT)
+        await queue.submit("b", GOAL, CONTEXT)
+        with pytest.raises(jobs.QueueFull):
+            await queue.submit("c", GOAL, CONTEXT)
+
+    _run(scenario)
+    assert [j["run_id"] for j in storage.queued_runs()] == ["a", "b"]
@@ -0,0 +1,128 @@
+import asyncio
+import json
+import threading
+import time
+
+import pytest
+
+from app import metrics, planner
+from app.metrics import OLLAMA_REQUEST_SECONDS, Counter, Histogram, render_metrics
+
+
+@pytest.fixture
+def registry(monkeypatch):
+    """
+    Metrics created by a test stay out of the process-wide /metrics output.
+    """
+    monkeypatch.setattr(metrics, "_metrics", [])
+    return metrics._metrics
+
+
+def test_histogram_exposition(registry):
+    h = Histogram("t_seconds", "Test timings.", ("op",), buckets=(0.1, 1.0))
+    for v in (0.05, 0.5, 5.0):
+        h.observe(v, "read")
+    h.observe(0.1, "write")  # le is inclusive
+
+    assert render_metrics().splitlines() == [
+        "# HELP t_seconds Test timings.",
+        "# TYPE t_seconds histogram",
+        't_seconds_bucket{op="read",le="0.1"} 1',
+        't_seconds_bucket{op="read",le="1.0"} 2',
+        't_seconds_bucket{op="read",le="+Inf"} 3',
+        f't_seconds_sum{{op="read"}} {0.05 + 0.5 + 5.0!r}',
+        't_seconds_count{op="read"} 3',
+        't_seconds_bucket{op="write",le="0.1"} 1',
+        't_seconds_bucket{op="write",le="1.0"} 1',
+        't_seconds_bucket{op="write",le="+Inf"} 1',
+        't_seconds_sum{op="write"} 0.1',
+        't_seconds_count{op="write"} 1',
+    ]
+
+def test_counter_exposition_escapes_labels(registry):
+    c = Counter("t_total", "Test counter.", ("kind",))
+    c.inc('a"b\\c')
+    c.inc("plain", amount=2.5)
+    assert c.render() == ['t_total{kind="a\\"b\\\\c"} 1', 't_total{kind="plain"} 2.5']
+
+def test_per_thread_shards_are_merged(registry):
+    h = Histogram("t_seconds", "Test timings.", buckets=(1.0,))
+    c = Counter("t_total", "Test counter.")
+    start = threading.Barrier(8)
+
+    def work():
+        start.wait()
+        for _ in range(1000):
+            h.observe(0.5)
+            c.inc()
+
+    threads = [threading.Thread(target=work) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert len(h._shards) == 8
+    assert c.render() == ["t_total 8000"]
+    assert h.render() == ['t_seconds_bucket{le="1.0"} 8000', 't_seconds_bucket{le="+Inf"} 8000', "t_seconds_sum 4000", "t_seconds_count 8000"]
+
+
+CHUNK_DELAY = 0.01
+TOOL_DELAY = 0.2
+PLAN = [{"name": "summarize_text", "args": {"text": f"part {i}"}} for i in range(3)]
+
+class _SlowStream:
+    """
+    Streams the plan one call per chunk, each after CHUNK_DELAY.
+    """
+
+    def _chunks(self):
+        return ["["] + [json.dumps(c) + ("," if i < len(PLAN) - 1 else "") for i, c in enumerate(PLAN)] + ["]"]
+
+    def chat_stream(self, prompt, model, system=None, stats=None, format=None):
+        for part in self._chunks():
+            time.sleep(CHUNK_DELAY)
+            yield part
+
+    async def achat_stream(self, prompt, model, system=None, stats=None, format=None):
+        for part in self._chunks():
+            await asyncio.sleep(CHUNK_DELAY)
+            yield part
+
+def _stream_seconds() -> float:
+    for line in OLLAMA_REQUEST_SECONDS.render():
+        if line.startswith('agent_ollama_request_seconds_sum{call="plan_stream"}'):
+            return float(line.split()[-1])
+    return 0.0
+
+def test_plan_stream_timing_excludes_the_consumer(monkeypatch):
+    monkeypatch.setattr(planner, "get_client", lambda: _SlowStream())
+    before = _stream_seconds()
+    debug = {}
+    calls = []
+    for call in planner.stream_plan_with_ollama("goal", None, debug=debug):
+        time.sleep(TOOL_DELAY)  # the consumer executing the tool
+        calls.append(call)
+
+    assert calls == PLAN
+    assert debug["parse"] == "strict"
+    spent = _stream_seconds() - before
+    assert len(PLAN) * CHUNK_DELAY <= spent < TOOL_DELAY
+    assert debug["planner_ms"] < TOOL_DELAY * 1000
+
+def test_async_plan_stream_timing_excludes_the_consumer(monkeypatch):
+    monkeypatch.setattr(planner, "get_client", lambda: _SlowStream())
+
+    async def consume(debug):
+        calls = []
+        async for call in planner.astream_plan_with_ollama("goal", None, debug=debug):
+            await asyncio.sleep(TOOL_DELAY)
+            calls.append(call)
+        return calls
+
+    before = _stream_seconds()
+    debug = {}
+    assert asyncio.run(consume(debug)) == PLAN
+    spent = _stream_seconds() - before
+    assert len(PLAN) * CHUNK_DELAY <= spent < TOOL_DELAY
+    assert debug["planner_ms"] < TOOL_DELAY * 1000
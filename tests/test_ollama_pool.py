@@ -0,0 +1,169 @@
+import asyncio
+from collections import deque
+
+import httpx
+import pytest
+
+from ollama_client import HEDGE_MIN_SAMPLES, OllamaPool
+
+MODEL = "m"
+
+
+def _status_error(code):
+    req = httpx.Request("POST", "http://fake/api/chat")
+    return httpx.HTTPStatusError(f"HTTP {code}", request=req, response=httpx.Response(code, request=req))
+
+
+class FakeBackend:
+    """
+    Stands in for OllamaClient: replies with `reply` after `delay` seconds,
+    or raises `error`. Streams raise `error` after `chunks_before_error`.
+    """
+
+    def __init__(self, name, reply=None, error=None, delay=0.0, chunks_before_error=0):
+        self.base_url = f"http://{name}"
+        self.reply = reply if reply is not None else name
+        self.error = error
+        self.delay = delay
+        self.chunks_before_error = chunks_before_error
+        self.calls = 0
+
+    def chat(self, prompt, model, system=None, stats=None, format=None):
+        self.calls += 1
+        if self.error:
+            raise self.error
+        return self.reply
+
+    async def achat(self, prompt, model, system=None, stats=None, format=None):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        if self.error:
+            raise self.error
+        if stats is not None:
+            stats["total_duration"] = int(self.delay * 1e9)
+        return self.reply
+
+    def chat_stream(self, prompt, model, system=None, stats=None, format=None):
+        self.calls += 1
+        for i, ch in enumerate(self.reply):
+            if self.error and i == self.chunks_before_error:
+                raise self.error
+            yield ch
+        if self.error and self.chunks_before_error >= len(self.reply):
+            raise self.error
+
+    async def achat_stream(self, prompt, model, system=None, stats=None, format=None):
+        for ch in self.chat_stream(prompt, model, system, stats, format):
+            yield ch
+
+
+def _pool(*fakes, **kwargs):
+    pool = OllamaPool([f.base_url for f in fakes], **kwargs)
+    for b, f in zip(pool.backends, fakes):
+        b.client = f
+    return pool
+
+
+def test_fails_over_on_transport_errors():
+    down, up = FakeBackend("down", error=httpx.ConnectError("refused")), FakeBackend("up")
+    pool = _pool(down, up)
+    assert [pool.chat("p", MODEL) for _ in range(4)] == ["up"] * 4
+    snap = {b["url"]: b for b in pool.snapshot()["backends"]}
+    assert snap["http://down"]["errors"] >= 1
+    assert all(b["outstanding"] == 0 for b in snap.values())
+
+def test_client_errors_are_not_retried():
+    bad, ok = FakeBackend("bad", error=_status_error(400)), FakeBackend("ok")
+    pool = _pool(bad, ok)
+    results = []
+    for _ in range(2):
+        try:
+            results.append(pool.chat("p", MODEL))
+        except httpx.HTTPStatusError:
+            results.append("raised")
+    assert sorted(results) == ["ok", "raised"]
+
+def test_model_not_found_moves_on_and_forgets_the_model():
+    missing, ok = FakeBackend("missing", error=_status_error(404)), FakeBackend("ok")
+    pool = _pool(missing, ok)
+    pool.backends[0].models.add(MODEL)
+    assert pool.chat("p", MODEL) == "ok"
+    assert MODEL not in pool.backends[0].models
+    assert MODEL in pool.backends[1].models
+
+def test_backend_is_ejected_after_repeated_failures():
+    flaky, ok = FakeBackend("flaky", error=_status_error(500)), FakeBackend("ok")
+    pool = _pool(flaky, ok, eject_after=2, eject_seconds=60, affinity_weight=0)
+    for _ in range(6):
+        assert pool.chat("p", MODEL) == "ok"
+    assert flaky.calls == 2
+    assert pool.snapshot()["backends"][0]["ejected_for_s"] > 0
+
+def test_all_backends_failing_raises():
+    pool = _pool(FakeBackend("a", error=httpx.ConnectError("x")), FakeBackend("b", error=httpx.ConnectError("y")))
+    with pytest.raises(httpx.ConnectError):
+        pool.chat("p", MODEL)
+    assert all(b.outstanding == 0 for b in pool.backends)
+
+def test_prefers_backends_with_the_model_loaded():
+    cold, warm = FakeBackend("cold"), FakeBackend("warm")
+    pool = _pool(cold, warm)
+    pool.backends[1].models.add(MODEL)
+    assert [pool.chat("p", MODEL) for _ in range(3)] == ["warm"] * 3
+
+
+def test_stream_fails_over_before_the_first_chunk():
+    pool = _pool(FakeBackend("a", error=httpx.ConnectError("x")), FakeBackend("bb"))
+    assert {"".join(pool.chat_stream("p", MODEL)) for _ in range(2)} == {"bb"}
+
+def test_stream_does_not_fail_over_after_the_first_chunk():
+    pool = _pool(FakeBackend("aaa", error=httpx.ReadError("cut"), chunks_before_error=1), FakeBackend("bb"))
+    got = []
+    with pytest.raises(httpx.ReadError):
+        for ch in pool.chat_stream("p", MODEL):
+            got.append(ch)
+    assert got == ["a"]
+
+def test_async_stream_fails_over():
+    pool = _pool(FakeBackend("a", error=httpx.ConnectError("x")), FakeBackend("bb"))
+
+    async def collect():
+        return "".join([ch async for ch in pool.achat_stream("p", MODEL)])
+
+    assert asyncio.run(collect()) == "bb"
+
+
+def _seed_latencies(pool, seconds=0.01, n=HEDGE_MIN_SAMPLES):
+    pool._latencies[MODEL] = deque([seconds] * n)
+
+def test_hedge_wins_when_the_first_backend_is_slow():
+    slow, fast = FakeBackend("slow", delay=1.0), FakeBackend("fast")
+    pool = _pool(slow, fast, hedge_quantile=0.9)
+    pool.backends[0].models.add(MODEL)  # picked first
+    _seed_latencies(pool)
+    stats = {}
+    assert asyncio.run(pool.achat("p", MODEL, stats=stats)) == "fast"
+    assert stats["total_duration"] == 0  # the winner's stats, not the slow call's
+    assert (pool.hedges, pool.hedge_wins) == (1, 1)
+    assert all(b.outstanding == 0 for b in pool.backends)
+
+def test_no_hedge_without_enough_latency_samples():
+    slow, fast = FakeBackend("slow", delay=0.05), FakeBackend("fast")
+    pool = _pool(slow, fast, hedge_quantile=0.9)
+    pool.backends[0].models.add(MODEL)
+    _seed_latencies(pool, n=HEDGE_MIN_SAMPLES - 1)
+    assert asyncio.run(pool.achat("p", MODEL)) == "slow"
+    assert pool.hedges == 0
+
+def test_hedge_reply_must_pass_accept():
+    slow, fast = FakeBackend("slow", reply="[]", delay=0.1), FakeBackend("fast", reply="garbage")
+    pool = _pool(slow, fast, hedge_quantile=0.5)
+    pool.backends[0].models.add(MODEL)
+    _seed_latencies(pool)
+    assert asyncio.run(pool.achat("p", MODEL, accept=lambda s: s.startswith("["))) == "[]"
+    assert (pool.hedges, pool.hedge_wins) == (1, 0)
+
+def test_unaccepted_reply_is_returned_when_nothing_better_comes():
+    pool = _pool(FakeBackend("a", reply="garbage"), FakeBackend("b", error=httpx.ConnectError("x")), hedge_quantile=0.5)
+    pool.backends[0].models.add(MODEL)
+    assert asyncio.run(pool.achat("p", MODEL, accept=lambda s: False)) == "garbage"
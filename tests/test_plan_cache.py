@@ -0,0 +1,114 @@
+import asyncio
+import json
+
+from app import agent, planner
+from app.plan_cache import PlanCache, cache_key, templatize_plan
+
+PLAN = [
+    {"name": "summarize_text", "args": {"text": "notes"}},
+    {"name": "draft_email", "args": {"to": "a@b.c", "subject": "Hi", "bullet_points": ["x"]}},
+]
+
+
+def test_cache_key_normalizes_goal():
+    ctx = {"text": "a"}
+    assert cache_key("Summarize  the Notes", ctx, "m") == cache_key(" summarize the notes ", ctx, "m")
+
+def test_cache_key_uses_context_keys_not_values():
+    assert cache_key("g", {"text": "a", "to": "x"}, "m") == cache_key("g", {"to": "y", "text": "b"}, "m")
+    assert cache_key("g", {"text": "a"}, "m") != cache_key("g", {"text": "a", "to": "x"}, "m")
+
+def test_cache_key_includes_model():
+    assert cache_key("g", None, "m1") != cache_key("g", None, "m2")
+
+def test_templatize_blanks_context_values():
+    out = templatize_plan(PLAN, {"text": "notes", "bullet_points": ["x"]})
+    assert out[0]["args"] == {"text": ""}
+    assert out[1]["args"] == {"to": "a@b.c", "subject": "Hi", "bullet_points": []}
+    assert PLAN[0]["args"] == {"text": "notes"}
+
+
+def test_memory_hit_then_ttl_expiry(db, clock):
+    cache = PlanCache(max_entries=8, ttl=60)
+    cache.put("k", PLAN)
+    assert cache.get("k") == (PLAN, "memory")
+    clock.now += 61
+    assert cache.get("k") == (None, None)
+    assert cache.stats["misses"] == 1
+
+def test_sqlite_tier_backs_evicted_entries(db, clock):
+    cache = PlanCache(max_entries=1, ttl=60)
+    cache.put("a", PLAN)
+    cache.put("b", PLAN[:1])
+    assert cache.snapshot()["entries_in_memory"] == 1
+    assert cache.get("a") == (PLAN, "sqlite")
+    # promoted back into memory
+    assert cache.get("a") == (PLAN, "memory")
+
+def test_sqlite_tier_respects_ttl(db, clock):
+    PlanCache(ttl=60).put("k", PLAN)
+    fresh = PlanCache(ttl=60)  # e.g. after a restart: empty memory tier
+    assert fresh.get("k") == (PLAN, "sqlite")
+    clock.now += 61
+    assert PlanCache(ttl=60).get("k") == (None, None)
+
+def test_async_get_matches_sync(db, clock):
+    cache = PlanCache(ttl=60)
+    asyncio.run(cache.aput("k", PLAN))
+    assert asyncio.run(cache.aget("k")) == (PLAN, "memory")
+    assert asyncio.run(PlanCache(ttl=60).aget("k")) == (PLAN, "sqlite")
+
+
+def test_templatize_turns_copied_context_values_into_references():
+    ctx = {"notes": "Merger talks with Initech", "recipient": "alice@a.io"}
+    plan = [{"name": "draft_email", "args": {"to": "alice@a.io", "subject": "Re: Merger talks with Initech", "bullet_points": ["Merger talks with Initech"]}}]
+    assert templatize_plan(plan, ctx) == [{"name": "draft_email", "args": {
+        "to": "{{context:recipient}}",
+        "subject": "Re: {{context:notes}}",
+        "bullet_points": ["{{context:notes}}"],
+    }}]
+
+def test_templatize_refuses_plans_quoting_part_of_the_context():
+    ctx = {"notes": "Merger talks with Initech. Budget is frozen.", "tasks": ["Call legal"]}
+    assert templatize_plan([{"name": "summarize_text", "args": {"text": "Budget is frozen"}}], ctx) is None
+    assert templatize_plan([{"name": "create_tasks", "args": {"items": ["Call legal", "Other"]}}], ctx) is None
+
+
+GOAL = "Process the weekly notes"  # no rule-tier keywords: goes to the LLM
+
+class _CopyingOllama:
+    """
+    Planner stand-in that, like a real model, copies context values into
+    args whose names differ from the context keys.
+    """
+
+    def __init__(self, context):
+        self.calls = 0
+        self.reply = json.dumps([
+            {"name": "summarize_text", "args": {"text": context["notes"]}},
+            {"name": "draft_email", "args": {"to": context["recipient"], "subject": "Notes", "bullet_points": [context["notes"]]}},
+        ])
+
+    def chat(self, prompt, model, system=None, stats=None, format=None):
+        self.calls += 1
+        return self.reply
+
+def test_cached_plans_do_not_leak_context_between_requests(db, monkeypatch):
+    cache = PlanCache(ttl=60)
+    monkeypatch.setattr(agent, "plan_cache", cache)
+    first = {"notes": "Alice's notes: merger talks with Initech", "recipient": "alice@a.io"}
+    second = {"notes": "Bob's notes: quarterly planning", "recipient": "bob@b.io"}
+    llm = _CopyingOllama(first)
+    monkeypatch.setattr(planner, "get_client", lambda: llm)
+
+    agent.run_agent(GOAL, first, stream=False)
+    _, steps, _ = agent.run_agent(GOAL, second, stream=False)
+
+    assert llm.calls == 1
+    assert steps[0]["tool_result"]["source"] == "cache:memory"
+    dumped = json.dumps(steps)
+    for value in first.values():
+        assert value not in dumped
+    email = [s for s in steps if s["thought"] == "Calling tool: draft_email"][0]
+    assert email["tool_call"]["args"]["to"] == second["recipient"]
+    assert email["tool_call"]["args"]["bullet_points"] == [second["notes"]]
@@ -0,0 +1,131 @@
+import asyncio
+import json
+
+import pytest
+
+from app import agent, planner
+from app.config import MAX_STEPS
+from app.plan_cache import PlanCache
+from app.registry import PLAN_SCHEMA, TOOL_NAMES, TOOLS
+
+CALLS = [
+    {"name": "summarize_text", "args": {"text": "notes"}},
+    {"name": "create_tasks", "args": {"tasks": ["a", "b"]}},
+]
+FULL = json.dumps(CALLS)
+TRUNCATED = FULL[: FULL.index('{"name": "create_tasks"') + 20]
+GOAL = "Process the weekly notes"  # no rule-tier keywords
+
+
+@pytest.mark.parametrize("text, how, n", [
+    (FULL, "strict", 2),
+    ("Sure! " + FULL + " Anything else?", "strict", 2),
+    (TRUNCATED, "salvaged", 1),
+    (FULL[:-1] + ",]", "salvaged", 2),
+    ('[{"name": "summarize_text", "args": {"text": "notes"}}, {"name": oops}, ' + json.dumps(CALLS[1]) + "]", "salvaged", 1),
+    ('[{"name": "summ', "invalid", 0),
+    ("no plan here", "invalid", 0),
+])
+def test_decode_plan(text, how, n):
+    parsed, got = planner._decode_plan(text)
+    assert got == how
+    assert len(parsed or []) == n
+    if parsed:
+        assert parsed[0] == CALLS[0]
+
+def test_usable_accepts_salvageable_replies():
+    assert planner._usable(FULL)
+    assert planner._usable(TRUNCATED)
+    assert not planner._usable("no plan here")
+
+
+def test_plan_schema_matches_the_registry():
+    assert PLAN_SCHEMA["type"] == "array"
+    assert PLAN_SCHEMA["maxItems"] == MAX_STEPS
+    variants = PLAN_SCHEMA["items"]["anyOf"]
+    assert [v["properties"]["name"]["enum"] for v in variants] == [[t["name"]] for t in TOOLS]
+    assert {t["name"] for t in TOOLS} == set(TOOL_NAMES)
+    for v, tool in zip(variants, TOOLS):
+        args = v["properties"]["args"]
+        assert set(args["required"]) == set(tool["args_schema"])
+        assert args["additionalProperties"] is False
+
+def test_plan_schema_validates_plans():
+    jsonschema = pytest.importorskip("jsonschema")
+    jsonschema.validate(CALLS, PLAN_SCHEMA)
+    with pytest.raises(jsonschema.ValidationError):
+        jsonschema.validate([{"name": "summarize_text", "args": {"text": "x", "extra": 1}}], PLAN_SCHEMA)
+    with pytest.raises(jsonschema.ValidationError):
+        jsonschema.validate([{"name": "send_money", "args": {}}], PLAN_SCHEMA)
+
+
+class FakeOllama:
+    """
+    Answers planner calls with `reply` and repair calls with the full plan.
+    """
+
+    def __init__(self, reply):
+        self.reply = reply
+        self.calls = 0
+
+    def _answer(self, prompt):
+        self.calls += 1
+        return FULL if prompt.startswith("Fix this") else self.reply
+
+    def chat(self, prompt, model, system=None, stats=None, format=None):
+        return self._answer(prompt)
+
+    async def achat(self, prompt, model, system=None, stats=None, accept=None, format=None):
+        return self._answer(prompt)
+
+    def chat_stream(self, prompt, model, system=None, stats=None, format=None):
+        text = self._answer(prompt)
+        for i in range(0, len(text), 7):
+            yield text[i:i + 7]
+
+@pytest.fixture
+def fake_ollama(monkeypatch):
+    def install(reply):
+        fake = FakeOllama(reply)
+        monkeypatch.setattr(planner, "get_client", lambda: fake)
+        return fake
+    return install
+
+@pytest.fixture
+def cache(db, monkeypatch):
+    c = PlanCache(ttl=60)
+    monkeypatch.setattr(agent, "plan_cache", c)
+    return c
+
+
+@pytest.mark.parametrize("reply, how, calls", [(FULL, "strict", 1), (TRUNCATED, "salvaged", 1), ("no plan", "repaired", 2)])
+def test_plan_with_ollama_records_parse(fake_ollama, reply, how, calls):
+    fake = fake_ollama(reply)
+    plan, debug = planner.plan_with_ollama(GOAL, None)
+    assert debug["parse"] == how
+    assert plan == (CALLS[:1] if how == "salvaged" else CALLS)
+    assert fake.calls == calls
+
+@pytest.mark.parametrize("stream", [False, True])
+def test_salvaged_plans_run_once_but_are_not_cached(cache, fake_ollama, stream):
+    fake = fake_ollama(TRUNCATED)
+    for _ in range(2):
+        result, steps, _ = agent.run_agent(GOAL, {"text": "notes"}, stream=stream)
+        assert steps[0]["tool_result"]["source"] == "ollama"
+        assert steps[0]["tool_result"]["parse"] == "salvaged"
+        assert result["warnings"] == [agent.SALVAGED_WARNING]
+    assert fake.calls == 2
+    assert cache.stats["stores"] == 0
+
+def test_strict_plans_are_cached(cache, fake_ollama):
+    fake = fake_ollama(FULL)
+    result, _, _ = agent.run_agent(GOAL, {"text": "notes"})
+    assert "warnings" not in result
+    _, steps, _ = asyncio.run(agent.arun_agent(GOAL, {"text": "notes"}))
+    assert steps[0]["tool_result"]["source"] == "cache:memory"
+    assert fake.calls == 1
+
+def test_repaired_plans_are_cached(cache, fake_ollama):
+    fake_ollama("no plan")
+    agent.run_agent(GOAL, None)
+    assert cache.stats["stores"] == 1
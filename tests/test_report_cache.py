@@ -0,0 +1,67 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from app import main
+from app.report_cache import ReportCache
+from app.reporting import iter_basic_html, iter_joined, iter_markdown_report
+
+RUN_ID = "run-1"
+REPORTS = ["/runs/run-1", "/runs/run-1/report.md", "/runs/run-1/report.html"]
+
+
+def _step(i):
+    return {"thought": f"step {i}", "tool_call": {"name": "summarize_text", "args": {"text": "x" * i}}, "tool_result": {"summary": str(i)}}
+
+
+@pytest.fixture
+def client(db, monkeypatch):
+    monkeypatch.setattr(main, "report_cache", ReportCache())
+    db.save_run(run_id=RUN_ID, user_goal="Summarize the notes", status="ok", final_answer="done", context={"text": "notes"})
+    db.append_steps(RUN_ID, [(i, _step(i)) for i in range(3)])
+    return TestClient(main.app)
+
+
+@pytest.mark.parametrize("url", REPORTS)
+def test_if_none_match_returns_304(client, url):
+    first = client.get(url)
+    assert first.status_code == 200
+    etag = first.headers["etag"]
+
+    again = client.get(url, headers={"If-None-Match": etag})
+    assert again.status_code == 304
+    assert again.content == b""
+    assert again.headers["etag"] == etag
+    assert client.get(url, headers={"If-None-Match": '"stale"'}).status_code == 200
+
+
+@pytest.mark.parametrize("url", REPORTS)
+def test_appending_a_step_changes_the_etag(client, db, url):
+    before = client.get(url)
+    db.append_steps(RUN_ID, [(3, _step(3))])
+    after = client.get(url, headers={"If-None-Match": before.headers["etag"]})
+    assert after.status_code == 200
+    assert after.headers["etag"] != before.headers["etag"]
+    assert b"step 3" in after.content
+
+
+@pytest.mark.parametrize("url", REPORTS)
+def test_changing_the_status_changes_the_etag(client, db, url):
+    before = client.get(url)
+    conn = db._conn()
+    with conn:  # status only; same row, same steps
+        conn.execute("UPDATE runs SET status = 'needs_input' WHERE run_id = ?", (RUN_ID,))
+    after = client.get(url, headers={"If-None-Match": before.headers["etag"]})
+    assert after.status_code == 200
+    assert after.headers["etag"] != before.headers["etag"]
+    assert b"needs_input" in after.content
+
+
+def test_cached_body_matches_a_fresh_render(client, db):
+    url = "/runs/run-1/report.html"
+    first = client.get(url)
+    cached = client.get(url)
+    assert main.report_cache.stats["hits"] == 1
+    assert cached.headers["etag"] == first.headers["etag"]
+
+    fresh = "".join(iter_joined(iter_basic_html(iter_markdown_report(db.read_run(RUN_ID))))).encode("utf-8")
+    assert cached.content == first.content == fresh
@@ -0,0 +1,53 @@
+import random
+
+import pytest
+
+from app.reporting import _split_lines, iter_basic_html, iter_joined, markdown_to_basic_html
+
+CHUNKS = [
+    ["plain", "lines"],
+    ["windows\r\nline endings\r\n", "next"],
+    ["split across\r", "\nchunks"],
+    ["vertical\x0btab", "form\x0cfeed"],
+    ["line\u2028separator", "para\u2029graph", "next\x85line"],
+    ["no trailing newline"],
+    ["trailing newline\n"],
+    ["", "", "blank chunks", ""],
+    ["\r", "\r\n", "\n"],
+    [],
+]
+
+
+@pytest.mark.parametrize("chunks", CHUNKS)
+def test_split_lines_matches_splitlines(chunks):
+    assert list(_split_lines(chunks)) == "\n".join(chunks).splitlines()
+
+
+def test_split_lines_matches_splitlines_on_random_chunks():
+    rng = random.Random(7)
+    alphabet = ["a", "b", " ", "\n", "\r", "\r\n", "\x0b", "\x0c", "\x1c", "\x85", "\u2028", "\u2029"]
+    for _ in range(500):
+        chunks = ["".join(rng.choice(alphabet) for _ in range(rng.randrange(6))) for _ in range(rng.randrange(5))]
+        assert list(_split_lines(chunks)) == "\n".join(chunks).splitlines(), chunks
+
+
+@pytest.mark.parametrize("chunks", CHUNKS)
+def test_basic_html_is_the_same_for_chunks_and_joined_text(chunks):
+    text = "\n".join(chunks)
+    assert list(iter_basic_html(chunks)) == list(iter_basic_html([text]))
+    assert "\n".join(iter_basic_html(chunks)) == markdown_to_basic_html(text)
+
+
+def test_joined_sends_the_first_line_right_away():
+    lines = ["<!doctype html>", "a", "b", "c"]
+    out = iter_joined(iter(lines), chunk_size=1024)
+    assert next(out) == "<!doctype html>"
+    assert "".join(out) == "\na\nb\nc"
+
+
+def test_joined_matches_join():
+    lines = [f"line {i}" for i in range(1000)]
+    chunks = list(iter_joined(lines, chunk_size=100))
+    assert "".join(chunks) == "\n".join(lines)
+    assert all(len(c) < 110 for c in chunks)
+    assert list(iter_joined([])) == []
@@ -0,0 +1,102 @@
+import json
+
+import pytest
+
+from app import agent, planner
+from app.plan_cache import PlanCache
+from app.planner import _goal_intents, plan_with_rules, rule_plan
+
+NOTES = {"text": "Line one. Line two."}
+
+
+def _names(plan):
+    return [c["name"] for c in plan]
+
+
+def test_single_intent_is_planned_with_context_references():
+    plan, confidence = rule_plan("Summarize the notes", NOTES)
+    assert plan == [{"name": "summarize_text", "args": {"text": "{{context:text}}"}}]
+    assert confidence == 1.0
+
+def test_multi_intent_goal_plans_each_tool_in_goal_order():
+    ctx = {**NOTES, "to": "team@a.io", "subject": "Weekly notes"}
+    plan, confidence = rule_plan("Summarize the notes, then email the team", ctx)
+    assert plan == [
+        {"name": "summarize_text", "args": {"text": "{{context:text}}"}},
+        {"name": "draft_email", "args": {
+            "to": "{{context:to}}", "subject": "{{context:subject}}", "bullet_points": ["{{result:0.summary}}"],
+        }},
+    ]
+    assert confidence == 1.0
+
+    plan, _ = rule_plan("Email the team and summarize the notes", ctx)
+    assert _names(plan) == ["draft_email", "summarize_text"]
+
+def test_keyword_not_leading_its_clause_is_an_object():
+    intents, objects = _goal_intents("Summarize this email thread")
+    assert [tpl["name"] for _, tpl in intents] == ["summarize_text"]
+    assert objects == 1
+
+    plan, confidence = rule_plan("Summarize this email thread", {**NOTES, "to": "a@b.c", "subject": "s"})
+    assert _names(plan) == ["summarize_text"]
+    assert confidence < 1.0
+
+def test_goal_without_keywords_or_args_asks_the_llm():
+    assert rule_plan("Process the weekly notes", NOTES) == ([], 0.0)
+    assert rule_plan("Email the team", {}) == ([], 0.0)
+    assert rule_plan("Email the team", {"subject": "Hi"}) == ([], 0.0)  # "to" is required
+
+
+def test_confidence_threshold(monkeypatch):
+    ruled = plan_with_rules("Summarize the notes", NOTES)
+    assert ruled is not None
+    assert ruled[1]["source"] == "rules"
+
+    # An unused context key halves the discount: 0.75, below the default 0.8
+    ctx = {**NOTES, "budget": "frozen"}
+    assert rule_plan("Summarize the notes", ctx)[1] == 0.75
+    assert plan_with_rules("Summarize the notes", ctx) is None
+
+    monkeypatch.setattr(planner, "RULE_PLANNER_MIN_CONFIDENCE", 0.75)
+    assert plan_with_rules("Summarize the notes", ctx) is not None
+
+
+class _Ollama:
+    def __init__(self, plan):
+        self.calls = 0
+        self.reply = json.dumps(plan)
+
+    def chat(self, prompt, model, system=None, stats=None, format=None):
+        self.calls += 1
+        return self.reply
+
+@pytest.fixture
+def llm(db, monkeypatch):
+    fake = _Ollama([{"name": "summarize_text", "args": {"text": "{{context:text}}"}}])
+    monkeypatch.setattr(planner, "get_client", lambda: fake)
+    monkeypatch.setattr(agent, "plan_cache", PlanCache(ttl=60))
+    return fake
+
+def _source(steps):
+    return steps[0]["tool_result"]["source"]
+
+def test_confident_rule_plan_skips_cache_and_ollama(llm):
+    result, steps, _ = agent.run_agent("Summarize the notes", NOTES, stream=False)
+    assert result["status"] == "ok"
+    assert _source(steps) == "rules"
+    assert llm.calls == 0
+
+@pytest.mark.parametrize("goal, ctx", [
+    ("Summarize this email thread", {**NOTES, "to": "a@b.c"}),  # ambiguous
+    ("Summarize the notes", {**NOTES, "budget": "frozen"}),     # unused context
+    ("Process the weekly notes", NOTES),                        # no keywords
+])
+def test_unconfident_goals_fall_through_to_ollama_then_cache(llm, goal, ctx):
+    _, steps, _ = agent.run_agent(goal, ctx, stream=False)
+    assert _source(steps) == "ollama"
+    assert llm.calls == 1
+
+    result, steps, _ = agent.run_agent(goal, ctx, stream=False)
+    assert result["status"] == "ok"
+    assert _source(steps) == "cache:memory"
+    assert llm.calls == 1
@@ -0,0 +1,55 @@
+import json
+
+from app import storage
+
+
+def _steps(n):
+    return [{"thought": f"step {i}", "tool_call": None, "tool_result": {"i": i}} for i in range(n)]
+
+def _legacy_run(run_id, steps):
+    # A row as written before run_steps existed: steps inline in steps_json.
+    with storage._conn() as conn:
+        conn.execute(
+            "INSERT INTO runs VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (run_id, 1, "goal", "ok", "done", json.dumps(steps), None, None),
+        )
+
+
+def test_migrate_moves_steps_json_into_run_steps(db):
+    _legacy_run("old", _steps(3))
+    assert storage.migrate_steps_json(batch_size=1) == 1
+    assert storage.read_steps("old") == _steps(3)
+    assert storage._conn().execute("SELECT steps_json FROM runs WHERE run_id = 'old'").fetchone()[0] is None
+    assert storage.migrate_steps_json() == 0
+
+def test_init_db_migrates_once(db):
+    _legacy_run("old", _steps(2))
+    storage._conn().execute("PRAGMA user_version = 0")
+    storage.init_db()
+    assert storage.read_run("old")["steps"] == _steps(2)
+    assert storage._conn().execute("PRAGMA user_version").fetchone()[0] == 1
+
+
+def test_append_steps_is_incremental(db):
+    storage.save_run(run_id="r", user_goal="g", status="running", final_answer="")
+    storage.append_steps("r", list(enumerate(_steps(2))))
+    storage.append_steps("r", [(2, _steps(3)[2])])
+    assert storage.count_steps("r") == 3
+    assert storage.read_steps("r") == _steps(3)
+    assert storage.read_steps("r", 1, 2) == _steps(3)[1:2]
+
+def test_save_run_keeps_appended_steps(db):
+    storage.append_steps("r", list(enumerate(_steps(2))))
+    storage.save_run(run_id="r", user_goal="g", status="ok", final_answer="done")
+    assert storage.read_run("r")["steps"] == _steps(2)
+
+def test_save_run_with_steps_replaces_them(db):
+    storage.append_steps("r", list(enumerate(_steps(4))))
+    storage.save_run(run_id="r", user_goal="g", status="ok", final_answer="done", steps=_steps(2))
+    assert storage.read_steps("r") == _steps(2)
+
+def test_iter_steps_pages(db):
+    storage.append_steps("r", list(enumerate(_steps(5))))
+    assert list(storage.iter_steps("r", page_size=2)) == _steps(5)
+    assert list(storage.iter_steps("r", page_size=2, end=3)) == _steps(3)
+    assert list(storage.iter_steps("missing")) == []
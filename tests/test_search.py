@@ -0,0 +1,71 @@
+import json
+
+import pytest
+
+from app import storage
+
+STEPS = [
+    {"thought": "plan", "tool_call": {"name": "planner", "args": {}}, "tool_result": {"plan": [{"args": {"to": "planner-only@x.io"}}]}},
+    {"thought": "call", "tool_call": {"name": "draft_email", "args": {"to": "ops@example.com"}}, "tool_result": {"email": "Rollout of kubernetes"}},
+]
+
+
+def _ids(hits):
+    return [h["run_id"] for h in hits]
+
+
+@pytest.mark.parametrize("q, expected", [
+    ("release notes", '"release" "notes"'),
+    ("deploy*", '"deploy"*'),
+    ('say "hi"', '"say" """hi"""'),
+    ("a NOT b", '"a" "NOT" "b"'),
+    ("user_goal:x", '"user_goal:x"'),
+    ("  * ", ""),
+])
+def test_fts_query_quotes_every_word(q, expected):
+    assert storage._fts_query(q) == expected
+
+@pytest.mark.parametrize("q", ['"', "NOT", "a OR", "(x", "goal:", "-x", "^x", "x AND"])
+def test_operators_are_searched_literally(db, q):
+    storage.save_run(run_id="r", user_goal="g", status="ok", final_answer="done")
+    assert storage.search_runs(q) == []
+
+
+def test_goal_answer_and_body_are_searchable(db):
+    storage.save_run(run_id="r", user_goal="Weekly release sync", status="ok", final_answer="Sent", steps=STEPS)
+    assert _ids(storage.search_runs("release")) == ["r"]
+    assert _ids(storage.search_runs("kuber*")) == ["r"]
+    assert _ids(storage.search_runs("ops@example.com")) == ["r"]
+    # The planner step only repeats the args and is not indexed.
+    assert storage.search_runs("planner-only") == []
+    assert "<mark>" in storage.search_runs("release")[0]["snippet"]
+
+def test_every_word_must_match_and_status_filters(db):
+    storage.save_run(run_id="a", user_goal="release sync", status="ok", final_answer="")
+    storage.save_run(run_id="b", user_goal="release notes", status="error", final_answer="")
+    assert _ids(storage.search_runs("release notes")) == ["b"]
+    assert _ids(storage.search_runs("release", status="ok")) == ["a"]
+    assert len(storage.search_runs("release", limit=1)) == 1
+    assert len(storage.search_runs("release", limit=1, offset=1)) == 1
+
+def test_body_is_indexed_once_the_run_is_final(db):
+    storage.append_steps("r", list(enumerate(STEPS)))
+    storage.save_run(run_id="r", user_goal="sync", status="needs_input", final_answer="")
+    assert storage.search_runs("kubernetes") == []
+    assert _ids(storage.search_runs("sync")) == ["r"]
+    storage.save_run(run_id="r", user_goal="sync", status="ok", final_answer="done")
+    assert _ids(storage.search_runs("kubernetes")) == ["r"]
+    # Re-saving replaces the index row instead of adding one.
+    storage.save_run(run_id="r", user_goal="sync", status="ok", final_answer="done")
+    assert storage._conn().execute("SELECT COUNT(*) FROM runs_fts").fetchone()[0] == 1
+
+def test_backfill_indexes_unindexed_rows(db):
+    with storage._conn() as conn:
+        conn.execute(
+            "INSERT INTO runs VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            ("old", 1, "legacy goal", "ok", "done", json.dumps(STEPS), None, None),
+        )
+    assert storage.search_runs("legacy") == []
+    assert storage.backfill_search_index(batch_size=1) == 1
+    assert _ids(storage.search_runs("kubernetes")) == ["old"]
+    assert storage.backfill_search_index() == 0